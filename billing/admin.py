@@ -3,7 +3,7 @@ from .models import CustomUser, Patient
 from django.contrib.auth.admin import UserAdmin
 from .models import Service, Bill, BillItem, Payment
 from .models import Medicine
-from .models import ThirdPartyPayer, PatientCoverage
+from .models import ThirdPartyPayer, PatientCoverage, ClaimBatch, PayerTariff, OnCallShift
 
 
 class BillItemInline(admin.TabularInline):
@@ -21,6 +21,26 @@ admin.site.register(ThirdPartyPayer)
 admin.site.register(PatientCoverage)
 
 
+@admin.register(ClaimBatch)
+class ClaimBatchAdmin(admin.ModelAdmin):
+    list_display = ("reference", "hospital", "third_party", "status", "bill_count", "total_claimed", "created_at")
+    list_filter = ("status", "third_party")
+
+
+@admin.register(PayerTariff)
+class PayerTariffAdmin(admin.ModelAdmin):
+    list_display = ("service", "third_party", "price", "effective_from", "effective_to")
+    list_filter = ("third_party",)
+    search_fields = ("service__name",)
+
+
+@admin.register(OnCallShift)
+class OnCallShiftAdmin(admin.ModelAdmin):
+    list_display = ("user", "role", "hospital", "starts_at", "ends_at")
+    list_filter = ("hospital", "role")
+    search_fields = ("user__username",)
+
+
 class CustomUserAdmin(UserAdmin):
     model = CustomUser
     list_display = ['username', 'email', 'role']
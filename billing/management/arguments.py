@@ -0,0 +1,19 @@
+import argparse
+
+from django.utils.dateparse import parse_date
+
+
+def date_argument(value):
+    """argparse type for YYYY-MM-DD options.
+
+    Rejects malformed strings as well as well-formed but impossible dates
+    such as 2024-02-30, for which parse_date raises ValueError. Django's
+    CommandParser reports the error as a CommandError.
+    """
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise argparse.ArgumentTypeError(f"Invalid date '{value}', expected YYYY-MM-DD")
+    return parsed
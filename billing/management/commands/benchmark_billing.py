@@ -0,0 +1,96 @@
+import json
+import tempfile
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from billing.services.benchmark import (
+    BENCHMARK_VIEWS,
+    Volumes,
+    build_report,
+    compare,
+    run_benchmark,
+    seed,
+)
+from billing.services.coverage import coverage_resolver
+from billing.services.invoice_numbers import invoice_numbers
+from billing.services.invoice_pdf import invoice_pdf_cache
+from billing.services.tariffs import tariff_resolver
+
+
+class Command(BaseCommand):
+    help = "Benchmark the billing views (latency and SQL queries) against seeded data in a throwaway database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hospitals", type=int, default=1)
+        parser.add_argument("--patients", type=int, default=200)
+        parser.add_argument("--services", type=int, default=100)
+        parser.add_argument("--bills", type=int, default=1000)
+        parser.add_argument("--items-per-bill", type=int, default=3)
+        parser.add_argument("--iterations", type=int, default=50, help="Timed requests per view")
+        parser.add_argument("--view", action="append", choices=list(BENCHMARK_VIEWS), help="Only these views (repeatable)")
+        parser.add_argument("--output", help="Write the JSON report to this file")
+        parser.add_argument("--baseline", help="Compare against a stored JSON report; fails on regressions")
+        parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed latency growth vs baseline (0.2 = 20%%)")
+
+    def handle(self, *args, **options):
+        volumes = Volumes(
+            hospitals=options["hospitals"],
+            patients=options["patients"],
+            services=options["services"],
+            bills=options["bills"],
+            items_per_bill=options["items_per_bill"],
+        )
+        if min(vars(volumes).values()) < 1:
+            raise CommandError("Volumes must be at least 1")
+
+        baseline = None
+        if options["baseline"]:
+            try:
+                baseline = json.loads(Path(options["baseline"]).read_text())
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Cannot read baseline: {exc}")
+
+        report = self._run(volumes, options)
+
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(report, indent=2) + "\n")
+            self.stdout.write(f"Report written to {options['output']}")
+
+        self.stdout.write(f"{'view':<30}{'p50 ms':>10}{'p95 ms':>10}{'queries':>10}  statuses")
+        for name, row in report["views"].items():
+            self.stdout.write(
+                f"{name:<30}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['queries_max']:>10}  {row['statuses']}"
+            )
+
+        if baseline is not None:
+            regressions = compare(report, baseline, options["tolerance"])
+            if regressions:
+                raise CommandError("Regressions against baseline:\n  " + "\n  ".join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regressions against baseline"))
+
+    def _run(self, volumes, options):
+        # Seeded rows and rendered PDFs never touch the real database or cache
+        setup_test_environment()
+        database = connection.settings_dict["NAME"]
+        pdf_directory = invoice_pdf_cache.directory
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        invoice_numbers.clear()
+        coverage_resolver.clear()
+        tariff_resolver.clear()
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                invoice_pdf_cache.directory = Path(directory)
+                self.stdout.write(f"Seeding {vars(volumes)}")
+                data = seed(volumes)
+                results = run_benchmark(data, options["view"], iterations=options["iterations"])
+        finally:
+            invoice_pdf_cache.directory = pdf_directory
+            invoice_numbers.clear()
+            coverage_resolver.clear()
+            tariff_resolver.clear()
+            connection.creation.destroy_test_db(database, verbosity=0)
+            teardown_test_environment()
+        return build_report(results, volumes, options["iterations"])
@@ -0,0 +1,53 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from billing.models import Bill, Hospital, InvoiceSequence, Patient
+from billing.services.invoice_numbers import InvoiceNumberAllocator
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare bill insert throughput with uuid4 and sequential invoice numbers. "
+        "Runs against a scratch hospital inside a transaction that is rolled back, "
+        "so no bill or invoice number is left behind."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bills", type=int, default=5000, help="Bills inserted per variant")
+        parser.add_argument("--block-size", type=int, default=50)
+
+    def handle(self, *args, **options):
+        count = options["bills"]
+        allocator = InvoiceNumberAllocator(block_size=options["block_size"])
+
+        variants = {
+            "uuid4": lambda hospital: str(uuid.uuid4()),
+            "sequential": lambda hospital: allocator.next(hospital.id),
+        }
+
+        for name, number in variants.items():
+            with transaction.atomic():
+                hospital = Hospital.objects.create(name="Benchmark", slug=f"benchmark-{uuid.uuid4().hex[:8]}")
+                # A prefix no real hospital derives from its slug
+                InvoiceSequence.objects.create(hospital=hospital, prefix=f"BENCH-{uuid.uuid4().hex[:8]}")
+                patient = Patient.objects.create(
+                    hospital=hospital, full_name="Benchmark", date_of_birth="1990-01-01", phone_number="0"
+                )
+
+                started = time.perf_counter()
+                # One savepoint per bill, as close as a rolled-back run gets to
+                # the one transaction per bill of cashiers creating bills
+                for _ in range(count):
+                    with transaction.atomic():
+                        Bill.objects.create(
+                            hospital=hospital, patient=patient, total_amount=100, invoice_no=number(hospital)
+                        )
+                elapsed = time.perf_counter() - started
+
+                transaction.set_rollback(True)
+            allocator.clear()
+
+            self.stdout.write(f"{name:>10}: {count} bills in {elapsed:.2f}s, {count / elapsed:.0f} inserts/s")
@@ -5,5 +5,8 @@ class Command(BaseCommand):
     help = "Escalate unacknowledged critical vital alerts"
 
     def handle(self, *args, **kwargs):
-        escalate_unacknowledged_alerts()
-        self.stdout.write(self.style.SUCCESS("Alert escalation check completed"))
+        stats = escalate_unacknowledged_alerts()
+        self.stdout.write(self.style.SUCCESS(
+            f"Alert escalation check completed: escalated {stats['escalated']} of "
+            f"{stats['processed']} alerts in {stats['seconds']}s ({stats['per_second']} alerts/s)"
+        ))
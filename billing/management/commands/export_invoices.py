@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.management.arguments import date_argument
+from billing.models import Hospital
+from billing.services.invoice_export import export_bills, stream_invoice_zip
+
+
+class Command(BaseCommand):
+    help = "Export invoice PDFs for a hospital and date range into a ZIP archive"
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="Path of the ZIP file to write")
+        parser.add_argument("--hospital", required=True, help="Hospital slug")
+        parser.add_argument("--since", required=True, type=date_argument, help="Created on or after (YYYY-MM-DD)")
+        parser.add_argument("--until", required=True, type=date_argument, help="Created on or before (YYYY-MM-DD)")
+        parser.add_argument("--payer", help="Only bills billed to this third-party payer code")
+        parser.add_argument("--workers", type=int, help="Render processes (defaults to PDF_RENDERING['WORKERS'])")
+
+    def handle(self, *args, **options):
+        hospital = Hospital.objects.filter(slug=options["hospital"]).first()
+        if not hospital:
+            raise CommandError(f"Unknown hospital '{options['hospital']}'")
+
+        bills = export_bills(hospital, options["since"], options["until"], options["payer"])
+        total = bills.count()
+
+        written = 0
+        with open(options["output"], "wb") as fh:
+            for chunk in stream_invoice_zip(bills, workers=options["workers"]):
+                fh.write(chunk)
+                written += 1
+                if written % 100 == 0:
+                    self.stdout.write(f"{written}/{total} invoices")
+
+        self.stdout.write(self.style.SUCCESS(f"Exported {total} bills to {options['output']}"))
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from billing.services.charge_capture import flush_visit, pending_visits
+
+
+class Command(BaseCommand):
+    help = "Move captured lab, radiology and pharmacy charges onto their visits' draft bills"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than", type=int,
+            default=getattr(settings, "CHARGE_CAPTURE", {}).get("DEBOUNCE_SECONDS", 5),
+            help="Only charges captured at least this many seconds ago (default: the debounce delay)",
+        )
+
+    def handle(self, *args, **options):
+        visits = pending_visits(options["older_than"])
+        flushed = 0
+        for visit_id in visits:
+            if flush_visit(visit_id):
+                flushed += 1
+        self.stdout.write(self.style.SUCCESS(f"Flushed charges for {flushed} of {len(visits)} visits"))
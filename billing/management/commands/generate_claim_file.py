@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.models import ClaimBatch
+from billing.services.claim_files import CLAIM_FILE_WRITERS, ClaimFileError, writer_for
+
+
+class Command(BaseCommand):
+    help = "Write a claim batch to a payer claim file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("reference", help="Claim batch reference")
+        parser.add_argument("output", help="Path of the claim file to write")
+        parser.add_argument("--format", choices=sorted(CLAIM_FILE_WRITERS), help="Override the payer's format")
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Rows fetched per round trip")
+
+    def handle(self, *args, **options):
+        batch = (
+            ClaimBatch.objects.select_related("third_party", "hospital")
+            .filter(reference=options["reference"])
+            .first()
+        )
+        if not batch:
+            raise CommandError(f"Unknown claim batch '{options['reference']}'")
+
+        writer = writer_for(batch, options["format"], chunk_size=options["chunk_size"])
+        try:
+            writer.validate()
+        except ClaimFileError as exc:
+            raise CommandError(str(exc))
+        started = time.monotonic()
+
+        with open(options["output"], "w", newline="") as fh:
+            for line in writer.stream():
+                fh.write(line)
+
+        elapsed = time.monotonic() - started
+        rate = writer.line_count / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {writer.line_count} claim lines (₦{writer.total}) to {options['output']} "
+            f"in {elapsed:.1f}s, {rate:.0f} lines/s"
+        ))
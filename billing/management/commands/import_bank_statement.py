@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.models import Hospital
+from billing.services.bank_reconciliation import StatementFormatError, import_statement
+
+
+class Command(BaseCommand):
+    help = "Match a bank statement CSV to bills by invoice number and post the transfers as payments"
+
+    def add_arguments(self, parser):
+        parser.add_argument("statement", help="Bank statement CSV (date, amount, narration[, reference])")
+        parser.add_argument("--hospital", required=True, help="Hospital slug")
+        parser.add_argument("--dry-run", action="store_true", help="Match and report without posting payments")
+        parser.add_argument("--unmatched", help="Write unmatched lines to this CSV file")
+
+    def handle(self, *args, **options):
+        hospital = Hospital.objects.filter(slug=options["hospital"]).first()
+        if not hospital:
+            raise CommandError(f"Unknown hospital '{options['hospital']}'")
+
+        started = time.monotonic()
+        try:
+            result = import_statement(hospital, options["statement"], dry_run=options["dry_run"])
+        except (StatementFormatError, FileNotFoundError) as exc:
+            raise CommandError(str(exc))
+        elapsed = time.monotonic() - started
+
+        for reason, count in result.unmatched["reason"].value_counts().items():
+            self.stdout.write(f"unmatched ({reason}): {count}")
+
+        if options["unmatched"] and len(result.unmatched):
+            result.unmatched.to_csv(options["unmatched"], index=False)
+            self.stdout.write(f"Unmatched lines written to {options['unmatched']}")
+
+        verb = "Would post" if result.dry_run else "Posted"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result.matched} of {result.lines} lines (₦{result.matched_total}) in {elapsed:.1f}s"
+        ))
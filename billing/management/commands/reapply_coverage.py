@@ -0,0 +1,72 @@
+import json
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.management.arguments import date_argument
+from billing.models import Hospital
+from billing.services.coverage_backfill import (
+    coverage_bills,
+    iter_bill_chunks,
+    reprice_chunk,
+    third_party_index,
+)
+
+
+class Command(BaseCommand):
+    help = "Re-apply current patient coverage percentages to unclaimed, unsettled bills in chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--payer", help="Only bills for patients covered by this payer code (e.g. NHIS)")
+        parser.add_argument("--hospital", help="Hospital slug")
+        parser.add_argument("--since", type=date_argument, help="Created on or after (YYYY-MM-DD)")
+        parser.add_argument("--until", type=date_argument, help="Created on or before (YYYY-MM-DD)")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true", help="Report changes without writing them")
+        parser.add_argument("--checkpoint", help="JSON file recording the last processed bill id")
+        parser.add_argument("--resume", action="store_true", help="Continue after the id stored in --checkpoint")
+
+    def handle(self, *args, **options):
+        hospital = None
+        if options["hospital"]:
+            hospital = Hospital.objects.filter(slug=options["hospital"]).first()
+            if not hospital:
+                raise CommandError(f"Unknown hospital '{options['hospital']}'")
+
+        checkpoint = Path(options["checkpoint"]) if options["checkpoint"] else None
+        if options["resume"] and not checkpoint:
+            raise CommandError("--resume requires --checkpoint")
+
+        state = {"last_id": 0, "scanned": 0, "updated": 0}
+        if options["resume"] and checkpoint.exists():
+            state.update(json.loads(checkpoint.read_text()))
+            self.stdout.write(f"Resuming after bill #{state['last_id']}")
+
+        bills = coverage_bills(options["payer"], hospital, options["since"], options["until"])
+        third_parties = third_party_index()
+        started = time.monotonic()
+        scanned_this_run = 0
+
+        for chunk in iter_bill_chunks(bills, state["last_id"], options["chunk_size"]):
+            updated = reprice_chunk(chunk, third_parties, dry_run=options["dry_run"])
+
+            state["last_id"] = chunk[-1].id
+            state["scanned"] += len(chunk)
+            state["updated"] += updated
+            scanned_this_run += len(chunk)
+
+            if checkpoint and not options["dry_run"]:
+                checkpoint.write_text(json.dumps(state))
+
+            elapsed = time.monotonic() - started
+            rate = scanned_this_run / elapsed if elapsed else 0
+            self.stdout.write(
+                f"scanned {state['scanned']} | updated {state['updated']} | "
+                f"last #{state['last_id']} | {rate:.0f} rows/s"
+            )
+
+        verb = "Would update" if options["dry_run"] else "Updated"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {state['updated']} of {state['scanned']} bills"
+        ))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.management.arguments import date_argument
+from billing.models import Hospital
+from billing.services.revenue import rebuild_daily_revenue
+
+
+class Command(BaseCommand):
+    help = "Rebuild the DailyRevenue rollup from Payment rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hospital", help="Hospital slug (default: all hospitals)")
+        parser.add_argument("--since", type=date_argument, help="First day to rebuild (YYYY-MM-DD)")
+        parser.add_argument("--until", type=date_argument, help="Last day to rebuild (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        hospital = None
+        if options["hospital"]:
+            hospital = Hospital.objects.filter(slug=options["hospital"]).first()
+            if not hospital:
+                raise CommandError(f"Unknown hospital '{options['hospital']}'")
+
+        dates = {name: options[name] for name in ("since", "until") if options[name]}
+
+        written = rebuild_daily_revenue(hospital, **dates)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} daily revenue rows"))
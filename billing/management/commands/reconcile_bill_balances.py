@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import DecimalField, F, Q, Sum
+from django.db.models.functions import Coalesce
+
+from billing.models import Bill
+
+
+class Command(BaseCommand):
+    help = "Verify Bill.amount_paid / balance_due against Payment totals"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="Rewrite mismatched bills")
+
+    def handle(self, *args, **options):
+        # One LEFT JOIN + GROUP BY over Payment; HAVING keeps only drifted bills
+        mismatched = list(
+            Bill.objects.annotate(
+                paid_sum=Coalesce(
+                    Sum("payment__amount_paid"),
+                    0,
+                    output_field=DecimalField(max_digits=12, decimal_places=2),
+                )
+            )
+            .filter(
+                ~Q(amount_paid=F("paid_sum"))
+                | ~Q(balance_due=F("total_amount") - F("paid_sum"))
+            )
+            .only("id", "invoice_no", "total_amount", "amount_paid", "balance_due")
+        )
+
+        for bill in mismatched:
+            self.stdout.write(
+                f"{bill.invoice_no}: stored paid {bill.amount_paid} / due {bill.balance_due}, "
+                f"payments total {bill.paid_sum}"
+            )
+
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS("All bill balances match payments"))
+            return
+
+        if options["fix"]:
+            for bill in mismatched:
+                bill.amount_paid = bill.paid_sum
+                bill.balance_due = bill.total_amount - bill.paid_sum
+            with transaction.atomic():
+                Bill.objects.bulk_update(mismatched, ["amount_paid", "balance_due"])
+            self.stdout.write(self.style.SUCCESS(f"Fixed {len(mismatched)} bills"))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f"{len(mismatched)} bills out of sync (re-run with --fix to repair)"
+            ))
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from billing.models import Bill, Hospital
+from billing.services.invoice_numbers import invoice_numbers
+
+
+class Command(BaseCommand):
+    help = "Move bills with uuid4 invoice numbers onto their hospital's sequential series"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hospital", help="Hospital slug (default: all hospitals)")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true", help="Only count the bills to renumber")
+
+    def handle(self, *args, **options):
+        hospitals = Hospital.objects.order_by("id")
+        if options["hospital"]:
+            hospitals = hospitals.filter(slug=options["hospital"])
+            if not hospitals.exists():
+                raise CommandError(f"Unknown hospital '{options['hospital']}'")
+
+        total = 0
+        for hospital in hospitals:
+            legacy = (
+                Bill.objects.filter(hospital=hospital, legacy_invoice_no__isnull=True)
+                .exclude(invoice_no__startswith="INV-")
+                .order_by("created_at", "id")
+            )
+            if options["dry_run"]:
+                count = legacy.count()
+                total += count
+                self.stdout.write(f"{hospital.slug}: {count} bills to renumber")
+                continue
+
+            # Renumbered bills drop out of `legacy`, so each pass takes the next oldest chunk
+            done = 0
+            while True:
+                chunk = list(legacy.only("id", "invoice_no")[:options["chunk_size"]])
+                if not chunk:
+                    break
+                with transaction.atomic():
+                    numbers = invoice_numbers.allocate(hospital.id, len(chunk))
+                    for bill, number in zip(chunk, numbers):
+                        bill.legacy_invoice_no = bill.invoice_no
+                        bill.invoice_no = number
+                    Bill.objects.bulk_update(chunk, ["invoice_no", "legacy_invoice_no"])
+                done += len(chunk)
+                self.stdout.write(f"{hospital.slug}: renumbered {done} bills")
+            total += done
+
+        verb = "Would renumber" if options["dry_run"] else "Renumbered"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {total} bills"))
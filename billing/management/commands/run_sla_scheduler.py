@@ -0,0 +1,26 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from billing.services.sla_scheduler import build_scheduler
+
+
+class Command(BaseCommand):
+    help = "Run the SLA scheduler: escalate VitalAlerts at their deadlines until stopped"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--poll-interval", type=float, help="Seconds between change-feed polls")
+
+    def handle(self, *args, **options):
+        scheduler = build_scheduler()
+        if options["poll_interval"]:
+            scheduler.poll_interval = options["poll_interval"]
+
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+
+        self.stdout.write(f"SLA scheduler started (poll every {scheduler.poll_interval}s)")
+        scheduler.run_forever(stop)
+        self.stdout.write(self.style.SUCCESS(f"SLA scheduler stopped: {scheduler.stats()}"))
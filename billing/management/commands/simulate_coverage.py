@@ -0,0 +1,71 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from billing.management.arguments import date_argument
+from billing.models import Hospital
+from billing.services.coverage_simulation import (
+    CoverageScenario,
+    ScenarioError,
+    load_bills,
+    simulate,
+    simulation_rows,
+)
+
+
+class Command(BaseCommand):
+    help = "Simulate the revenue impact of new coverage percentages per payer (read-only)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--set", action="append", default=[], metavar="CODE=PATIENT[:GOVERNMENT]",
+            help="Candidate percentages for a payer code, e.g. NHIS=10:90 (repeatable)",
+        )
+        parser.add_argument("--hospital", help="Hospital slug")
+        parser.add_argument("--since", type=date_argument, help="Bills created on or after (YYYY-MM-DD)")
+        parser.add_argument("--until", type=date_argument, help="Bills created on or before (YYYY-MM-DD)")
+        parser.add_argument("--json", action="store_true", help="Print rows as JSON")
+
+    def handle(self, *args, **options):
+        scenarios = [self._scenario(value) for value in options["set"]]
+        if not scenarios:
+            raise CommandError("Give at least one --set CODE=PATIENT[:GOVERNMENT]")
+
+        hospital = None
+        if options["hospital"]:
+            hospital = Hospital.objects.filter(slug=options["hospital"]).first()
+            if not hospital:
+                raise CommandError(f"Unknown hospital '{options['hospital']}'")
+
+        started = time.monotonic()
+        frame = load_bills(hospital, options["since"], options["until"])
+        loaded = time.monotonic()
+        rows = simulation_rows(simulate(frame, scenarios))
+        finished = time.monotonic()
+
+        if options["json"]:
+            self.stdout.write(json.dumps(rows, cls=DjangoJSONEncoder, indent=2))
+            return
+
+        self.stdout.write(f"{'payer':<12}{'bills':>10}{'patient delta':>18}{'payer delta':>18}")
+        for row in rows:
+            self.stdout.write(
+                f"{row['payer_code']:<12}{row['bills']:>10}"
+                f"{row['patient_delta']:>18,}{row['payer_delta']:>18,}"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Simulated {len(frame)} bills (load {loaded - started:.2f}s, "
+            f"simulate {finished - loaded:.2f}s)"
+        ))
+
+    def _scenario(self, value):
+        code, _, percentages = value.partition("=")
+        patient, _, government = percentages.partition(":")
+        if not code or not patient:
+            raise CommandError(f"Invalid --set '{value}', expected CODE=PATIENT[:GOVERNMENT]")
+        try:
+            return CoverageScenario.parse(code, patient, government or None)
+        except ScenarioError as exc:
+            raise CommandError(str(exc))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.models import Hospital
+from billing.services.aging import take_snapshot
+
+
+class Command(BaseCommand):
+    help = "Store today's receivables aging per hospital and payer (run nightly)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hospital", help="Hospital slug (default: all hospitals)")
+
+    def handle(self, *args, **options):
+        hospital = None
+        if options["hospital"]:
+            hospital = Hospital.objects.filter(slug=options["hospital"]).first()
+            if not hospital:
+                raise CommandError(f"Unknown hospital '{options['hospital']}'")
+
+        written = take_snapshot(hospital)
+        self.stdout.write(self.style.SUCCESS(f"Stored {written} aging rows"))
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:37
+
+from django.db import migrations, models
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_running_totals(apps, schema_editor):
+    Bill = apps.get_model("billing", "Bill")
+    Payment = apps.get_model("billing", "Payment")
+
+    paid = (
+        Payment.objects.filter(bill=OuterRef("pk"))
+        .values("bill")
+        .annotate(total=Sum("amount_paid"))
+        .values("total")
+    )
+    Bill.objects.update(
+        amount_paid=Coalesce(Subquery(paid), 0, output_field=DecimalField(max_digits=12, decimal_places=2))
+    )
+    Bill.objects.update(balance_due=F("total_amount") - F("amount_paid"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0018_alter_patientcoverage_government_percentage_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bill',
+            name='amount_paid',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='bill',
+            name='balance_due',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(backfill_running_totals, migrations.RunPython.noop),
+    ]
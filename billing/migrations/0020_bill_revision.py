@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0019_bill_amount_paid_balance_due'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bill',
+            name='revision',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
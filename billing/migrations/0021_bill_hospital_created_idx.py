@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0020_bill_revision'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(fields=['hospital', 'created_at', 'id'], name='bill_hospital_created_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:44
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_revenue(apps, schema_editor):
+    DailyRevenue = apps.get_model("billing", "DailyRevenue")
+    Payment = apps.get_model("billing", "Payment")
+
+    rows = (
+        Payment.objects.annotate(day=TruncDate("paid_on"))
+        .values("hospital_id", "day", "payment_mode")
+        .annotate(total=Sum("amount_paid"), payment_count=Count("id"))
+        .order_by()
+    )
+    DailyRevenue.objects.bulk_create([DailyRevenue(**row) for row in rows], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0021_bill_hospital_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('payment_mode', models.CharField(choices=[('cash', 'Cash'), ('card', 'Card'), ('transfer', 'Bank Transfer')], max_length=50)),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('payment_count', models.PositiveIntegerField(default=0)),
+                ('hospital', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_revenue', to='billing.hospital')),
+            ],
+            options={
+                'unique_together': {('hospital', 'day', 'payment_mode')},
+            },
+        ),
+        migrations.RunPython(backfill_daily_revenue, migrations.RunPython.noop),
+    ]
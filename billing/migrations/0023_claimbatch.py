@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:46
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0022_dailyrevenue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaimBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference', models.CharField(max_length=100, unique=True)),
+                ('status', models.CharField(choices=[('draft', 'Draft'), ('submitted', 'Submitted'), ('paid', 'Paid'), ('rejected', 'Rejected')], default='draft', max_length=20)),
+                ('bill_count', models.PositiveIntegerField(default=0)),
+                ('total_claimed', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('submitted_at', models.DateTimeField(blank=True, null=True)),
+                ('settled_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('hospital', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='claim_batches', to='billing.hospital')),
+                ('third_party', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='claim_batches', to='billing.thirdpartypayer')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='bill',
+            name='claim_batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bills', to='billing.claimbatch'),
+        ),
+    ]
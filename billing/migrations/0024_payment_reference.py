@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0023_claimbatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='reference',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=100),
+        ),
+    ]
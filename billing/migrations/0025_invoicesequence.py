@@ -0,0 +1,52 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:54
+
+import django.db.models.deletion
+import re
+
+from django.db import migrations, models
+
+
+def create_sequences(apps, schema_editor):
+    # Existing uuid4 invoice numbers stay as they are; new bills continue from
+    # 1 in the INV-<prefix>- series, which cannot collide with them. Run
+    # `renumber_legacy_invoices` to move old bills onto the series.
+    Hospital = apps.get_model("billing", "Hospital")
+    InvoiceSequence = apps.get_model("billing", "InvoiceSequence")
+
+    taken = set()
+    for hospital in Hospital.objects.order_by("id"):
+        prefix = re.sub(r"[^A-Z0-9]", "", hospital.slug.upper())[:12] or f"H{hospital.pk}"
+        if prefix in taken:
+            prefix = f"H{hospital.pk}"
+        taken.add(prefix)
+        InvoiceSequence.objects.create(hospital=hospital, prefix=prefix)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0024_payment_reference'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bill',
+            name='legacy_invoice_no',
+            field=models.CharField(blank=True, max_length=50, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='bill',
+            name='invoice_no',
+            field=models.CharField(blank=True, max_length=50, unique=True),
+        ),
+        migrations.CreateModel(
+            name='InvoiceSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(max_length=20, unique=True)),
+                ('next_value', models.PositiveBigIntegerField(default=1)),
+                ('hospital', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='invoice_sequence', to='billing.hospital')),
+            ],
+        ),
+        migrations.RunPython(create_sequences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:56
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0025_invoicesequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgingSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateField()),
+                ('patient_current', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('patient_31_60', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('patient_61_90', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('patient_over_90', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('payer_current', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('payer_31_60', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('payer_61_90', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('payer_over_90', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('hospital', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aging_snapshots', to='billing.hospital')),
+                ('third_party', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='billing.thirdpartypayer')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hospital', 'as_of'], name='aging_hospital_as_of_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0026_agingsnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hospital',
+            name='catalog_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
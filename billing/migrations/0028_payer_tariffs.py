@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_unit_price(apps, schema_editor):
+    BillItem = apps.get_model("billing", "BillItem")
+    BillItem.objects.filter(quantity__gt=0).update(unit_price=F("subtotal") / F("quantity"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0027_hospital_catalog_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='billitem',
+            name='unit_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True),
+        ),
+        migrations.RunPython(backfill_unit_price, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='PayerTariff',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('effective_from', models.DateField()),
+                ('effective_to', models.DateField(blank=True, null=True)),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tariffs', to='billing.service')),
+                ('third_party', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tariffs', to='billing.thirdpartypayer')),
+            ],
+            options={
+                'ordering': ['service', 'third_party', 'effective_from'],
+                'unique_together': {('service', 'third_party', 'effective_from')},
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0028_payer_tariffs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bill',
+            name='is_draft',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='bill',
+            name='visit',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bills', to='billing.patientvisit'),
+        ),
+        migrations.CreateModel(
+            name='ChargeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('lab', 'Lab Test'), ('radiology', 'Radiology'), ('pharmacy', 'Pharmacy')], max_length=20)),
+                ('source_id', models.PositiveIntegerField()),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('unit_price', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('bill', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='charge_events', to='billing.bill')),
+                ('hospital', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='billing.hospital')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='billing.service')),
+                ('visit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='charge_events', to='billing.patientvisit')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['bill', 'created_at'], name='charge_pending_idx')],
+                'unique_together': {('source', 'source_id', 'service')},
+            },
+        ),
+    ]
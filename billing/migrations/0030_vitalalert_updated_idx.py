@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0029_charge_capture'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vitalalert',
+            index=models.Index(fields=['updated_at'], name='vitalalert_updated_idx'),
+        ),
+    ]
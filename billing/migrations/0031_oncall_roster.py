@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0030_vitalalert_updated_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hospital',
+            name='roster_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='OnCallShift',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('doctor', 'Doctor'), ('head_doctor', 'Head Doctor'), ('admin', 'Admin')], max_length=20)),
+                ('starts_at', models.DateTimeField()),
+                ('ends_at', models.DateTimeField()),
+                ('hospital', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='oncall_shifts', to='billing.hospital')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='oncall_shifts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['starts_at'],
+                'indexes': [models.Index(fields=['hospital', 'ends_at'], name='oncall_hospital_ends_idx')],
+            },
+        ),
+    ]
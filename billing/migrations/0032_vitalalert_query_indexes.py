@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0031_oncall_roster'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vitalalert',
+            index=models.Index(condition=models.Q(('status', 'open')), fields=['status', 'escalation_deadline'], name='vitalalert_open_deadline_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vitalalert',
+            index=models.Index(fields=['status', 'created_at'], name='vitalalert_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vitalalert',
+            index=models.Index(fields=['patient', 'status'], name='vitalalert_patient_status_idx'),
+        ),
+    ]
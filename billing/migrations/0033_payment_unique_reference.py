@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0032_vitalalert_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='payment',
+            constraint=models.UniqueConstraint(condition=models.Q(('reference', ''), _negated=True), fields=('hospital', 'reference'), name='payment_unique_reference'),
+        ),
+    ]
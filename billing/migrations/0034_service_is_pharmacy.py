@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:56
+
+from django.db import migrations, models
+
+
+def flag_pharmacy_services(apps, schema_editor):
+    # Services charge capture created before the flag existed
+    Service = apps.get_model("billing", "Service")
+    Service.objects.filter(
+        name__startswith="Pharmacy: ", description="Dispensed medicine (charge capture)"
+    ).update(is_pharmacy=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0033_payment_unique_reference'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='is_pharmacy',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(flag_pharmacy_services, migrations.RunPython.noop),
+    ]
@@ -2,8 +2,8 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
 from django.utils import timezone
-import uuid
 from datetime import timedelta
+from decimal import Decimal
 
 
 # ==============================
@@ -19,9 +19,28 @@ class Hospital(models.Model):
     sla_head_doctor_minutes = models.PositiveIntegerField(default=10)
     sla_admin_minutes = models.PositiveIntegerField(default=20)
 
+    # Bumped with an F() update on every Service write; versions the cached
+    # service catalog (billing.services.catalog)
+    catalog_version = models.PositiveIntegerField(default=0)
+    # Bumped on every on-call shift and staff change; versions the in-memory
+    # on-call roster (billing.services.oncall)
+    roster_version = models.PositiveIntegerField(default=0)
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            # A stale instance must not move the cache versions backwards
+            deferred = self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key
+                and f.name not in ("catalog_version", "roster_version")
+                and f.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
 
 class CustomUser(AbstractUser):
     USER_ROLE_CHOICES = [
@@ -111,6 +130,17 @@ class SLAPolicy(models.Model):
 # PATIENT & VISIT MANAGEMENT
 # ==============================
 
+class InvoiceSequence(models.Model):
+    """Per-hospital invoice counter, handed out in blocks by
+    billing.services.invoice_numbers."""
+    hospital = models.OneToOneField(Hospital, on_delete=models.CASCADE, related_name="invoice_sequence")
+    prefix = models.CharField(max_length=20, unique=True)
+    next_value = models.PositiveBigIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.prefix} (next {self.next_value})"
+
+
 class Patient(models.Model):
     hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE)
     full_name = models.CharField(max_length=100)
@@ -167,6 +197,9 @@ class Service(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=8, decimal_places=2)
+    # Created by charge capture to bill a dispensed medicine; kept out of the
+    # bill form's catalog (billing.services.catalog)
+    is_pharmacy = models.BooleanField(default=False)
 
     class Meta:
         unique_together = ('hospital', 'name')
@@ -178,7 +211,12 @@ class Service(models.Model):
 class Bill(models.Model):
     hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE)
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE)
-    invoice_no = models.CharField(max_length=50, unique=True, default=uuid.uuid4)
+    # Assigned on first save from the hospital's InvoiceSequence
+    # (billing.services.invoice_numbers), e.g. "INV-GENERAL-0000042"
+    invoice_no = models.CharField(max_length=50, unique=True, blank=True)
+    # The uuid4 number of bills created before sequential numbering, kept
+    # so old invoices and bank narrations still resolve
+    legacy_invoice_no = models.CharField(max_length=50, blank=True, null=True, unique=True)
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
 
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
@@ -197,7 +235,24 @@ class Bill(models.Model):
         blank=True
     )
 
+    # Running payment totals, maintained with F() updates by
+    # billing.services.payments in the same transaction as each Payment
+    amount_paid = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    balance_due = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
     is_fully_paid = models.BooleanField(default=False)
+
+    # Bumped whenever a Payment or BillItem for this bill is written; part of
+    # the invoice PDF cache key
+    revision = models.PositiveIntegerField(default=0)
+
+    # Bills opened by charge capture (billing.services.charge_capture) stay
+    # drafts, collecting the visit's lab, radiology and pharmacy charges,
+    # until the visit is completed
+    visit = models.ForeignKey(
+        PatientVisit, on_delete=models.SET_NULL, null=True, blank=True, related_name="bills"
+    )
+    is_draft = models.BooleanField(default=False)
     
     CLAIM_STATUS = [
         ("draft", "Draft"),
@@ -220,12 +275,47 @@ class Bill(models.Model):
 
     claimed_at = models.DateTimeField(null=True, blank=True)
 
+    claim_batch = models.ForeignKey(
+        'ClaimBatch',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='bills'
+    )
+
     paid_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of the bill list: WHERE hospital = ? ORDER BY created_at DESC, id DESC
+            models.Index(fields=["hospital", "created_at", "id"], name="bill_hospital_created_idx"),
+        ]
+
+    LEDGER_FIELDS = ("amount_paid", "balance_due")
+
     def __str__(self):
         return f"Invoice {self.invoice_no}"
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.balance_due = Decimal(self.total_amount) - Decimal(self.amount_paid)
+            if not self.invoice_no:
+                from billing.services.invoice_numbers import next_invoice_number
+
+                self.invoice_no = next_invoice_number(self.hospital_id)
+        elif kwargs.get("update_fields") is None:
+            # A full save from an instance loaded before a payment was posted
+            # must not overwrite the running totals with stale values
+            deferred = self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key
+                and f.name not in self.LEDGER_FIELDS
+                and f.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
     @property
     def third_party_type(self):
         if not self.third_party:
@@ -239,13 +329,53 @@ class BillItem(models.Model):
     bill = models.ForeignKey(Bill, related_name='items', on_delete=models.CASCADE)
     service = models.ForeignKey(Service, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
+    # Price charged per unit: the payer tariff or Service.price at billing time
+    unit_price = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
     subtotal = models.DecimalField(max_digits=10, decimal_places=2)
 
     def save(self, *args, **kwargs):
-        self.subtotal = self.service.price * self.quantity
+        if self.unit_price is None:
+            self.unit_price = self.service.price
+        self.subtotal = self.unit_price * self.quantity
         super().save(*args, **kwargs)
 
 
+class ChargeEvent(models.Model):
+    """A billable lab, radiology or pharmacy event awaiting its visit's draft bill.
+
+    Recorded as the event happens; billing.services.charge_capture moves
+    pending events onto the bill in batches and sets `bill`.
+    """
+    SOURCES = [
+        ("lab", "Lab Test"),
+        ("radiology", "Radiology"),
+        ("pharmacy", "Pharmacy"),
+    ]
+
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE)
+    visit = models.ForeignKey(PatientVisit, on_delete=models.CASCADE, related_name="charge_events")
+    source = models.CharField(max_length=20, choices=SOURCES)
+    source_id = models.PositiveIntegerField()
+    service = models.ForeignKey(Service, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=1)
+    # Fixed price (e.g. the medicine's price); None = priced from the payer tariff when billed
+    unit_price = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+    bill = models.ForeignKey(
+        Bill, on_delete=models.SET_NULL, null=True, blank=True, related_name="charge_events"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # One charge per service per source record, so re-saving a request never bills twice
+        unique_together = ("source", "source_id", "service")
+        indexes = [
+            models.Index(fields=["bill", "created_at"], name="charge_pending_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_source_display()} #{self.source_id} - {self.service.name} x{self.quantity}"
+
+
 class Payment(models.Model):
     PAYMENT_METHODS = [
         ('cash', 'Cash'),
@@ -258,11 +388,42 @@ class Payment(models.Model):
     amount_paid = models.DecimalField(max_digits=10, decimal_places=2)
     paid_on = models.DateTimeField(auto_now_add=True)
     payment_mode = models.CharField(max_length=50, choices=PAYMENT_METHODS)
+    # Bank transaction reference for imported transfers; guards against re-imports
+    reference = models.CharField(max_length=100, blank=True, default="", db_index=True)
+
+    class Meta:
+        constraints = [
+            # A bank transaction is posted once per hospital, even by concurrent imports
+            models.UniqueConstraint(
+                fields=["hospital", "reference"],
+                condition=~models.Q(reference=""),
+                name="payment_unique_reference",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.bill.invoice_no} - ₦{self.amount_paid}"
 
 
+class DailyRevenue(models.Model):
+    """Payments pre-aggregated per hospital, day and payment mode.
+
+    Maintained by billing.services.payments.post_payment in the same
+    transaction as the Payment insert; rebuild with `rebuild_daily_revenue`.
+    """
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name="daily_revenue")
+    day = models.DateField()
+    payment_mode = models.CharField(max_length=50, choices=Payment.PAYMENT_METHODS)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    payment_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("hospital", "day", "payment_mode")
+
+    def __str__(self):
+        return f"{self.hospital} | {self.day} {self.payment_mode}: ₦{self.total}"
+
+
 class Payer(models.Model):
     PAYER_TYPE = [
         ("government", "Government"),
@@ -627,6 +788,26 @@ class VitalAlert(models.Model):
         blank=True,
     )
 
+    class Meta:
+        indexes = [
+            # Change feed of the SLA scheduler (billing.services.sla_scheduler)
+            models.Index(fields=["updated_at"], name="vitalalert_updated_idx"),
+            # Open alerts by escalation deadline (run_sla_monitor); partial, so
+            # it only holds the alerts still open. status leads so SQLite can
+            # match the whole WHERE clause and prefers it to the index below
+            models.Index(
+                fields=["status", "escalation_deadline"],
+                condition=models.Q(status="open"),
+                name="vitalalert_open_deadline_idx",
+            ),
+            # Alerts by status, oldest first: escalation rules, the alert
+            # dashboards and the scheduler's rescan
+            models.Index(fields=["status", "created_at"], name="vitalalert_status_created_idx"),
+            # A patient's unresolved alerts (EMR and vitals pages); replaces
+            # the patient foreign key index for those lookups
+            models.Index(fields=["patient", "status"], name="vitalalert_patient_status_idx"),
+        ]
+
     def __str__(self):
         return f"Alert: {self.patient} ({self.status})"
 
@@ -695,6 +876,28 @@ class VitalAlertLog(models.Model):
         return f"{self.action} @ {self.created_at}"
 
 
+class OnCallShift(models.Model):
+    """A user covering an escalation role at a hospital between two times.
+
+    Where shifts overlap, the one that started last is on call.
+    """
+
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name="oncall_shifts")
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="oncall_shifts")
+    role = models.CharField(max_length=20, choices=VitalAlert.ESCALATION_TARGETS)
+    starts_at = models.DateTimeField()
+    ends_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ["starts_at"]
+        indexes = [
+            models.Index(fields=["hospital", "ends_at"], name="oncall_hospital_ends_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} on call as {self.role} ({self.starts_at:%Y-%m-%d %H:%M} - {self.ends_at:%H:%M})"
+
+
 
 # =======================================================
 # CONSULTATION NOTES    
@@ -743,3 +946,85 @@ class ThirdPartyPayer(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class PayerTariff(models.Model):
+    """Price a third-party payer has agreed for a service.
+
+    Bills for patients whose coverage maps to `third_party` are priced at
+    the tariff in effect on the billing day instead of Service.price; see
+    billing.services.tariffs. Writes bump the hospital's catalog_version.
+    """
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name="tariffs")
+    third_party = models.ForeignKey(ThirdPartyPayer, on_delete=models.CASCADE, related_name="tariffs")
+    price = models.DecimalField(max_digits=8, decimal_places=2)
+    effective_from = models.DateField()
+    # Last day the tariff applies; None = until replaced
+    effective_to = models.DateField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["service", "third_party", "effective_from"]
+        unique_together = ("service", "third_party", "effective_from")
+
+    def __str__(self):
+        return f"{self.service.name} | {self.third_party} - ₦{self.price} from {self.effective_from}"
+
+
+class AgingSnapshot(models.Model):
+    """Nightly receivables aging per hospital and payer (None = self-pay).
+
+    Written by the `snapshot_receivables_aging` command from
+    billing.services.aging; feeds the aging trend chart.
+    """
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name="aging_snapshots")
+    third_party = models.ForeignKey(ThirdPartyPayer, on_delete=models.CASCADE, null=True, blank=True)
+    as_of = models.DateField()
+
+    patient_current = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    patient_31_60 = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    patient_61_90 = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    patient_over_90 = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    payer_current = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    payer_31_60 = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    payer_61_90 = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    payer_over_90 = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["hospital", "as_of"], name="aging_hospital_as_of_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.hospital} | {self.third_party or 'Self-pay'} aging {self.as_of}"
+
+
+class ClaimBatch(models.Model):
+    """A submission of draft bills to one third-party payer.
+
+    Bills join a batch while in draft and follow the batch through
+    submitted -> paid / rejected; see billing.services.claims.
+    """
+    STATUS = Bill.CLAIM_STATUS
+
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name="claim_batches")
+    third_party = models.ForeignKey(ThirdPartyPayer, on_delete=models.PROTECT, related_name="claim_batches")
+    reference = models.CharField(max_length=100, unique=True)
+    status = models.CharField(max_length=20, choices=STATUS, default="draft")
+
+    bill_count = models.PositiveIntegerField(default=0)
+    total_claimed = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    submitted_at = models.DateTimeField(null=True, blank=True)
+    settled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.reference} ({self.third_party.code}, {self.status})"
@@ -0,0 +1,158 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal as D
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from billing.models import AgingSnapshot, Bill
+from billing.utils.billing import CENT
+
+# (name, first day, last day); None = open-ended
+BUCKETS = (
+    ("current", 0, 30),
+    ("31_60", 31, 60),
+    ("61_90", 61, 90),
+    ("over_90", 91, None),
+)
+
+OPEN_CLAIM_STATUSES = ("draft", "submitted")
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+def bucket_fields():
+    return [f"{side}_{name}" for side in ("patient", "payer") for name, _, _ in BUCKETS]
+
+
+def _created_between(as_of, first_day, last_day):
+    """created_at bounds for bills aged first_day..last_day days on `as_of`."""
+    def start_of(day):
+        return timezone.make_aware(datetime.combine(day, time.min))
+
+    condition = Q(created_at__lt=start_of(as_of - timedelta(days=first_day - 1)))
+    if last_day is not None:
+        condition &= Q(created_at__gte=start_of(as_of - timedelta(days=last_day)))
+    return condition
+
+
+def aging_rows(hospital=None, as_of=None):
+    """Outstanding receivables per (hospital, payer), bucketed by bill age.
+
+    One GROUP BY over open bills with a filtered SUM per bucket and side:
+    `patient_*` is the unpaid patient share of bills not fully paid,
+    `payer_*` is the third-party share of claims still draft or submitted.
+    Bills without a third party are grouped under payer None (self-pay).
+    """
+    as_of = as_of or timezone.localdate()
+    patient_open = Q(is_fully_paid=False)
+    payer_open = Q(third_party__isnull=False, claim_status__in=OPEN_CLAIM_STATUSES)
+
+    bills = Bill.objects.filter(patient_open | payer_open)
+    if hospital:
+        bills = bills.filter(hospital=hospital)
+
+    patient_due = Greatest(F("patient_payable") - F("amount_paid"), Value(D("0")), output_field=MONEY)
+
+    aggregates = {}
+    for name, first_day, last_day in BUCKETS:
+        age = _created_between(as_of, first_day, last_day)
+        aggregates[f"patient_{name}"] = Coalesce(
+            Sum(patient_due, filter=patient_open & age), Value(D("0")), output_field=MONEY
+        )
+        aggregates[f"payer_{name}"] = Coalesce(
+            Sum("third_party_payable", filter=payer_open & age), Value(D("0")), output_field=MONEY
+        )
+
+    rows = (
+        bills.values("hospital_id", "third_party_id", "third_party__code", "third_party__name")
+        .annotate(**aggregates)
+        .order_by("hospital_id", "third_party__code")
+    )
+    fields = bucket_fields()
+    outstanding = []
+    for row in rows:
+        if any(row[field] for field in fields):
+            row.update({field: D(row[field]).quantize(CENT) for field in fields})
+            outstanding.append(row)
+    return outstanding
+
+
+def aging_totals(rows):
+    totals = {field: D("0") for field in bucket_fields()}
+    for row in rows:
+        for field in totals:
+            totals[field] += row[field]
+    for name, _, _ in BUCKETS:
+        totals[f"all_{name}"] = totals[f"patient_{name}"] + totals[f"payer_{name}"]
+    totals["patient_total"] = sum(totals[f"patient_{name}"] for name, _, _ in BUCKETS)
+    totals["payer_total"] = sum(totals[f"payer_{name}"] for name, _, _ in BUCKETS)
+    return totals
+
+
+def _cache():
+    config = getattr(settings, "RECEIVABLES_AGING", {})
+    return caches[config.get("CACHE", "default")], config.get("CACHE_TTL", 300)
+
+
+def cached_aging(hospital):
+    """Live aging for a hospital, recomputed at most every CACHE_TTL seconds."""
+    cache, ttl = _cache()
+    as_of = timezone.localdate()
+    key = f"billing:aging:{hospital.pk}:{as_of.isoformat()}"
+
+    rows = cache.get(key)
+    if rows is None:
+        rows = aging_rows(hospital, as_of)
+        cache.set(key, rows, ttl)
+    return rows
+
+
+def take_snapshot(hospital=None, as_of=None):
+    """Store today's aging rows; re-running for the same day replaces them."""
+    as_of = as_of or timezone.localdate()
+    rows = aging_rows(hospital, as_of)
+
+    existing = AgingSnapshot.objects.filter(as_of=as_of)
+    if hospital:
+        existing = existing.filter(hospital=hospital)
+
+    snapshots = [
+        AgingSnapshot(
+            hospital_id=row["hospital_id"],
+            third_party_id=row["third_party_id"],
+            as_of=as_of,
+            **{field: row[field] for field in bucket_fields()},
+        )
+        for row in rows
+    ]
+    with transaction.atomic():
+        existing.delete()
+        AgingSnapshot.objects.bulk_create(snapshots)
+    return len(snapshots)
+
+
+def aging_trend(hospital, days=90):
+    """[(day, {bucket field: total})] from snapshots, oldest first."""
+    since = timezone.localdate() - timedelta(days=days)
+    rows = (
+        AgingSnapshot.objects.filter(hospital=hospital, as_of__gte=since)
+        .values("as_of")
+        .annotate(**{f"sum_{field}": Sum(field) for field in bucket_fields()})
+        .order_by("as_of")
+    )
+    return [(row["as_of"], {field: row[f"sum_{field}"] for field in bucket_fields()}) for row in rows]
+
+
+def aging_chart(hospital, days=90):
+    """Trend series for the aging chart: patient, payer and 90+ day totals per snapshot."""
+    chart = {"labels": [], "patient": [], "payer": [], "over_90": []}
+    for day, values in aging_trend(hospital, days):
+        chart["labels"].append(day.isoformat())
+        chart["patient"].append(float(sum(values[f"patient_{name}"] for name, _, _ in BUCKETS)))
+        chart["payer"].append(float(sum(values[f"payer_{name}"] for name, _, _ in BUCKETS)))
+        chart["over_90"].append(float(values["patient_over_90"] + values["payer_over_90"]))
+    return chart
@@ -0,0 +1,235 @@
+import hashlib
+from dataclasses import dataclass
+from decimal import Decimal as D
+
+import pandas as pd
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThanOrEqual
+from django.utils import timezone
+
+from billing.models import Bill, Hospital, Payment
+from billing.services.invoice_numbers import INVOICE_NUMBER_RE
+from billing.services.revenue import record_revenue
+from billing.utils.billing import CENT
+
+# Sequential numbers, or the uuid4 numbers of bills created before them.
+# Matching is case-insensitive; banks often upper-case the narration.
+LEGACY_INVOICE_RE = r"[0-9a-f]{8}-(?:[0-9a-f]{4}-){3}[0-9a-f]{12}"
+INVOICE_RE = rf"(?i)({INVOICE_NUMBER_RE}|{LEGACY_INVOICE_RE})"
+
+COLUMN_ALIASES = {
+    "date": ("date", "value_date", "transaction_date", "posted_date"),
+    "amount": ("amount", "credit", "credit_amount", "deposit"),
+    "narration": ("narration", "description", "details", "remarks"),
+    "reference": ("reference", "transaction_id", "bank_reference", "ref"),
+}
+
+LOOKUP_CHUNK = 2000
+
+
+class StatementFormatError(ValueError):
+    pass
+
+
+@dataclass
+class StatementImport:
+    lines: int
+    matched: int
+    matched_total: D
+    unmatched: pd.DataFrame
+    dry_run: bool = False
+
+    def unmatched_rows(self):
+        return self.unmatched.to_dict("records")
+
+
+def _naira(kobo):
+    return (D(int(kobo)) / 100).quantize(CENT)
+
+
+def _column(frame, name, required=True):
+    for alias in COLUMN_ALIASES[name]:
+        if alias in frame.columns:
+            return frame[alias]
+    if required:
+        raise StatementFormatError(
+            f"Statement needs a {name} column (one of: {', '.join(COLUMN_ALIASES[name])})"
+        )
+    return None
+
+
+def read_statement(source):
+    """Normalise a bank statement CSV into line/date/kobo/narration/invoice/reference columns."""
+    try:
+        raw = pd.read_csv(source, dtype=str, keep_default_na=False)
+    except pd.errors.EmptyDataError:
+        raise StatementFormatError("The statement is empty") from None
+    except (pd.errors.ParserError, UnicodeDecodeError) as exc:
+        raise StatementFormatError(f"The statement is not a readable CSV file: {exc}") from None
+    raw.columns = [str(c).strip().lower().replace(" ", "_") for c in raw.columns]
+
+    narration = _column(raw, "narration").str.strip()
+    amount = pd.to_numeric(_column(raw, "amount").str.replace(",", "", regex=False), errors="coerce")
+
+    frame = pd.DataFrame({
+        "line": raw.index + 2,  # 1-based, after the header row
+        "date": _column(raw, "date").str.strip(),
+        "kobo": (amount * 100).round().astype("Int64"),
+        "narration": narration,
+        "invoice": narration.str.extract(INVOICE_RE, expand=False).str.lower(),
+    })
+
+    reference = _column(raw, "reference", required=False)
+    if reference is not None and reference.str.strip().ne("").all():
+        frame["reference"] = reference.str.strip()
+    else:
+        # No usable bank reference: derive a stable one from the line's content,
+        # numbering repeats of an identical line so they stay distinct
+        basis = frame["date"] + "|" + frame["kobo"].astype(str) + "|" + narration
+        occurrence = basis.groupby(basis).cumcount().astype(str)
+        frame["reference"] = (basis + "|" + occurrence).map(
+            lambda text: "stmt-" + hashlib.sha1(text.encode()).hexdigest()[:24]
+        )
+    return frame
+
+
+def _open_bills(hospital, invoices):
+    rows = []
+    for start in range(0, len(invoices), LOOKUP_CHUNK):
+        # Sequential numbers are stored upper-case, uuid4 numbers lower-case
+        chunk = invoices[start:start + LOOKUP_CHUNK]
+        chunk += [number.upper() for number in chunk]
+        bills = Bill.objects.filter(hospital=hospital).filter(
+            Q(invoice_no__in=chunk) | Q(legacy_invoice_no__in=chunk)
+        )
+        for bill_id, invoice_no, legacy_no, balance_due in bills.values_list(
+            "id", "invoice_no", "legacy_invoice_no", "balance_due"
+        ):
+            rows.append((bill_id, invoice_no, balance_due))
+            if legacy_no:
+                rows.append((bill_id, legacy_no, balance_due))
+    bills = pd.DataFrame(rows, columns=["bill_id", "invoice", "balance_due"])
+    bills["invoice"] = bills["invoice"].str.lower()
+    bills = bills.drop_duplicates("invoice")
+    bills["balance_kobo"] = bills["balance_due"].map(lambda amount: int(amount * 100)).astype("Int64")
+    return bills.drop(columns="balance_due")
+
+
+def _imported_references(hospital, references):
+    seen = set()
+    for start in range(0, len(references), LOOKUP_CHUNK):
+        chunk = references[start:start + LOOKUP_CHUNK]
+        seen.update(
+            Payment.objects.filter(hospital=hospital, reference__in=chunk).values_list("reference", flat=True)
+        )
+    return seen
+
+
+def match_statement(hospital, frame):
+    """Return `frame` with bill_id and an unmatched `reason` per line.
+
+    Bills are fetched once for every invoice number on the statement and
+    joined in memory (pandas hash join); a line matches when its invoice
+    belongs to `hospital` and the running total of matched lines for that
+    bill stays within the bill's balance.
+    """
+    frame = frame.copy()
+    frame["reason"] = None
+
+    def flag(mask, reason):
+        frame.loc[mask.fillna(False).astype(bool) & frame["reason"].isna(), "reason"] = reason
+
+    flag(frame["kobo"].isna() | (frame["kobo"] <= 0), "invalid amount")
+    flag(frame["invoice"].isna(), "no invoice number")
+    flag(frame["reference"].duplicated(), "duplicate line")
+
+    imported = _imported_references(hospital, frame["reference"].unique().tolist())
+    flag(frame["reference"].isin(imported), "already imported")
+
+    invoices = frame.loc[frame["reason"].isna(), "invoice"].unique().tolist()
+    bills = _open_bills(hospital, invoices)
+    frame = frame.merge(bills, on="invoice", how="left")
+    flag(frame["bill_id"].isna(), "unknown invoice")
+
+    candidate = frame["reason"].isna()
+    running = frame["kobo"].where(candidate, 0).groupby(frame["bill_id"]).cumsum()
+    flag(candidate & (running > frame["balance_kobo"]), "exceeds balance due")
+    return frame
+
+
+def _apply_bill_totals(bill_ids):
+    """Recompute running totals of `bill_ids` from Payment in one UPDATE per chunk."""
+    money = DecimalField(max_digits=12, decimal_places=2)
+    paid = Coalesce(
+        Subquery(
+            Payment.objects.filter(bill=OuterRef("pk"))
+            .values("bill")
+            .annotate(total=Sum("amount_paid"))
+            .values("total")
+        ),
+        Value(D("0")),
+        output_field=money,
+    )
+    for start in range(0, len(bill_ids), LOOKUP_CHUNK):
+        chunk = bill_ids[start:start + LOOKUP_CHUNK]
+        Bill.objects.filter(pk__in=chunk).update(
+            amount_paid=paid,
+            balance_due=F("total_amount") - paid,
+            is_fully_paid=Case(
+                When(GreaterThanOrEqual(paid, F("patient_payable")), then=Value(True)),
+                default=F("is_fully_paid"),
+            ),
+            revision=F("revision") + 1,
+        )
+
+
+def import_statement(hospital, source, dry_run=False):
+    """Match a bank statement against `hospital`'s bills and post the transfers.
+
+    Imports for one hospital run one at a time: the hospital row is locked
+    before matching, so a statement posted twice at once is matched the
+    second time against the first import's payments. The unique
+    (hospital, reference) constraint backs this up where rows cannot be
+    locked (SQLite).
+    """
+    frame = read_statement(source)
+
+    try:
+        with transaction.atomic():
+            if not dry_run:
+                Hospital.objects.select_for_update().only("id").get(pk=hospital.pk)
+            frame = match_statement(hospital, frame)
+            matched = frame[frame["reason"].isna()]
+
+            result = StatementImport(
+                lines=len(frame),
+                matched=len(matched),
+                matched_total=_naira(matched["kobo"].sum()),
+                unmatched=frame.loc[frame["reason"].notna(), ["line", "date", "kobo", "narration", "reason"]]
+                .assign(amount=lambda df: df["kobo"].map(lambda k: None if pd.isna(k) else str(_naira(k))))
+                .drop(columns="kobo"),
+                dry_run=dry_run,
+            )
+            if dry_run or matched.empty:
+                return result
+
+            payments = [
+                Payment(
+                    hospital=hospital,
+                    bill_id=int(row.bill_id),
+                    amount_paid=_naira(row.kobo),
+                    payment_mode="transfer",
+                    reference=row.reference,
+                )
+                for row in matched.itertuples(index=False)
+            ]
+            Payment.objects.bulk_create(payments, batch_size=1000)
+            _apply_bill_totals(sorted({payment.bill_id for payment in payments}))
+            record_revenue(
+                hospital.id, timezone.localdate(), "transfer", result.matched_total, count=len(payments)
+            )
+    except IntegrityError:
+        raise StatementFormatError("This statement is already being imported") from None
+    return result
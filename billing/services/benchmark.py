@@ -0,0 +1,240 @@
+import random
+import statistics
+import time
+from collections import Counter
+from dataclasses import dataclass
+from decimal import Decimal as D
+
+import django
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from billing.models import Bill, BillItem, CustomUser, Hospital, Patient, Service
+from billing.services.invoice_numbers import invoice_numbers
+
+REPORT_VERSION = 1
+
+
+@dataclass
+class Volumes:
+    hospitals: int = 1
+    patients: int = 200
+    services: int = 100
+    bills: int = 1000
+    items_per_bill: int = 3
+
+
+@dataclass
+class SeededData:
+    user: CustomUser
+    patient_ids: list
+    service_ids: list
+    bill_ids: list
+
+
+def seed(volumes, seed=0):
+    """Bulk-insert `volumes` of billing data; returns ids for the first hospital.
+
+    Patients, services and bills are spread evenly over the hospitals.
+    Bills are inserted with their items in bulk, bypassing Bill.save, so
+    invoice numbers come from a dedicated block per hospital.
+    """
+    rng = random.Random(seed)
+    tag = f"{timezone.now():%Y%m%d%H%M%S}-{rng.randrange(10 ** 6):06d}"
+
+    with transaction.atomic():
+        hospitals = Hospital.objects.bulk_create(
+            Hospital(name=f"Benchmark {i}", slug=f"benchmark-{tag}-{i}") for i in range(volumes.hospitals)
+        )
+        patients = Patient.objects.bulk_create(
+            Patient(
+                hospital=hospitals[i % len(hospitals)],
+                full_name=f"Patient {i}",
+                date_of_birth="1990-01-01",
+                phone_number=f"080{i:08d}",
+            )
+            for i in range(volumes.patients)
+        )
+        services = Service.objects.bulk_create(
+            Service(
+                hospital=hospitals[i % len(hospitals)],
+                name=f"Service {i}",
+                price=D(rng.randrange(500, 50000)) / 10,
+            )
+            for i in range(volumes.services)
+        )
+
+        by_hospital = {
+            hospital.id: (
+                [p for p in patients if p.hospital_id == hospital.id],
+                [s for s in services if s.hospital_id == hospital.id],
+            )
+            for hospital in hospitals
+        }
+
+        bills, lines = [], []
+        for i in range(volumes.bills):
+            hospital = hospitals[i % len(hospitals)]
+            hospital_patients, hospital_services = by_hospital[hospital.id]
+            chosen = rng.sample(hospital_services, min(volumes.items_per_bill, len(hospital_services)))
+            quantities = [rng.randint(1, 3) for _ in chosen]
+            total = sum((s.price * q for s, q in zip(chosen, quantities)), D("0"))
+            bills.append(Bill(
+                hospital=hospital,
+                patient=rng.choice(hospital_patients),
+                total_amount=total,
+                patient_payable=total,
+                balance_due=total,
+            ))
+            lines.append(list(zip(chosen, quantities)))
+
+        for hospital in hospitals:
+            hospital_bills = [bill for bill in bills if bill.hospital_id == hospital.id]
+            for bill, number in zip(hospital_bills, invoice_numbers.allocate(hospital.id, len(hospital_bills))):
+                bill.invoice_no = number
+
+        bills = Bill.objects.bulk_create(bills, batch_size=1000)
+        BillItem.objects.bulk_create(
+            (
+                BillItem(
+                    bill=bill, service=service, quantity=quantity,
+                    unit_price=service.price, subtotal=service.price * quantity,
+                )
+                for bill, bill_lines in zip(bills, lines)
+                for service, quantity in bill_lines
+            ),
+            batch_size=1000,
+        )
+
+        user = CustomUser.objects.create_user(
+            username=f"benchmark-{tag}", password=None, hospital=hospitals[0], role="accountant"
+        )
+
+    first_patients, first_services = by_hospital[hospitals[0].id]
+    return SeededData(
+        user=user,
+        patient_ids=[p.id for p in first_patients],
+        service_ids=[s.id for s in first_services],
+        bill_ids=[b.id for b in bills if b.hospital_id == hospitals[0].id],
+    )
+
+
+def _create_bill(client, data, rng):
+    services = rng.sample(data.service_ids, min(3, len(data.service_ids)))
+    return client.post(
+        reverse("create_bill", args=[rng.choice(data.patient_ids)]),
+        {"service": services, "quantity": [rng.randint(1, 3) for _ in services]},
+    )
+
+
+def _record_payment(client, data, rng):
+    return client.post(
+        reverse("record_payment", args=[rng.choice(data.bill_ids)]),
+        {"amount": "10.00", "payment_method": "cash"},
+    )
+
+
+def _view_invoice(client, data, rng):
+    return client.get(reverse("view_invoice", args=[rng.choice(data.bill_ids)]))
+
+
+def _download_invoice_pdf(client, data, rng):
+    return client.get(reverse("download_invoice_pdf", args=[rng.choice(data.bill_ids)]))
+
+
+def _download_cached_invoice_pdf(client, data, rng):
+    return client.get(reverse("download_invoice_pdf", args=[data.bill_ids[0]]))
+
+
+# name -> request driver(client, seeded data, rng)
+BENCHMARK_VIEWS = {
+    "create_bill": _create_bill,
+    "record_payment": _record_payment,
+    "view_invoice": _view_invoice,
+    "download_invoice_pdf": _download_invoice_pdf,
+    "download_invoice_pdf_cached": _download_cached_invoice_pdf,
+}
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def _summarise(timings, queries, statuses):
+    return {
+        "requests": len(timings),
+        "p50_ms": round(percentile(timings, 50), 2),
+        "p95_ms": round(percentile(timings, 95), 2),
+        "mean_ms": round(statistics.fmean(timings), 2),
+        "queries_p50": percentile(queries, 50),
+        "queries_max": max(queries),
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+def run_benchmark(data, views=None, iterations=50, warmup=3, seed=0):
+    """Drive each view through the test client; returns {view: summary}.
+
+    Every request runs inside CaptureQueriesContext, so query counts are
+    exact; latency is wall time for the whole request, middleware included.
+    """
+    client = Client()
+    client.force_login(data.user)
+    results = {}
+
+    for name in views or BENCHMARK_VIEWS:
+        drive = BENCHMARK_VIEWS[name]
+        rng = random.Random(f"{seed}-{name}")
+        for _ in range(warmup):
+            drive(client, data, rng)
+
+        timings, queries, statuses = [], [], Counter()
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = drive(client, data, rng)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(captured.captured_queries))
+            statuses[response.status_code] += 1
+
+        results[name] = _summarise(timings, queries, statuses)
+    return results
+
+
+def build_report(results, volumes, iterations):
+    return {
+        "version": REPORT_VERSION,
+        "created_at": timezone.now().isoformat(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        "volumes": vars(volumes),
+        "iterations": iterations,
+        "views": results,
+    }
+
+
+def compare(report, baseline, tolerance=0.2):
+    """Regressions of `report` against `baseline` as human-readable strings.
+
+    Query counts are deterministic and must not grow at all; p50/p95
+    latency may grow by up to `tolerance` (a fraction) before it counts.
+    """
+    regressions = []
+    for name, current in report["views"].items():
+        previous = baseline.get("views", {}).get(name)
+        if previous is None:
+            continue
+        if current["queries_max"] > previous["queries_max"]:
+            regressions.append(
+                f"{name}: queries_max {previous['queries_max']} -> {current['queries_max']}"
+            )
+        for metric in ("p50_ms", "p95_ms"):
+            if current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {previous[metric]} -> {current[metric]}")
+    return regressions
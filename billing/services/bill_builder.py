@@ -0,0 +1,91 @@
+from decimal import Decimal as D
+
+from django.db import transaction
+from django.db.models import F
+
+from billing.models import Bill, BillItem, Service
+from billing.services.coverage import resolve_coverage
+from billing.services.tariffs import unit_price
+from billing.utils.audit import log_action
+from billing.utils.billing import calculate_bill_split
+
+
+def resolve_lines(hospital, lines, third_party=None):
+    """Price (service_id, quantity) pairs against the hospital's services.
+
+    All services are fetched with a single ``IN`` query, together with the
+    hospital's catalog version; lines are priced at `third_party`'s tariff
+    where it has one (from the in-memory tariff matrix) and at
+    Service.price otherwise. Returns a list of (service, quantity,
+    unit_price, subtotal) tuples and the bill total. Raises
+    ``Service.DoesNotExist`` for an unknown service and ``ValueError`` for a
+    service id or quantity that is not a positive integer.
+    """
+    parsed = []
+    for service_id, quantity in lines:
+        try:
+            service_id = int(service_id)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid service {service_id!r}") from None
+        try:
+            quantity = int(quantity)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid quantity {quantity!r} for service {service_id}") from None
+        if quantity < 1:
+            raise ValueError(f"Invalid quantity {quantity} for service {service_id}")
+        parsed.append((service_id, quantity))
+
+    services = (
+        Service.objects.filter(hospital=hospital)
+        .annotate(catalog_version=F("hospital__catalog_version"))
+        .in_bulk({service_id for service_id, _ in parsed})
+    )
+    third_party_id = third_party.id if third_party else None
+
+    priced, total = [], D("0.00")
+    for service_id, quantity in parsed:
+        service = services.get(service_id)
+        if service is None:
+            raise Service.DoesNotExist(f"Service {service_id} not found")
+        price = unit_price(service, third_party_id, service.catalog_version)
+        subtotal = price * quantity
+        total += subtotal
+        priced.append((service, quantity, price, subtotal))
+
+    return priced, total
+
+
+def build_bill(patient, lines, created_by=None):
+    """Create a Bill and all of its BillItems in a constant number of queries.
+
+    `lines` is an iterable of (service_id, quantity) pairs. Subtotals are
+    computed in memory and the items are written with one ``bulk_create``
+    inside the same transaction as the Bill, so a failure leaves nothing
+    behind.
+    """
+    coverage = resolve_coverage(patient)
+    priced, total = resolve_lines(patient.hospital, lines, coverage.third_party if coverage else None)
+    patient_payable, third_party_payable, third_party = calculate_bill_split(patient, total)
+
+    with transaction.atomic():
+        bill = Bill.objects.create(
+            patient=patient,
+            total_amount=total,
+            created_by=created_by,
+            hospital=patient.hospital,
+            patient_payable=patient_payable,
+            third_party_payable=third_party_payable,
+            third_party=third_party,
+        )
+
+        # bulk_create skips BillItem.save(), so the prices resolved above are kept
+        BillItem.objects.bulk_create(
+            [
+                BillItem(bill=bill, service=service, quantity=quantity, unit_price=price, subtotal=subtotal)
+                for service, quantity, price, subtotal in priced
+            ]
+        )
+
+        log_action(created_by, "create", "Bill", bill.id, f"Created bill of ${total} for {patient}")
+
+    return bill
@@ -0,0 +1,57 @@
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+
+from billing.models import Hospital, Service
+
+
+def _cache():
+    config = getattr(settings, "SERVICE_CATALOG", {})
+    return caches[config.get("CACHE", "default")], config.get("CACHE_TTL", 24 * 60 * 60)
+
+
+def bump_catalog_version(hospital_id):
+    """Invalidate a hospital's catalog. Service signals call this; call it
+    directly after bulk writes (bulk_create, QuerySet.update) that skip them."""
+    Hospital.objects.filter(pk=hospital_id).update(catalog_version=F("catalog_version") + 1)
+
+
+def catalog_version(hospital_id):
+    return Hospital.objects.values_list("catalog_version", flat=True).get(pk=hospital_id)
+
+
+def catalog_etag(hospital_id, version):
+    return f'"catalog-{hospital_id}-{version}"'
+
+
+def catalog_json(hospital_id, version):
+    """Compact JSON bytes of the hospital's billable services, cached per version.
+
+    Pharmacy services (one per dispensed medicine) are left out.
+
+    A new version gets a new cache key, so stale entries are never served
+    and simply expire.
+    """
+    cache, ttl = _cache()
+    key = f"billing:catalog:{hospital_id}:{version}"
+
+    payload = cache.get(key)
+    if payload is None:
+        services = (
+            Service.objects.filter(hospital_id=hospital_id, is_pharmacy=False)
+            .order_by("name")
+            .values_list("id", "name", "price")
+        )
+        payload = json.dumps(
+            {
+                "version": version,
+                "services": [
+                    {"id": pk, "name": name, "price": str(price)} for pk, name, price in services
+                ],
+            },
+            separators=(",", ":"),
+        ).encode()
+        cache.set(key, payload, ttl)
+    return payload
@@ -0,0 +1,291 @@
+import logging
+import threading
+from datetime import timedelta
+from decimal import Decimal as D
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.lookups import GreaterThanOrEqual
+from django.utils import timezone
+
+from billing.models import Bill, BillItem, ChargeEvent, Medicine, PatientVisit, Service
+from billing.services.bill_builder import resolve_lines
+from billing.services.coverage import resolve_coverage
+from billing.utils.billing import calculate_bill_split
+
+logger = logging.getLogger(__name__)
+
+# Dispensed medicines are billed through one Service per medicine
+PHARMACY_SERVICE_PREFIX = "Pharmacy: "
+
+
+def _service_named(hospital_id, name):
+    return Service.objects.filter(hospital_id=hospital_id, name__iexact=(name or "").strip()).first()
+
+
+def pharmacy_service(medicine):
+    service, _ = Service.objects.get_or_create(
+        hospital_id=medicine.hospital_id,
+        name=f"{PHARMACY_SERVICE_PREFIX}{medicine.name}"[:100],
+        defaults={
+            "price": medicine.price,
+            "description": "Dispensed medicine (charge capture)",
+            "is_pharmacy": True,
+        },
+    )
+    return service
+
+
+def prescription_lines(prescription):
+    """(medicine name, quantity) pairs from a prescription's "name x qty" lines."""
+    lines = []
+    for line in prescription.medicines.splitlines():
+        name, sep, quantity = line.rpartition("x")
+        if not sep or not name.strip():
+            continue
+        try:
+            quantity = int(quantity.strip())
+        except ValueError:
+            continue
+        if quantity > 0:
+            lines.append((name.strip(), quantity))
+    return lines
+
+
+def record_charges(hospital_id, visit_id, source, source_id, charges):
+    """Store (service, quantity, unit_price) charges for a source record.
+
+    Charges already recorded for the same source record and service are
+    skipped, so capturing twice never bills twice; returns how many were
+    inserted. The visit's flush is scheduled once the surrounding
+    transaction commits.
+    """
+    if not charges:
+        return 0
+    recorded = set(
+        ChargeEvent.objects.filter(source=source, source_id=source_id).values_list("service_id", flat=True)
+    )
+    events = [
+        ChargeEvent(
+            hospital_id=hospital_id,
+            visit_id=visit_id,
+            source=source,
+            source_id=source_id,
+            service=service,
+            quantity=quantity,
+            unit_price=unit_price,
+        )
+        for service, quantity, unit_price in charges
+        if service.id not in recorded
+    ]
+    if not events:
+        return 0
+    # A concurrent capture of the same record still loses to the unique constraint
+    ChargeEvent.objects.bulk_create(events, ignore_conflicts=True)
+    transaction.on_commit(lambda: charge_flusher.schedule(visit_id))
+    return len(events)
+
+
+def capture_lab_request(lab_request):
+    """Charge a lab request at the price of the hospital's Service of the same name."""
+    service = _service_named(lab_request.hospital_id, lab_request.test_type)
+    if service is None:
+        return 0
+    return record_charges(lab_request.hospital_id, lab_request.visit_id, "lab", lab_request.id, [(service, 1, None)])
+
+
+def capture_radiology_request(radiology_request):
+    service = _service_named(radiology_request.hospital_id, radiology_request.imaging_type)
+    if service is None:
+        return 0
+    return record_charges(
+        radiology_request.hospital_id, radiology_request.visit_id, "radiology", radiology_request.id,
+        [(service, 1, None)],
+    )
+
+
+def capture_prescription(prescription):
+    """Charge each dispensed medicine at its current Medicine.price."""
+    lines = prescription_lines(prescription)
+    if not lines:
+        return 0
+
+    names = Q()
+    for name, _ in lines:
+        names |= Q(name__iexact=name)
+    medicines = {
+        medicine.name.lower(): medicine
+        for medicine in Medicine.objects.filter(names, hospital_id=prescription.hospital_id)
+    }
+
+    quantities = {}
+    for name, quantity in lines:
+        medicine = medicines.get(name.lower())
+        if medicine is not None:
+            quantities[medicine] = quantities.get(medicine, 0) + quantity
+
+    charges = [
+        (pharmacy_service(medicine), quantity, medicine.price) for medicine, quantity in quantities.items()
+    ]
+    return record_charges(prescription.hospital_id, prescription.visit_id, "pharmacy", prescription.id, charges)
+
+
+def flush_visit(visit_id):
+    """Move a visit's pending charges onto its draft bill; returns the bill or None.
+
+    Once the visit is completed its bill is final: charges captured after
+    that (a prescription dispensed late, say) go on a new, finalised bill.
+    The visit row is locked so concurrent flushes of one visit serialise.
+    Items go in with one ``bulk_create`` and the bill's totals, coverage
+    split and revision move in one UPDATE, however many events are pending.
+    """
+    with transaction.atomic():
+        visit = PatientVisit.objects.select_for_update().get(pk=visit_id)
+        events = list(ChargeEvent.objects.filter(visit_id=visit_id, bill__isnull=True).order_by("id"))
+        if not events:
+            return None
+
+        # A draft still open on a completed visit is about to be closed; finish it here
+        is_draft = visit.status != "completed"
+        bill = Bill.objects.filter(visit_id=visit_id, is_draft=True).order_by("id").first()
+        if bill is None:
+            bill = Bill.objects.create(
+                hospital_id=visit.hospital_id,
+                patient_id=visit.patient_id,
+                visit=visit,
+                is_draft=is_draft,
+                total_amount=D("0.00"),
+            )
+
+        # Lines without a fixed price are priced like create_bill, payer tariffs included
+        coverage = resolve_coverage(visit.patient_id)
+        tariff_priced, _ = resolve_lines(
+            visit.hospital_id,
+            [(event.service_id, event.quantity) for event in events if event.unit_price is None],
+            coverage.third_party if coverage else None,
+        )
+        tariff_priced = iter(tariff_priced)
+
+        items, added = [], D("0.00")
+        for event in events:
+            if event.unit_price is None:
+                _, _, price, subtotal = next(tariff_priced)
+            else:
+                price, subtotal = event.unit_price, event.unit_price * event.quantity
+            items.append(BillItem(
+                bill=bill, service_id=event.service_id, quantity=event.quantity, unit_price=price, subtotal=subtotal,
+            ))
+            added += subtotal
+        BillItem.objects.bulk_create(items)
+
+        total = bill.total_amount + added
+        patient_payable, third_party_payable, third_party = calculate_bill_split(visit.patient_id, total)
+
+        # bulk_create skips the BillItem signals, so the revision is bumped here
+        Bill.objects.filter(pk=bill.pk).update(
+            total_amount=total,
+            patient_payable=patient_payable,
+            third_party_payable=third_party_payable,
+            third_party=third_party,
+            balance_due=total - F("amount_paid"),
+            is_fully_paid=Case(
+                When(GreaterThanOrEqual(F("amount_paid"), patient_payable), then=Value(True)),
+                default=Value(False),
+            ),
+            revision=F("revision") + 1,
+            is_draft=is_draft,
+        )
+        ChargeEvent.objects.filter(pk__in=[event.pk for event in events]).update(bill=bill)
+
+    bill.refresh_from_db()
+    return bill
+
+
+def close_visit_bill(visit_id):
+    """Flush what is pending and finalise the visit's draft bill."""
+    flush_visit(visit_id)
+    return Bill.objects.filter(visit_id=visit_id, is_draft=True).update(is_draft=False)
+
+
+def pending_visits(older_than=0):
+    """Visits with charges captured at least `older_than` seconds ago still unbilled."""
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    return list(
+        ChargeEvent.objects.filter(bill__isnull=True, created_at__lte=cutoff)
+        .values_list("visit_id", flat=True)
+        .distinct()
+    )
+
+
+class ChargeFlusher:
+    """Debounces charge flushes per visit.
+
+    The first event for a visit starts a timer; events arriving before it
+    fires are flushed with it, so a busy department costs one bill write
+    per `delay` seconds per visit rather than one per event. Timers are
+    per process: charges left pending by a process that exits are picked
+    up by the `flush_charges` command. A `delay` of 0 flushes immediately.
+    """
+
+    def __init__(self, delay=5.0, flush=flush_visit):
+        self.delay = delay
+        self.flush = flush
+        self._timers = {}
+        self._lock = threading.Lock()
+        self.counters = {"scheduled": 0, "coalesced": 0, "flushed": 0, "failed": 0}
+
+    def schedule(self, visit_id):
+        if self.delay <= 0:
+            self._run(visit_id)
+            return
+
+        with self._lock:
+            if visit_id in self._timers:
+                self.counters["coalesced"] += 1
+                return
+            timer = threading.Timer(self.delay, self._fire, args=(visit_id,))
+            timer.daemon = True
+            self._timers[visit_id] = timer
+            self.counters["scheduled"] += 1
+        timer.start()
+
+    def _fire(self, visit_id):
+        # Events recorded from here on schedule a new timer
+        with self._lock:
+            self._timers.pop(visit_id, None)
+        try:
+            self._run(visit_id)
+        finally:
+            close_old_connections()
+
+    def _run(self, visit_id):
+        try:
+            self.flush(visit_id)
+        except Exception:
+            # Left pending for the next flush or the flush_charges command
+            logger.exception("Charge flush failed for visit %s", visit_id)
+            with self._lock:
+                self.counters["failed"] += 1
+            return
+        with self._lock:
+            self.counters["flushed"] += 1
+
+    def pending(self):
+        with self._lock:
+            return len(self._timers)
+
+    def cancel_all(self):
+        with self._lock:
+            timers = list(self._timers.values())
+            self._timers.clear()
+        for timer in timers:
+            timer.cancel()
+
+
+def _build_flusher():
+    config = getattr(settings, "CHARGE_CAPTURE", {})
+    return ChargeFlusher(delay=config.get("DEBOUNCE_SECONDS", 5))
+
+
+charge_flusher = _build_flusher()
@@ -0,0 +1,216 @@
+import csv
+from abc import ABC, abstractmethod
+from decimal import Decimal as D
+
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from billing.models import BillItem
+
+# Payer code -> writer name, overridable with settings.CLAIM_FILES["FORMATS"]
+DEFAULT_PAYER_FORMATS = {
+    "NHIS": "fixed",
+}
+
+
+class ClaimFileError(ValueError):
+    """A batch cannot be written in the payer's claim file format."""
+
+
+def claim_file_rows(batch):
+    """One row per BillItem in the batch, in invoice order.
+
+    A single BillItem -> Bill -> Patient / Service join read as named
+    tuples; claim files only need a dozen columns, and skipping model
+    instantiation is most of the cost on large batches.
+    """
+    return (
+        BillItem.objects.filter(bill__claim_batch=batch)
+        .order_by("bill_id", "id")
+        .values_list(
+            "bill_id",
+            "bill__invoice_no",
+            "bill__created_at",
+            "bill__third_party_payable",
+            "bill__patient_id",
+            "bill__patient__full_name",
+            "bill__patient__date_of_birth",
+            "service__name",
+            "quantity",
+            "subtotal",
+            named=True,
+        )
+    )
+
+
+def _kobo(amount):
+    return int((D(amount) * 100).to_integral_value())
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+class ClaimFileWriter(ABC):
+    """Base class: turns a batch into an iterator of text lines.
+
+    Subclasses implement `line` and optionally header/trailer; `stream` walks
+    the claim rows with a chunked server-side iterator, so memory is bounded
+    by `chunk_size` rows whatever the size of the batch.
+    """
+
+    extension = "txt"
+    content_type = "text/plain"
+
+    def __init__(self, batch, chunk_size=2000):
+        self.batch = batch
+        self.chunk_size = chunk_size
+        self.line_count = 0
+        self.total = D("0")
+
+    def validate(self):
+        """Raise ClaimFileError before streaming if the batch cannot be written."""
+
+    def header(self):
+        return None
+
+    @abstractmethod
+    def line(self, row):
+        """Format one claim row as a line of the file."""
+
+    def trailer(self):
+        return None
+
+    def stream(self, rows=None):
+        rows = claim_file_rows(self.batch) if rows is None else rows
+
+        header = self.header()
+        if header:
+            yield header
+
+        for row in rows.iterator(chunk_size=self.chunk_size):
+            self.line_count += 1
+            self.total += row.subtotal
+            yield self.line(row)
+
+        trailer = self.trailer()
+        if trailer:
+            yield trailer
+
+    @property
+    def filename(self):
+        return f"{self.batch.reference}.{self.extension}"
+
+
+class CSVClaimWriter(ClaimFileWriter):
+    extension = "csv"
+    content_type = "text/csv"
+
+    COLUMNS = [
+        "batch_reference", "payer_code", "invoice_no", "bill_date", "patient_id", "patient_name",
+        "date_of_birth", "service", "quantity", "unit_price", "line_amount", "bill_payer_amount",
+    ]
+
+    def __init__(self, batch, chunk_size=2000):
+        super().__init__(batch, chunk_size)
+        self._csv = csv.writer(_Echo())
+
+    def header(self):
+        return self._csv.writerow(self.COLUMNS)
+
+    def line(self, row):
+        return self._csv.writerow([
+            self.batch.reference,
+            self.batch.third_party.code,
+            row.bill__invoice_no,
+            timezone.localdate(row.bill__created_at).isoformat(),
+            row.bill__patient_id,
+            row.bill__patient__full_name,
+            row.bill__patient__date_of_birth.isoformat(),
+            row.service__name,
+            row.quantity,
+            (row.subtotal / row.quantity).quantize(D("0.01")) if row.quantity else row.subtotal,
+            row.subtotal,
+            row.bill__third_party_payable,
+        ])
+
+
+class FixedWidthClaimWriter(ClaimFileWriter):
+    """H / D / T records, space-padded text and zero-padded amounts in kobo."""
+
+    def _text(self, value, width):
+        return str(value)[:width].ljust(width)
+
+    def _number(self, value, width):
+        value = str(value)
+        if len(value) > width:
+            raise ClaimFileError(
+                f"Batch {self.batch.reference}: {value} does not fit a {width}-digit field"
+            )
+        return value.rjust(width, "0")
+
+    def validate(self):
+        """Check the widest values up front, so a stream never fails half-written."""
+        widest = BillItem.objects.filter(bill__claim_batch=self.batch).aggregate(
+            max_patient=Max("bill__patient_id"),
+            max_quantity=Max("quantity"),
+            max_line=Max("subtotal"),
+            total=Sum("subtotal"),
+            line_count=Count("id"),
+        )
+        if not widest["line_count"]:
+            return
+        self._number(widest["max_patient"], 10)
+        self._number(widest["max_quantity"], 5)
+        self._number(_kobo(widest["max_line"]), 12)
+        self._number(widest["line_count"], 8)
+        self._number(_kobo(widest["total"]), 15)
+
+    def header(self):
+        return "".join([
+            "H",
+            self._text(self.batch.third_party.code, 10),
+            self._text(self.batch.reference, 40),
+            self._text(self.batch.hospital.slug, 30),
+            timezone.localdate().strftime("%Y%m%d"),
+        ]) + "\n"
+
+    def line(self, row):
+        return "".join([
+            "D",
+            self._text(row.bill__invoice_no, 36),
+            timezone.localdate(row.bill__created_at).strftime("%Y%m%d"),
+            self._number(row.bill__patient_id, 10),
+            self._text(row.bill__patient__full_name, 40),
+            row.bill__patient__date_of_birth.strftime("%Y%m%d"),
+            self._text(row.service__name, 40),
+            self._number(row.quantity, 5),
+            self._number(_kobo(row.subtotal), 12),
+        ]) + "\n"
+
+    def trailer(self):
+        return "".join([
+            "T",
+            self._number(self.line_count, 8),
+            self._number(_kobo(self.total), 15),
+        ]) + "\n"
+
+
+CLAIM_FILE_WRITERS = {
+    "csv": CSVClaimWriter,
+    "fixed": FixedWidthClaimWriter,
+}
+
+
+def writer_for(batch, fmt=None, chunk_size=2000):
+    """Build the claim file writer for a batch's payer, or an explicit `fmt`."""
+    if fmt is None:
+        formats = {**DEFAULT_PAYER_FORMATS, **getattr(settings, "CLAIM_FILES", {}).get("FORMATS", {})}
+        fmt = formats.get(batch.third_party.code, "csv")
+    try:
+        writer_class = CLAIM_FILE_WRITERS[fmt]
+    except KeyError:
+        raise ValueError(f"Unknown claim file format '{fmt}'")
+    return writer_class(batch, chunk_size=chunk_size)
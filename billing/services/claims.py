@@ -0,0 +1,175 @@
+import uuid
+from decimal import Decimal as D
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from billing.models import Bill, ClaimBatch, ThirdPartyPayer
+
+GOVERNMENT_PAYER_TYPES = ("federal", "state")
+
+# batch status -> statuses it may move to
+TRANSITIONS = {
+    "draft": ("submitted",),
+    "submitted": ("paid", "rejected"),
+}
+
+
+class ClaimTransitionError(ValueError):
+    pass
+
+
+def claimable_bills(hospital, third_party=None, since=None, until=None):
+    """Draft bills with a third-party share that are not yet in a batch.
+
+    Bills still collecting charges for an open visit are left out.
+    """
+    bills = Bill.objects.filter(
+        hospital=hospital,
+        is_draft=False,
+        claim_status="draft",
+        claim_batch__isnull=True,
+        third_party__isnull=False,
+        third_party_payable__gt=0,
+    )
+    if third_party:
+        bills = bills.filter(third_party=third_party)
+    if since:
+        bills = bills.filter(created_at__date__gte=since)
+    if until:
+        bills = bills.filter(created_at__date__lte=until)
+    return bills
+
+
+def _reference(third_party):
+    return f"CLM-{third_party.code}-{timezone.localdate():%Y%m}-{uuid.uuid4().hex[:6].upper()}"
+
+
+def create_claim_batches(hospital, third_party=None, since=None, until=None, created_by=None):
+    """Group claimable bills into one draft batch per payer; returns the new batches.
+
+    Per payer this is one INSERT for the batch and one UPDATE that attaches
+    its bills, whatever the number of bills.
+    """
+    bills = claimable_bills(hospital, third_party, since, until)
+    payer_ids = bills.order_by("third_party").values_list("third_party", flat=True).distinct()
+    payers = ThirdPartyPayer.objects.in_bulk(list(payer_ids))
+
+    batches = []
+    with transaction.atomic():
+        for payer in payers.values():
+            batch = ClaimBatch.objects.create(
+                hospital=hospital,
+                third_party=payer,
+                reference=_reference(payer),
+                created_by=created_by,
+            )
+            # Totals come from the rows actually attached in this transaction
+            attached = bills.filter(third_party=payer).update(claim_batch=batch)
+            totals = batch.bills.aggregate(total=Sum("third_party_payable"))
+            batch.bill_count = attached
+            batch.total_claimed = totals["total"] or D("0")
+            batch.save(update_fields=["bill_count", "total_claimed"])
+            batches.append(batch)
+    return batches
+
+
+def _transition(batch, status):
+    if status not in TRANSITIONS.get(batch.status, ()):
+        raise ClaimTransitionError(f"Cannot move batch {batch.reference} from {batch.status} to {status}")
+
+
+def _lock(batch):
+    """Lock the batch row and reload its status; call inside transaction.atomic().
+
+    Concurrent transitions of one batch then run one after the other, and
+    each sees the status the previous one committed.
+    """
+    status = ClaimBatch.objects.select_for_update().filter(pk=batch.pk).values_list("status", flat=True).first()
+    if status is None:
+        raise ClaimTransitionError(f"Batch {batch.reference} no longer exists")
+    batch.status = status
+
+
+def submit_batch(batch):
+    now = timezone.now()
+    with transaction.atomic():
+        _lock(batch)
+        _transition(batch, "submitted")
+        batch.bills.update(claim_status="submitted", claim_reference=batch.reference, claimed_at=now)
+        batch.status = "submitted"
+        batch.submitted_at = now
+        batch.save(update_fields=["status", "submitted_at"])
+    return batch
+
+
+def settle_batch(batch, rejected_bill_ids=()):
+    """Record the payer's remittance for a submitted batch.
+
+    Bills in `rejected_bill_ids` are rejected and the rest marked paid; the
+    batch is "rejected" only when every bill was rejected.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        _lock(batch)
+        _transition(batch, "paid")
+        rejected_count = batch.bills.filter(pk__in=list(rejected_bill_ids)).update(claim_status="rejected")
+        batch.bills.exclude(claim_status="rejected").update(claim_status="paid", paid_at=now)
+        batch.status = "rejected" if rejected_count == batch.bill_count else "paid"
+        batch.settled_at = now
+        batch.save(update_fields=["status", "settled_at"])
+    return batch
+
+
+def reject_batch(batch):
+    with transaction.atomic():
+        _lock(batch)
+        _transition(batch, "rejected")
+        batch.bills.update(claim_status="rejected")
+        batch.status = "rejected"
+        batch.settled_at = timezone.now()
+        batch.save(update_fields=["status", "settled_at"])
+    return batch
+
+
+def release_batch(batch):
+    """Delete a draft batch, returning its bills to the claimable pool."""
+    with transaction.atomic():
+        _lock(batch)
+        if batch.status != "draft":
+            raise ClaimTransitionError(f"Batch {batch.reference} has already been submitted")
+        batch.bills.update(claim_batch=None)
+        batch.delete()
+
+
+def _amount(condition=None):
+    return Coalesce(
+        Sum("third_party_payable", filter=condition),
+        0,
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+
+
+def claim_totals(hospital=None, payer_types=GOVERNMENT_PAYER_TYPES):
+    """Per-payer claim totals by status in a single GROUP BY query."""
+    bills = Bill.objects.filter(third_party__isnull=False)
+    if hospital:
+        bills = bills.filter(hospital=hospital)
+    if payer_types:
+        bills = bills.filter(third_party__payer_type__in=payer_types)
+
+    return list(
+        bills.values("third_party_id", "third_party__code", "third_party__name")
+        .annotate(
+            bill_count=Count("id"),
+            total=_amount(),
+            draft=_amount(Q(claim_status="draft")),
+            submitted=_amount(Q(claim_status="submitted")),
+            paid=_amount(Q(claim_status="paid")),
+            rejected=_amount(Q(claim_status="rejected")),
+            unbatched=Count("id", filter=Q(claim_status="draft", claim_batch__isnull=True)),
+        )
+        .order_by("third_party__code")
+    )
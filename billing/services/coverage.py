@@ -0,0 +1,156 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from decimal import Decimal as D
+
+from django.conf import settings
+from django.core.cache import caches
+
+from billing.models import PatientCoverage, ThirdPartyPayer
+
+
+@dataclass(frozen=True)
+class ResolvedCoverage:
+    """Snapshot of a patient's active coverage, safe to share between requests."""
+
+    payer: object
+    third_party: object
+    patient_percentage: D
+    government_percentage: D
+
+
+# Stored in the shared backend for patients without coverage, since
+# Django caches cannot reliably distinguish a stored None from a miss.
+_NO_COVERAGE = False
+_MISSING = object()
+
+
+class CoverageResolver:
+    """Patient -> coverage lookup with an in-process LRU and optional shared cache.
+
+    Entries are evicted by the signal handlers in ``billing.signals`` whenever
+    a PatientCoverage, Payer or ThirdPartyPayer is written. The local LRU is
+    per process, so entries also expire after ``TTL`` seconds to bound how
+    long a write made by another worker can go unseen; the shared backend is
+    invalidated by every worker and is checked before falling back to the DB.
+    """
+
+    key_prefix = "billing:coverage"
+
+    def __init__(self, max_entries=10000, ttl=60, backend=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @property
+    def shared(self):
+        return caches[self.backend] if self.backend else None
+
+    def _key(self, patient_id):
+        return f"{self.key_prefix}:{patient_id}"
+
+    def get(self, patient):
+        patient_id = getattr(patient, "pk", patient)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(patient_id)
+            if entry is not None and now - entry[0] < self.ttl:
+                self._entries.move_to_end(patient_id)
+                self.hits += 1
+                return entry[1]
+
+        coverage = _MISSING
+        if self.shared is not None:
+            coverage = self.shared.get(self._key(patient_id), _MISSING)
+            if coverage is not _MISSING:
+                coverage = coverage or None
+                with self._lock:
+                    self.shared_hits += 1
+
+        if coverage is _MISSING:
+            coverage = self._load(patient_id)
+            with self._lock:
+                self.misses += 1
+            if self.shared is not None:
+                self.shared.set(self._key(patient_id), coverage or _NO_COVERAGE, self.ttl)
+
+        self._store(patient_id, coverage, now)
+        return coverage
+
+    def _store(self, patient_id, coverage, now):
+        with self._lock:
+            self._entries[patient_id] = (now, coverage)
+            self._entries.move_to_end(patient_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _load(self, patient_id):
+        coverage = (
+            PatientCoverage.objects.filter(patient_id=patient_id, active=True)
+            .select_related("payer")
+            .first()
+        )
+        if not coverage:
+            return None
+
+        # Map Payer -> ThirdPartyPayer by code if possible
+        third_party = None
+        if coverage.payer.code:
+            third_party = ThirdPartyPayer.objects.filter(code=coverage.payer.code).first()
+
+        return ResolvedCoverage(
+            payer=coverage.payer,
+            third_party=third_party,
+            patient_percentage=D(coverage.patient_percentage),
+            government_percentage=D(coverage.government_percentage),
+        )
+
+    def invalidate(self, patient_id):
+        with self._lock:
+            self._entries.pop(patient_id, None)
+        if self.shared is not None:
+            self.shared.delete(self._key(patient_id))
+
+    def clear(self):
+        """Drop every entry; used when a payer changes and many patients are affected."""
+        with self._lock:
+            patient_ids = list(self._entries)
+            self._entries.clear()
+        if self.shared is not None:
+            self.shared.delete_many([self._key(pid) for pid in patient_ids])
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.shared_hits) / lookups, 4) if lookups else 0,
+            }
+
+
+def _build_resolver():
+    config = getattr(settings, "BILLING_COVERAGE_CACHE", {})
+    return CoverageResolver(
+        max_entries=config.get("MAX_ENTRIES", 10000),
+        ttl=config.get("TTL", 60),
+        backend=config.get("BACKEND"),
+    )
+
+
+coverage_resolver = _build_resolver()
+
+
+def resolve_coverage(patient):
+    """Return the patient's active ResolvedCoverage, or None when uncovered."""
+    return coverage_resolver.get(patient)
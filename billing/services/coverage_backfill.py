@@ -0,0 +1,87 @@
+from decimal import Decimal as D
+
+from django.db import transaction
+
+from billing.models import Bill, PatientCoverage, ThirdPartyPayer
+from billing.utils.billing import split_amount
+
+BILL_FIELDS = ["patient_payable", "third_party_payable", "third_party", "is_fully_paid"]
+
+
+def coverage_bills(payer_code=None, hospital=None, since=None, until=None):
+    """Bills to re-price, optionally narrowed by coverage payer, hospital and creation date.
+
+    Bills already claimed (attached to a claim batch) and bills the patient
+    has settled are left alone: their split is what was claimed or paid.
+    """
+    bills = Bill.objects.filter(claim_batch__isnull=True).exclude(is_fully_paid=True, amount_paid__gt=0)
+    if payer_code:
+        bills = bills.filter(patient__patientcoverage__payer__code=payer_code)
+    if hospital:
+        bills = bills.filter(hospital=hospital)
+    if since:
+        bills = bills.filter(created_at__date__gte=since)
+    if until:
+        bills = bills.filter(created_at__date__lte=until)
+    return bills.only("id", "patient_id", "total_amount", "amount_paid", *BILL_FIELDS)
+
+
+def iter_bill_chunks(bills, after_id=0, chunk_size=1000):
+    """Yield lists of bills in primary key order using keyset (id > last) pagination."""
+    while True:
+        chunk = list(bills.filter(id__gt=after_id).order_by("id")[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        after_id = chunk[-1].id
+
+
+def reprice_chunk(chunk, third_parties, dry_run=False):
+    """Recompute coverage fields for a chunk of bills in memory and write back changes.
+
+    Costs one read (coverage for the whole chunk) and one ``bulk_update``;
+    payments come from the bills' own amount_paid. `third_parties` maps payer code -> ThirdPartyPayer.
+    Returns the number of bills whose stored values changed.
+    """
+    coverages = {
+        c.patient_id: c
+        for c in PatientCoverage.objects.filter(
+            patient_id__in={bill.patient_id for bill in chunk}, active=True
+        ).select_related("payer")
+    }
+    changed = []
+    for bill in chunk:
+        coverage = coverages.get(bill.patient_id)
+        if coverage:
+            patient_payable, third_party_payable = split_amount(
+                bill.total_amount, coverage.patient_percentage, coverage.government_percentage
+            )
+            third_party = third_parties.get(coverage.payer.code)
+        else:
+            patient_payable, third_party_payable = D(bill.total_amount), D("0.00")
+            third_party = None
+
+        third_party_id = third_party.id if third_party else None
+        is_fully_paid = patient_payable == D("0.00") or bill.amount_paid >= patient_payable
+
+        if (
+            bill.patient_payable != patient_payable
+            or bill.third_party_payable != third_party_payable
+            or bill.third_party_id != third_party_id
+            or bill.is_fully_paid != is_fully_paid
+        ):
+            bill.patient_payable = patient_payable
+            bill.third_party_payable = third_party_payable
+            bill.third_party_id = third_party_id
+            bill.is_fully_paid = is_fully_paid
+            changed.append(bill)
+
+    if changed and not dry_run:
+        with transaction.atomic():
+            Bill.objects.bulk_update(changed, BILL_FIELDS)
+
+    return len(changed)
+
+
+def third_party_index():
+    return {tp.code: tp for tp in ThirdPartyPayer.objects.all()}
@@ -0,0 +1,147 @@
+from dataclasses import dataclass
+from decimal import Decimal as D
+
+import numpy as np
+import pandas as pd
+from django.db.models import BigIntegerField, F
+from django.db.models.functions import Cast, Round
+
+from billing.models import Bill
+
+# Payer and ThirdPartyPayer share codes (see CoverageResolver), so a
+# scenario keyed by code covers both PatientCoverage and the mapped payer.
+SELF_PAY = "SELF"
+
+LOAD_CHUNK = 5000
+
+
+class ScenarioError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class CoverageScenario:
+    """Candidate percentages for every patient covered by one payer code."""
+
+    payer_code: str
+    patient_percentage: D
+    government_percentage: D
+
+    @classmethod
+    def parse(cls, payer_code, patient_percentage, government_percentage=None):
+        try:
+            patient = D(str(patient_percentage))
+            government = D("100") - patient if government_percentage is None else D(str(government_percentage))
+        except ArithmeticError:
+            raise ScenarioError(f"Invalid percentages for {payer_code}")
+        if not (D("0") <= patient <= D("100") and D("0") <= government <= D("100")):
+            raise ScenarioError(f"Percentages for {payer_code} must be between 0 and 100")
+        if patient + government > D("100"):
+            raise ScenarioError(f"Percentages for {payer_code} add up to more than 100")
+        return cls(payer_code, patient.quantize(D("0.01")), government.quantize(D("0.01")))
+
+
+def _kobo(expression):
+    return Cast(Round(expression * 100), BigIntegerField())
+
+
+def load_bills(hospital=None, since=None, until=None):
+    """Bill totals and current coverage as a DataFrame of int64 columns.
+
+    Amounts are read as kobo and percentages as hundredths of a percent,
+    converted in SQL, so the simulation is exact integer arithmetic and
+    no Decimal is built per row.
+    """
+    bills = Bill.objects.all()
+    if hospital:
+        bills = bills.filter(hospital=hospital)
+    if since:
+        bills = bills.filter(created_at__date__gte=since)
+    if until:
+        bills = bills.filter(created_at__date__lte=until)
+
+    rows = bills.annotate(
+        total_kobo=_kobo(F("total_amount")),
+        patient_bp=_kobo(F("patient__patientcoverage__patient_percentage")),
+        government_bp=_kobo(F("patient__patientcoverage__government_percentage")),
+    ).values_list(
+        "total_kobo",
+        "patient__patientcoverage__payer__code",
+        "patient__patientcoverage__active",
+        "patient_bp",
+        "government_bp",
+    )
+
+    frame = pd.DataFrame.from_records(
+        rows.iterator(chunk_size=LOAD_CHUNK),
+        columns=["total_kobo", "payer_code", "active", "patient_bp", "government_bp"],
+    )
+    covered = frame["active"].eq(True) & frame["payer_code"].notna()
+
+    # Uncovered bills are self-pay: the patient owes the whole total
+    frame["payer_code"] = frame["payer_code"].where(covered, SELF_PAY)
+    frame["patient_bp"] = frame["patient_bp"].where(covered, 10000)
+    frame["government_bp"] = frame["government_bp"].where(covered, 0)
+    return frame.drop(columns="active").astype({
+        "total_kobo": "int64", "patient_bp": "int64", "government_bp": "int64",
+    })
+
+
+def split_kobo(total_kobo, basis_points):
+    """Vectorised split_amount: total * pct / 100, rounded half-even to the kobo."""
+    quotient, remainder = np.divmod(total_kobo * basis_points, 10000)
+    round_up = (remainder * 2 > 10000) | ((remainder * 2 == 10000) & (quotient % 2 == 1))
+    return quotient + round_up
+
+
+def simulate(frame, scenarios):
+    """Per-payer patient and third-party totals before and after `scenarios`.
+
+    `scenarios` is an iterable of CoverageScenario; payers without one keep
+    their current percentages. One vectorised pass over every bill, nothing
+    is written to the database.
+    """
+    patient_bp = frame["patient_bp"].to_numpy()
+    government_bp = frame["government_bp"].to_numpy()
+    new_patient_bp = patient_bp.copy()
+    new_government_bp = government_bp.copy()
+
+    codes = frame["payer_code"].to_numpy()
+    for scenario in scenarios:
+        mask = codes == scenario.payer_code
+        new_patient_bp[mask] = int(scenario.patient_percentage * 100)
+        new_government_bp[mask] = int(scenario.government_percentage * 100)
+
+    total = frame["total_kobo"].to_numpy()
+    split = pd.DataFrame({
+        "payer_code": codes,
+        "bills": 1,
+        "total": total,
+        "patient_before": split_kobo(total, patient_bp),
+        "payer_before": split_kobo(total, government_bp),
+        "patient_after": split_kobo(total, new_patient_bp),
+        "payer_after": split_kobo(total, new_government_bp),
+    })
+    totals = split.groupby("payer_code", sort=True).sum()
+    totals["patient_delta"] = totals["patient_after"] - totals["patient_before"]
+    totals["payer_delta"] = totals["payer_after"] - totals["payer_before"]
+    return totals.reset_index()
+
+
+def _naira(kobo):
+    return (D(int(kobo)) / 100).quantize(D("0.01"))
+
+
+def simulation_rows(totals):
+    """Simulation totals as plain dicts with Decimal naira amounts."""
+    rows = []
+    for record in totals.to_dict("records"):
+        row = {"payer_code": record.pop("payer_code"), "bills": int(record.pop("bills"))}
+        row.update({field: _naira(value) for field, value in record.items()})
+        rows.append(row)
+    return rows
+
+
+def simulate_coverage(scenarios, hospital, since=None, until=None):
+    """Simulated rows for one hospital's bills; the command may also run over all of them."""
+    return simulation_rows(simulate(load_bills(hospital, since, until), scenarios))
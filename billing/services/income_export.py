@@ -0,0 +1,47 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from billing.models import Payment
+
+EXPORT_FIELDS = (
+    ("id", "payment_id"),
+    ("paid_on", "paid_on"),
+    ("bill__invoice_no", "invoice_no"),
+    ("bill__patient__full_name", "patient"),
+    ("payment_mode", "payment_mode"),
+    ("amount_paid", "amount_paid"),
+)
+
+
+def export_payments(hospital, since=None, until=None, payment_mode=None):
+    payments = Payment.objects.filter(hospital=hospital)
+    if since:
+        payments = payments.filter(paid_on__date__gte=since)
+    if until:
+        payments = payments.filter(paid_on__date__lte=until)
+    if payment_mode:
+        payments = payments.filter(payment_mode=payment_mode)
+    # values_list skips model instantiation; the joins replace per-row bill/patient lookups
+    return payments.order_by("paid_on", "id").values_list(*(field for field, _ in EXPORT_FIELDS))
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def iter_payments_csv(rows, chunk_size=2000):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([name for _, name in EXPORT_FIELDS])
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield writer.writerow(row)
+
+
+def iter_payments_ndjson(rows, chunk_size=2000):
+    names = [name for _, name in EXPORT_FIELDS]
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder) + "\n"
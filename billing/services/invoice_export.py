@@ -0,0 +1,182 @@
+import io
+import multiprocessing
+import threading
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.conf import settings
+
+from billing.models import Bill
+from billing.services.invoice_pdf import invoice_html, invoice_pdf_cache, invoice_version
+from billing.services.pdf_render import render_job
+
+
+def export_bills(hospital, since=None, until=None, payer_code=None):
+    bills = (
+        Bill.objects.filter(hospital=hospital)
+        .select_related("patient")
+        .prefetch_related("items__service", "payment_set")
+    )
+    if since:
+        bills = bills.filter(created_at__date__gte=since)
+    if until:
+        bills = bills.filter(created_at__date__lte=until)
+    if payer_code:
+        bills = bills.filter(third_party__code=payer_code)
+    return bills.order_by("id")
+
+
+def iter_invoice_pdfs(bills, workers=2, timeout=60, chunk_size=200):
+    """Yield (filename, pdf_bytes | None, error) for each bill as renders complete.
+
+    Bills are read with a chunked iterator; templates render in this process
+    and PDF conversion runs in a dedicated process pool. At most
+    ``workers * 2`` renders are in flight, so memory stays flat regardless of
+    how many bills are exported. Invoices already in the on-disk cache are
+    read back instead of re-rendered.
+    """
+    window = workers * 2
+    pending = {}
+
+    executor = ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    )
+    try:
+        for bill in bills.iterator(chunk_size=chunk_size):
+            filename = f"invoice_{bill.invoice_no}.pdf"
+
+            cached = invoice_pdf_cache.get(bill.id, invoice_version(bill))
+            if cached:
+                yield filename, cached.read_bytes(), None
+                continue
+
+            html = invoice_html(bill, items=list(bill.items.all()), payments=list(bill.payment_set.all()))
+            pending[executor.submit(render_job, "xhtml2pdf", html, timeout)] = filename
+
+            while len(pending) >= window:
+                yield from _drain(pending)
+
+        while pending:
+            yield from _drain(pending)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _drain(pending):
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for future in done:
+        filename = pending.pop(future)
+        try:
+            pdf, _, _ = future.result()
+        except Exception as exc:
+            yield filename, None, str(exc) or type(exc).__name__
+        else:
+            yield filename, pdf, None
+
+
+class _ZipSink(io.RawIOBase):
+    """Write-only, non-seekable sink; zipfile then streams with data descriptors."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_invoice_zip(bills, workers=None, timeout=None):
+    """Generate a ZIP archive of invoice PDFs chunk by chunk, one entry per bill.
+
+    Failed renders are listed in an ``errors.txt`` entry at the end.
+    """
+    config = getattr(settings, "PDF_RENDERING", {})
+    workers = workers or config.get("WORKERS", 2)
+    timeout = timeout or config.get("TIMEOUT", 60)
+
+    sink = _ZipSink()
+    errors = []
+    # PDFs are already compressed; storing them keeps the export CPU-bound on rendering only
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        for filename, pdf, error in iter_invoice_pdfs(bills, workers=workers, timeout=timeout):
+            if pdf is None:
+                errors.append(f"{filename}: {error}")
+                continue
+            archive.writestr(filename, pdf)
+            yield sink.drain()
+
+        if errors:
+            archive.writestr("errors.txt", "\n".join(errors) + "\n")
+    yield sink.drain()
+
+
+class ExportBusy(Exception):
+    pass
+
+
+class ExportSlots:
+    """Process-wide limit on concurrent invoice exports.
+
+    Each export runs its own pool of render processes, so this bounds the
+    renders a web process can start at ``limit * workers``.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._semaphore = threading.BoundedSemaphore(limit) if limit > 0 else None
+
+    def acquire(self):
+        """Take a slot; returns its release function or raises ExportBusy."""
+        if self._semaphore is None or not self._semaphore.acquire(blocking=False):
+            raise ExportBusy(f"{self.limit} invoice exports already running")
+        released = threading.Event()
+
+        def release():
+            if not released.is_set():
+                released.set()
+                self._semaphore.release()
+
+        return release
+
+
+class _SlotStream:
+    """Iterates a ZIP stream and frees its export slot when closed.
+
+    StreamingHttpResponse calls close() when the response finishes, also
+    when the client disconnects before the stream was read.
+    """
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        return self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+
+def _build_slots():
+    config = getattr(settings, "PDF_RENDERING", {})
+    return ExportSlots(config.get("MAX_EXPORTS", 2))
+
+
+export_slots = _build_slots()
+
+
+def limited_invoice_zip(bills, **kwargs):
+    """stream_invoice_zip holding an export slot; raises ExportBusy when none is free."""
+    release = export_slots.acquire()
+    return _SlotStream(stream_invoice_zip(bills, **kwargs), release)
@@ -0,0 +1,146 @@
+import re
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+from billing.models import Hospital, InvoiceSequence
+
+INVOICE_FORMAT = "INV-{prefix}-{number:07d}"
+INVOICE_NUMBER_RE = r"INV-[A-Z0-9]+-\d{7,}"
+
+
+def default_prefix(hospital):
+    return re.sub(r"[^A-Z0-9]", "", hospital.slug.upper())[:12] or f"H{hospital.pk}"
+
+
+def sequence_for(hospital_id):
+    """Return the hospital's InvoiceSequence, creating it on first use."""
+    sequence = InvoiceSequence.objects.filter(hospital_id=hospital_id).first()
+    if sequence:
+        return sequence
+
+    hospital = Hospital.objects.get(pk=hospital_id)
+    for prefix in (default_prefix(hospital), f"H{hospital.pk}"):
+        try:
+            with transaction.atomic():
+                return InvoiceSequence.objects.create(hospital=hospital, prefix=prefix)
+        except IntegrityError:
+            # Either another worker created the row first or the prefix is taken
+            sequence = InvoiceSequence.objects.filter(hospital_id=hospital_id).first()
+            if sequence:
+                return sequence
+    raise IntegrityError(f"Could not create an invoice sequence for hospital {hospital_id}")
+
+
+def reserve_block(hospital_id, size):
+    """Advance the hospital's counter by `size`; returns (prefix, first, end).
+
+    One UPDATE on the counter row per block, so cashiers only contend on it
+    once every `size` bills rather than on every bill.
+    """
+    sequence = sequence_for(hospital_id)
+    with transaction.atomic():
+        InvoiceSequence.objects.filter(pk=sequence.pk).update(next_value=F("next_value") + size)
+        end = InvoiceSequence.objects.values_list("next_value", flat=True).get(pk=sequence.pk)
+    return sequence.prefix, end - size, end
+
+
+class InvoiceNumberAllocator:
+    """Hands out invoice numbers from per-process, per-hospital blocks.
+
+    Numbers are unique and increase within a block; blocks held by other
+    worker processes interleave, and numbers left in a block when a process
+    exits are never used, so the sequence can have gaps.
+
+    A block reserved inside a transaction serves the rest of that
+    transaction, and is only shared with later ones once it commits: if it
+    rolls back, so does the counter, and reusing the rest of the block
+    would hand out numbers twice.
+    """
+
+    def __init__(self, block_size=50):
+        self.block_size = block_size
+        self._blocks = {}
+        self._lock = threading.Lock()
+        # Blocks reserved by this thread's open transaction: hospital_id -> (block, on_commit callback)
+        self._local = threading.local()
+
+    def next(self, hospital_id):
+        with self._lock:
+            block = self._blocks.get(hospital_id)
+            if block is not None and block[1] < block[2]:
+                return self._take(block)
+
+        block = self._open_block(hospital_id)
+        if block is not None and block[1] < block[2]:
+            return self._take(block)
+
+        prefix, first, end = reserve_block(hospital_id, self.block_size)
+        block = [prefix, first, end]
+        if connection.in_atomic_block:
+            adopt = lambda: self._adopt(hospital_id, block)
+            transaction.on_commit(adopt)
+            self._pending()[hospital_id] = (block, adopt)
+        else:
+            with self._lock:
+                self._blocks[hospital_id] = block
+        return self._take(block)
+
+    @staticmethod
+    def _take(block):
+        prefix, number = block[0], block[1]
+        block[1] += 1
+        return INVOICE_FORMAT.format(prefix=prefix, number=number)
+
+    def _pending(self):
+        if not hasattr(self._local, "blocks"):
+            self._local.blocks = {}
+        return self._local.blocks
+
+    def _open_block(self, hospital_id):
+        """The block this thread reserved in the still-open transaction, if any.
+
+        A rollback, of the transaction or of the savepoint the block was
+        reserved in, discards its on_commit callback; the block goes with it.
+        """
+        entry = self._pending().get(hospital_id)
+        if entry is None:
+            return None
+        block, adopt = entry
+        if connection.in_atomic_block and any(func is adopt for _, func, _ in connection.run_on_commit):
+            return block
+        del self._pending()[hospital_id]
+        return None
+
+    def _adopt(self, hospital_id, block):
+        pending = self._pending()
+        if pending.get(hospital_id, (None,))[0] is block:
+            del pending[hospital_id]
+        with self._lock:
+            current = self._blocks.get(hospital_id)
+            if block[1] < block[2] and (current is None or current[1] >= current[2]):
+                self._blocks[hospital_id] = block
+
+    def allocate(self, hospital_id, count):
+        """`count` consecutive numbers from a dedicated block, for bulk inserts."""
+        prefix, first, end = reserve_block(hospital_id, count)
+        return [INVOICE_FORMAT.format(prefix=prefix, number=n) for n in range(first, end)]
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+        self._pending().clear()
+
+
+def _build_allocator():
+    config = getattr(settings, "INVOICE_NUMBERS", {})
+    return InvoiceNumberAllocator(block_size=config.get("BLOCK_SIZE", 50))
+
+
+invoice_numbers = _build_allocator()
+
+
+def next_invoice_number(hospital_id):
+    return invoice_numbers.next(hospital_id)
@@ -0,0 +1,147 @@
+import hashlib
+import os
+import tempfile
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.template.loader import get_template
+
+from billing.services.pdf_render import PDFRenderError, html_to_pdf
+
+INVOICE_TEMPLATE = "billing/invoice.html"
+
+
+def invoice_context(bill, items=None, payments=None):
+    return {
+        "bill": bill,
+        "items": bill.items.select_related("service") if items is None else items,
+        "payments": bill.payment_set.all() if payments is None else payments,
+        "paid": bill.amount_paid,
+        "due": bill.balance_due,
+    }
+
+
+def invoice_html(bill, items=None, payments=None):
+    return get_template(INVOICE_TEMPLATE).render(invoice_context(bill, items, payments))
+
+
+def render_invoice_pdf(bill):
+    """Render a bill's invoice through xhtml2pdf; returns the PDF bytes or None on error."""
+    try:
+        return html_to_pdf(invoice_html(bill))
+    except PDFRenderError:
+        return None
+
+
+def invoice_version(bill):
+    """Content key for a bill's invoice.
+
+    `revision` moves on every Payment/BillItem write; the remaining fields
+    cover edits to the bill row itself that also show on the invoice.
+    """
+    stamp = "|".join(
+        str(part)
+        for part in (
+            bill.id,
+            bill.revision,
+            bill.invoice_no,
+            bill.total_amount,
+            bill.amount_paid,
+            bill.balance_due,
+            bill.patient.full_name,
+        )
+    )
+    return hashlib.sha1(stamp.encode()).hexdigest()[:20]
+
+
+class InvoicePDFCache:
+    """Size-bounded on-disk cache of rendered invoice PDFs.
+
+    Files are named ``<bill id>-<version>.pdf``; a hit touches the file's
+    mtime and eviction removes the least recently used files once the
+    directory grows past ``max_bytes``.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    def path_for(self, bill_id, version):
+        return self.directory / f"{bill_id}-{version}.pdf"
+
+    def get(self, bill_id, version):
+        path = self.path_for(bill_id, version)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, bill_id, version, pdf):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path_for(bill_id, version)
+
+        # Write then rename so a concurrent reader never sees a partial file
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(pdf)
+        os.replace(tmp, path)
+
+        for stale in self.directory.glob(f"{bill_id}-*.pdf"):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+
+        self.evict()
+        return path
+
+    def evict(self):
+        files = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pdf"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            Path(path).unlink(missing_ok=True)
+            total -= size
+
+
+def _build_cache():
+    config = getattr(settings, "INVOICE_PDF_CACHE", {})
+    return InvoicePDFCache(
+        directory=config.get("DIR", Path(settings.BASE_DIR) / "cache" / "invoice_pdfs"),
+        max_bytes=config.get("MAX_BYTES", 256 * 1024 * 1024),
+    )
+
+
+invoice_pdf_cache = _build_cache()
+
+
+def open_invoice_pdf(bill, version=None):
+    """Open the bill's invoice PDF for reading, rendering it on a cache miss.
+
+    Returns None when rendering fails. A file evicted between the cache
+    lookup and the open is rendered again; one evicted as soon as it is
+    written (larger than the whole cache) is served from memory.
+    """
+    version = version or invoice_version(bill)
+    path = invoice_pdf_cache.get(bill.id, version)
+    if path is not None:
+        try:
+            return open(path, "rb")
+        except FileNotFoundError:
+            pass
+
+    pdf = render_invoice_pdf(bill)
+    if pdf is None:
+        return None
+    path = invoice_pdf_cache.put(bill.id, version, pdf)
+    try:
+        return open(path, "rb")
+    except FileNotFoundError:
+        return BytesIO(pdf)
@@ -0,0 +1,163 @@
+import heapq
+import threading
+from bisect import bisect_right
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.utils import timezone
+
+from billing.models import Hospital, OnCallShift
+
+# Shifts that ended longer ago than this are left out of a loaded roster
+LOOKBACK = timedelta(hours=24)
+
+
+def bump_roster_version(*hospital_ids):
+    """Invalidate the hospitals' rosters. OnCallShift and user signals call
+    this; call it directly after bulk writes that skip them."""
+    hospital_ids = [pk for pk in hospital_ids if pk is not None]
+    if hospital_ids:
+        Hospital.objects.filter(pk__in=hospital_ids).update(roster_version=F("roster_version") + 1)
+
+
+def roster_version(hospital_id):
+    return Hospital.objects.values_list("roster_version", flat=True).get(pk=hospital_id)
+
+
+def build_timeline(shifts):
+    """Flatten possibly overlapping (starts_at, ends_at, id, user) shifts.
+
+    Returns (boundaries, users): users[i] is on call from boundaries[i]
+    until boundaries[i + 1], or None for a gap; the last entry is always
+    None. Where shifts overlap, the latest start (then highest id) wins.
+    """
+    shifts = sorted(shifts, key=lambda shift: shift[0])
+    points = sorted({shift[0] for shift in shifts} | {shift[1] for shift in shifts})
+
+    boundaries, users = [], []
+    active, next_shift = [], 0
+    for point in points:
+        while next_shift < len(shifts) and shifts[next_shift][0] <= point:
+            starts_at, ends_at, pk, user = shifts[next_shift]
+            heapq.heappush(active, (-starts_at.timestamp(), -pk, ends_at, user))
+            next_shift += 1
+        # Ended shifts are only dropped once they reach the top
+        while active and active[0][2] <= point:
+            heapq.heappop(active)
+
+        user = active[0][3] if active else None
+        if users and users[-1] is user:
+            continue
+        boundaries.append(point)
+        users.append(user)
+    return boundaries, users
+
+
+class RosterIndex:
+    """One hospital's on-call timelines, one per role, plus standing staff.
+
+    A role with no shift covering the time falls back to the first active
+    user holding that role at the hospital, as escalation always has.
+    """
+
+    def __init__(self, since, timelines, standing):
+        self.since = since
+        self.timelines = timelines
+        self.standing = standing
+
+    def on_call(self, role, at):
+        timeline = self.timelines.get(role)
+        if timeline is not None:
+            boundaries, users = timeline
+            i = bisect_right(boundaries, at) - 1
+            if i >= 0 and users[i] is not None:
+                return users[i]
+        return self.standing.get(role)
+
+
+def load_rosters(hospital_ids, since):
+    """{hospital_id: RosterIndex} for shifts ending after `since`; two queries."""
+    shifts = {}
+    rows = (
+        OnCallShift.objects.filter(hospital_id__in=hospital_ids, ends_at__gt=since, user__is_active=True)
+        .select_related("user")
+    )
+    for shift in rows:
+        shifts.setdefault((shift.hospital_id, shift.role), []).append(
+            (shift.starts_at, shift.ends_at, shift.id, shift.user)
+        )
+
+    standing = {hospital_id: {} for hospital_id in hospital_ids}
+    users = get_user_model().objects.filter(hospital_id__in=hospital_ids, is_active=True).order_by("id")
+    for user in users:
+        standing[user.hospital_id].setdefault(user.role, user)
+
+    timelines = {hospital_id: {} for hospital_id in hospital_ids}
+    for (hospital_id, role), role_shifts in shifts.items():
+        timelines[hospital_id][role] = build_timeline(role_shifts)
+
+    return {
+        hospital_id: RosterIndex(since, timelines[hospital_id], standing[hospital_id])
+        for hospital_id in hospital_ids
+    }
+
+
+class OnCallRoster:
+    """Per-process cache of each hospital's RosterIndex.
+
+    An index is keyed by the hospital's roster_version, which every shift
+    and staff change bumps. Callers pass the version they read with the
+    alert, so a warm lookup is a binary search with no query at all.
+    """
+
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def on_call_many(self, versions, role, at=None):
+        """{hospital_id: user or None} for `role` at `at`, given {hospital_id: version}.
+
+        Every stale hospital is reloaded together, in two queries.
+        """
+        at = at or timezone.now()
+        indexes, stale = {}, []
+        with self._lock:
+            for hospital_id, version in versions.items():
+                entry = self._indexes.get(hospital_id)
+                if entry is not None and entry[0] == version and entry[1].since <= at:
+                    indexes[hospital_id] = entry[1]
+                else:
+                    stale.append(hospital_id)
+            self.hits += len(indexes)
+
+        if stale:
+            since = min(at, timezone.now()) - LOOKBACK
+            loaded = load_rosters(stale, since)
+            with self._lock:
+                self.misses += len(stale)
+                for hospital_id, index in loaded.items():
+                    self._indexes[hospital_id] = (versions[hospital_id], index)
+            indexes.update(loaded)
+
+        return {hospital_id: index.on_call(role, at) for hospital_id, index in indexes.items()}
+
+    def on_call(self, hospital_id, role, version, at=None):
+        return self.on_call_many({hospital_id: version}, role, at)[hospital_id]
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hospitals": len(self._indexes),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+oncall_roster = OnCallRoster()
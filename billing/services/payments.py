@@ -0,0 +1,43 @@
+from decimal import Decimal as D
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.lookups import GreaterThanOrEqual
+
+from billing.models import Bill, Payment
+from billing.services.revenue import record_payment_revenue
+
+
+def post_payment(bill, amount, payment_mode):
+    """Record a Payment and move the bill's running totals in one transaction.
+
+    `amount_paid`, `balance_due` and `is_fully_paid` are updated with a single
+    F() expression UPDATE, so concurrent cashiers never lose each other's
+    payments and no SUM over Payment is needed afterwards. The day's
+    DailyRevenue row moves in the same transaction. `bill` is refreshed with
+    the new totals.
+    """
+    amount = D(amount)
+
+    with transaction.atomic():
+        payment = Payment.objects.create(
+            bill=bill,
+            amount_paid=amount,
+            payment_mode=payment_mode,
+            hospital_id=bill.hospital_id,
+        )
+
+        # SET expressions see the pre-update row, hence amount_paid + amount
+        Bill.objects.filter(pk=bill.pk).update(
+            amount_paid=F("amount_paid") + amount,
+            balance_due=F("balance_due") - amount,
+            is_fully_paid=Case(
+                When(GreaterThanOrEqual(F("amount_paid") + amount, F("patient_payable")), then=Value(True)),
+                default=F("is_fully_paid"),
+            ),
+        )
+
+        record_payment_revenue(payment)
+
+    bill.refresh_from_db(fields=["amount_paid", "balance_due", "is_fully_paid"])
+    return payment
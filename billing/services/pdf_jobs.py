@@ -0,0 +1,211 @@
+import json
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from django.conf import settings
+
+from billing.services.pdf_render import render_job
+
+JOB_ID_RE = re.compile(r"[0-9a-f]{32}")
+
+
+class PDFQueueFull(Exception):
+    pass
+
+
+def _percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct))], 3)
+
+
+class PDFJobService:
+    """Bounded process pool for HTML -> PDF rendering with submit/poll semantics.
+
+    Job state and finished PDFs are written to ``directory`` so any web
+    worker can answer status and download requests; the pool itself, the
+    queue-depth limit and the metrics are per process. ``timeout`` is
+    enforced inside the worker via SIGALRM where available, and jobs still
+    queued after ``result_ttl`` are reported as expired.
+    """
+
+    def __init__(self, directory, workers=2, max_queue=20, timeout=60, result_ttl=900):
+        self.directory = Path(directory)
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.result_ttl = result_ttl
+
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._last_purge = 0
+
+        self.counters = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0}
+        self.render_times = deque(maxlen=500)
+        self.queue_waits = deque(maxlen=500)
+
+    # -- pool ---------------------------------------------------------------
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: children must not inherit the parent's DB connections or threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    # -- job files ----------------------------------------------------------
+
+    def _state_path(self, job_id):
+        return self.directory / f"{job_id}.json"
+
+    def result_path(self, job_id):
+        return self.directory / f"{job_id}.pdf"
+
+    def _write(self, path, data):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+
+    def _write_state(self, job_id, state):
+        self._write(self._state_path(job_id), json.dumps(state).encode())
+
+    def _purge_expired(self):
+        now = time.time()
+        if now - self._last_purge < 60 or not self.directory.exists():
+            return
+        self._last_purge = now
+        for entry in os.scandir(self.directory):
+            if now - entry.stat().st_mtime > self.result_ttl:
+                Path(entry.path).unlink(missing_ok=True)
+
+    # -- public API ---------------------------------------------------------
+
+    def submit(self, html, filename, owner_id=None, engine="xhtml2pdf", on_done=None):
+        """Queue a render and return its job id; raises PDFQueueFull when saturated.
+
+        `on_done(pdf_bytes)` is called in the submitting process after a
+        successful render, e.g. to populate another cache.
+        """
+        with self._lock:
+            if self._in_flight >= self.max_queue:
+                self.counters["rejected"] += 1
+                raise PDFQueueFull(f"{self._in_flight} PDF jobs already queued")
+            self._in_flight += 1
+            self.counters["submitted"] += 1
+
+        job_id = uuid.uuid4().hex
+        state = {
+            "status": "queued",
+            "filename": filename,
+            "owner_id": owner_id,
+            "submitted_at": time.time(),
+        }
+
+        try:
+            self._write_state(job_id, state)
+            future = self._get_executor().submit(render_job, engine, html, self.timeout)
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+
+        future.add_done_callback(lambda f: self._complete(job_id, state, f, on_done))
+        self._purge_expired()
+        return job_id
+
+    def _complete(self, job_id, state, future, on_done):
+        with self._lock:
+            self._in_flight -= 1
+
+        try:
+            pdf, started, finished = future.result()
+        except Exception as exc:
+            if isinstance(exc, BrokenProcessPool):
+                # A worker died; start a fresh pool on the next submit
+                self.shutdown()
+            with self._lock:
+                self.counters["failed"] += 1
+            self._write_state(job_id, dict(state, status="failed", error=str(exc) or type(exc).__name__))
+            return
+
+        self._write(self.result_path(job_id), pdf)
+        queue_wait = max(0.0, started - state["submitted_at"])
+        render_time = finished - started
+        with self._lock:
+            self.counters["completed"] += 1
+            self.queue_waits.append(queue_wait)
+            self.render_times.append(render_time)
+        self._write_state(
+            job_id,
+            dict(state, status="done", queue_wait=round(queue_wait, 3), render_time=round(render_time, 3)),
+        )
+
+        if on_done:
+            try:
+                on_done(pdf)
+            except Exception:
+                pass
+
+    def status(self, job_id):
+        """Return the job's state dict, or None for an unknown id."""
+        if not JOB_ID_RE.fullmatch(job_id):
+            return None
+        try:
+            state = json.loads(self._state_path(job_id).read_text())
+        except FileNotFoundError:
+            return None
+
+        if state["status"] == "queued" and time.time() - state["submitted_at"] > self.result_ttl:
+            state["status"] = "expired"
+        return state
+
+    def metrics(self):
+        with self._lock:
+            render_times = list(self.render_times)
+            queue_waits = list(self.queue_waits)
+            return {
+                **self.counters,
+                "in_flight": self._in_flight,
+                "max_queue": self.max_queue,
+                "workers": self.workers,
+                "render_time_avg": round(sum(render_times) / len(render_times), 3) if render_times else None,
+                "render_time_p95": _percentile(render_times, 0.95),
+                "queue_wait_avg": round(sum(queue_waits) / len(queue_waits), 3) if queue_waits else None,
+                "queue_wait_p95": _percentile(queue_waits, 0.95),
+            }
+
+
+def _build_service():
+    config = getattr(settings, "PDF_RENDERING", {})
+    return PDFJobService(
+        directory=config.get("DIR", Path(settings.BASE_DIR) / "cache" / "pdf_jobs"),
+        workers=config.get("WORKERS", 2),
+        max_queue=config.get("MAX_QUEUE", 20),
+        timeout=config.get("TIMEOUT", 60),
+        result_ttl=config.get("RESULT_TTL", 900),
+    )
+
+
+pdf_jobs = _build_service()
@@ -0,0 +1,83 @@
+"""HTML -> PDF conversion functions.
+
+Kept free of Django imports so they can run in freshly spawned worker
+processes (see billing.services.pdf_jobs) as well as inline.
+"""
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from io import BytesIO
+
+
+class PDFRenderError(Exception):
+    pass
+
+
+class PDFRenderTimeout(PDFRenderError):
+    pass
+
+
+def html_to_pdf(html):
+    """Render with xhtml2pdf (pure Python, always available)."""
+    from xhtml2pdf import pisa
+
+    buffer = BytesIO()
+    pisa_status = pisa.CreatePDF(html, dest=buffer, encoding="UTF-8")
+    if pisa_status.err:
+        raise PDFRenderError("PDF generation error")
+    return buffer.getvalue()
+
+
+def html_to_pdf_weasyprint(html):
+    """Render with WeasyPrint, falling back to xhtml2pdf when it is missing or fails."""
+    try:
+        from weasyprint import HTML
+    except (ImportError, OSError):
+        # Not installed, or its GTK/Pango libs are missing
+        return html_to_pdf(html)
+    try:
+        return HTML(string=html).write_pdf()
+    except PDFRenderTimeout:
+        # The job's deadline applies to both renderers
+        raise
+    except Exception:
+        return html_to_pdf(html)
+
+
+RENDERERS = {
+    "xhtml2pdf": html_to_pdf,
+    "weasyprint": html_to_pdf_weasyprint,
+}
+
+
+@contextmanager
+def _deadline(seconds):
+    # SIGALRM only exists on Unix and only fires in the main thread, which is
+    # where ProcessPoolExecutor workers run their tasks
+    if (
+        not seconds
+        or not hasattr(signal, "SIGALRM")
+        or threading.current_thread() is not threading.main_thread()
+    ):
+        yield
+        return
+
+    def _expired(signum, frame):
+        raise PDFRenderTimeout(f"Rendering exceeded {seconds}s")
+
+    previous = signal.signal(signal.SIGALRM, _expired)
+    signal.alarm(int(seconds))
+    try:
+        yield
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def render_job(engine, html, timeout=None):
+    """Worker entry point: returns (pdf_bytes, started_at, finished_at) as wall-clock times."""
+    started = time.time()
+    with _deadline(timeout):
+        pdf = RENDERERS[engine](html)
+    return pdf, started, time.time()
@@ -0,0 +1,97 @@
+from decimal import Decimal as D
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from billing.models import DailyRevenue, Payment
+
+
+def record_revenue(hospital_id, day, payment_mode, amount, count=1):
+    """Add `amount` to the (hospital, day, payment_mode) rollup row.
+
+    Must run inside the transaction that writes the payment. The common case
+    is one UPDATE; the first payment of the day for a mode inserts the row,
+    and a concurrent insert of the same row falls back to the UPDATE.
+    """
+    amount = D(amount)
+    key = {"hospital_id": hospital_id, "day": day, "payment_mode": payment_mode}
+
+    updated = DailyRevenue.objects.filter(**key).update(
+        total=F("total") + amount, payment_count=F("payment_count") + count
+    )
+    if updated:
+        return
+
+    try:
+        with transaction.atomic():
+            DailyRevenue.objects.create(**key, total=amount, payment_count=count)
+    except IntegrityError:
+        DailyRevenue.objects.filter(**key).update(
+            total=F("total") + amount, payment_count=F("payment_count") + count
+        )
+
+
+def record_payment_revenue(payment):
+    record_revenue(
+        payment.hospital_id,
+        timezone.localdate(payment.paid_on),
+        payment.payment_mode,
+        payment.amount_paid,
+    )
+
+
+def rebuild_daily_revenue(hospital=None, since=None, until=None):
+    """Recompute rollup rows from Payment for a hospital and/or day range.
+
+    Returns the number of rows written.
+    """
+    payments = Payment.objects.all()
+    rollups = DailyRevenue.objects.all()
+    if hospital:
+        payments = payments.filter(hospital=hospital)
+        rollups = rollups.filter(hospital=hospital)
+    if since:
+        payments = payments.filter(paid_on__date__gte=since)
+        rollups = rollups.filter(day__gte=since)
+    if until:
+        payments = payments.filter(paid_on__date__lte=until)
+        rollups = rollups.filter(day__lte=until)
+
+    rows = (
+        payments.annotate(day=TruncDate("paid_on"))
+        .values("hospital_id", "day", "payment_mode")
+        .annotate(total=Sum("amount_paid"), payment_count=Count("id"))
+        .order_by()
+    )
+
+    with transaction.atomic():
+        rollups.delete()
+        created = DailyRevenue.objects.bulk_create(
+            [DailyRevenue(**row) for row in rows], batch_size=1000
+        )
+    return len(created)
+
+
+def revenue_rows(hospital=None):
+    rows = DailyRevenue.objects.all()
+    if hospital:
+        rows = rows.filter(hospital=hospital)
+    return rows
+
+
+def monthly_revenue(hospital=None):
+    """[(month, total)] in month order, summed from the daily rollup."""
+    return [
+        (row["month"], row["total"])
+        for row in revenue_rows(hospital)
+        .annotate(month=TruncMonth("day"))
+        .values("month")
+        .annotate(total=Sum("total"))
+        .order_by("month")
+    ]
+
+
+def total_revenue(hospital=None):
+    return revenue_rows(hospital).aggregate(total=Sum("total"))["total"] or 0
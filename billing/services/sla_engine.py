@@ -1,5 +1,15 @@
+from datetime import timedelta
+
 from django.utils import timezone
-from billing.models import VitalAlert, CustomUser
+from billing.models import VitalAlert
+from billing.utils.alert_escalation import escalation_message, get_escalation_target
+
+# Escalation chain: role paged at each escalation level
+ESCALATION_ROLES = {
+    1: "head_doctor",
+    2: "admin",
+}
+
 
 def escalate_alert(alert):
     now = timezone.now()
@@ -15,17 +25,18 @@ def escalate_alert(alert):
     alert.escalated = True
     alert.escalated_at = now
 
-    # Escalation chain
-    if alert.escalation_level == 1:
-        # Head doctor
-        alert.escalated_to = CustomUser.objects.filter(
-            role="head_doctor"
-        ).first()
-
-    elif alert.escalation_level == 2:
-        # Admin
-        alert.escalated_to = CustomUser.objects.filter(
-            role="admin"
-        ).first()
+    # Next step of the chain, or none once the last level is reached
+    if alert.escalation_level < alert.sla_policy.max_escalation_level:
+        alert.escalation_deadline = now + timedelta(minutes=alert.sla_policy.escalation_time_minutes)
+    else:
+        alert.escalation_deadline = None
+
+    role = ESCALATION_ROLES.get(alert.escalation_level)
+    if role:
+        alert.escalated_to = role
+        # Whoever is on call for the role at the alert's own hospital
+        target = get_escalation_target(alert, role, now)
+        if target:
+            escalation_message(target, alert.patient.full_name, alert.message, alert.escalation_level).save()
 
     alert.save()
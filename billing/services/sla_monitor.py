@@ -9,7 +9,7 @@ def run_sla_monitor():
         status="open",
         escalation_deadline__isnull=False,
         escalation_deadline__lte=now
-    )
+    ).select_related("sla_policy", "patient__hospital")
 
     for alert in alerts:
         escalate_alert(alert)
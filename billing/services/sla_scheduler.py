@@ -0,0 +1,232 @@
+import heapq
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from billing.models import VitalAlert, VitalAlertLog
+from billing.services.sla_engine import escalate_alert
+
+ACKNOWLEDGE = "acknowledge"
+ESCALATE = "escalate"
+
+# The scheduler running in this process, if any; see notify_scheduler
+_active = None
+
+
+class SLAScheduler:
+    """Fires VitalAlert deadlines from an in-memory min-heap.
+
+    On start every open alert's acknowledge and escalation deadlines are
+    loaded (a deadline already past fires at once, which is how a restart
+    recovers). After that the heap is kept current from the alerts'
+    `updated_at` change feed, polled every `poll_interval` seconds, and
+    directly by `notify` when alerts are saved in this process. The loop
+    sleeps until the earlier of the next deadline and the next poll, so a
+    deadline fires within a poll interval of being set and on time after.
+
+    Heap entries are never removed: a changed or cleared deadline simply
+    makes the old entry stale, and stale entries are skipped when popped.
+    """
+
+    def __init__(self, poll_interval=1.0, rescan_interval=300, overlap=5, escalate=escalate_alert):
+        self.poll_interval = poll_interval
+        self.rescan_interval = rescan_interval
+        self.overlap = timedelta(seconds=overlap)
+        self.escalate = escalate
+
+        self._heap = []
+        self._deadlines = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._cursor = None
+        self._last_rescan = 0
+
+        self.counters = {"escalated": 0, "breached": 0, "stale": 0, "failed": 0}
+
+    # -- tracking -----------------------------------------------------------
+
+    def track(self, alert, after=None):
+        """Bring the alert's heap entries in line with its current fields.
+
+        Deadlines at or before `after` are dropped; used once a deadline
+        has fired, so one that is still set is not fired again at once.
+        """
+        open_alert = alert.status == "open"
+        with self._lock:
+            for kind, deadline in (
+                (ACKNOWLEDGE, alert.acknowledge_deadline if open_alert and not alert.acknowledged_at else None),
+                (ESCALATE, alert.escalation_deadline if open_alert else None),
+            ):
+                key = (alert.pk, kind)
+                if deadline is None or (after is not None and deadline <= after):
+                    self._deadlines.pop(key, None)
+                elif self._deadlines.get(key) != deadline:
+                    self._deadlines[key] = deadline
+                    heapq.heappush(self._heap, (deadline, alert.pk, kind))
+
+    def notify(self, alert):
+        self.track(alert)
+        self._wake.set()
+
+    def load(self):
+        """Full scan of open alerts; run on start and every `rescan_interval`."""
+        alerts = VitalAlert.objects.filter(status="open").only(
+            "id", "status", "acknowledged_at", "acknowledge_deadline", "escalation_deadline", "updated_at"
+        )
+        with self._lock:
+            self._heap.clear()
+            self._deadlines.clear()
+        cursor = None
+        for alert in alerts.iterator(chunk_size=2000):
+            self.track(alert)
+            cursor = max(cursor or alert.updated_at, alert.updated_at)
+        self._cursor = cursor or timezone.now()
+        self._last_rescan = time.monotonic()
+
+    def poll_changes(self):
+        """Re-track alerts changed since the last poll; returns how many were seen.
+
+        The window overlaps the previous one by `overlap` so rows committed
+        slightly out of updated_at order are not missed; tracking is
+        idempotent, so seeing a row twice is harmless.
+        """
+        since = self._cursor - self.overlap
+        changed = VitalAlert.objects.filter(updated_at__gte=since).only(
+            "id", "status", "acknowledged_at", "acknowledge_deadline", "escalation_deadline", "updated_at"
+        )
+        seen = 0
+        for alert in changed.order_by("updated_at"):
+            self.track(alert)
+            self._cursor = max(self._cursor, alert.updated_at)
+            seen += 1
+        return seen
+
+    def next_deadline(self):
+        with self._lock:
+            while self._heap:
+                deadline, alert_id, kind = self._heap[0]
+                if self._deadlines.get((alert_id, kind)) == deadline:
+                    return deadline
+                heapq.heappop(self._heap)
+            return None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._deadlines)
+
+    # -- firing -------------------------------------------------------------
+
+    def _pop_due(self, now):
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, alert_id, kind = heapq.heappop(self._heap)
+                if self._deadlines.get((alert_id, kind)) == deadline:
+                    del self._deadlines[(alert_id, kind)]
+                    due.append((alert_id, kind))
+        return due
+
+    def run_due(self, now=None):
+        """Fire every deadline at or before `now`; returns the number fired."""
+        now = now or timezone.now()
+        fired = 0
+        for alert_id, kind in self._pop_due(now):
+            try:
+                if self._fire(alert_id, kind, now):
+                    fired += 1
+            except Exception:
+                # The next rescan puts the alert back if it is still due
+                self.counters["failed"] += 1
+        return fired
+
+    def _fire(self, alert_id, kind, now):
+        # Re-read: the heap may be up to one poll behind the database
+        alert = (
+            VitalAlert.objects.select_related("sla_policy", "patient__hospital")
+            .filter(pk=alert_id, status="open")
+            .first()
+        )
+        if alert is None:
+            self.counters["stale"] += 1
+            return False
+
+        if kind == ESCALATE:
+            if not alert.escalation_deadline or alert.escalation_deadline > now:
+                self.counters["stale"] += 1
+                self.track(alert)
+                return False
+            with transaction.atomic():
+                self.escalate(alert)
+            self.counters["escalated"] += 1
+        else:
+            if alert.acknowledged_at or not alert.acknowledge_deadline or alert.acknowledge_deadline > now:
+                self.counters["stale"] += 1
+                self.track(alert)
+                return False
+            if not alert.logs.filter(action="sla_breached").exists():
+                VitalAlertLog.objects.create(
+                    alert=alert, action="sla_breached", notes="Not acknowledged within the SLA response time"
+                )
+            self.counters["breached"] += 1
+
+        alert.refresh_from_db()
+        self.track(alert, after=now)
+        return True
+
+    # -- loop ---------------------------------------------------------------
+
+    def seconds_until_next(self, now=None):
+        deadline = self.next_deadline()
+        if deadline is None:
+            return self.poll_interval
+        wait = (deadline - (now or timezone.now())).total_seconds()
+        return max(0.0, min(self.poll_interval, wait))
+
+    def run_forever(self, stop=None):
+        global _active
+        stop = stop or threading.Event()
+        _active = self
+        try:
+            self.load()
+            self.run_due()
+            while not stop.is_set():
+                self._wake.wait(self.seconds_until_next())
+                self._wake.clear()
+
+                if time.monotonic() - self._last_rescan >= self.rescan_interval:
+                    self.load()
+                else:
+                    self.poll_changes()
+                self.run_due()
+                close_old_connections()
+        finally:
+            _active = None
+
+    def stats(self):
+        deadline = self.next_deadline()
+        with self._lock:
+            return {
+                "tracked": len(self._deadlines),
+                "heap": len(self._heap),
+                "next_deadline": deadline.isoformat() if deadline else None,
+                **self.counters,
+            }
+
+
+def build_scheduler():
+    config = getattr(settings, "SLA_SCHEDULER", {})
+    return SLAScheduler(
+        poll_interval=config.get("POLL_INTERVAL", 1.0),
+        rescan_interval=config.get("RESCAN_INTERVAL", 300),
+        overlap=config.get("POLL_OVERLAP", 5),
+    )
+
+
+def notify_scheduler(alert):
+    """Hand a saved alert straight to this process's scheduler, if one runs here."""
+    if _active is not None:
+        _active.notify(alert)
@@ -0,0 +1,87 @@
+import threading
+
+from django.db.models import Q
+from django.utils import timezone
+
+from billing.models import PayerTariff
+
+
+def load_tariffs(hospital_id, day):
+    """{(service_id, third_party_id): price} for tariffs in effect on `day`.
+
+    Rows are read in effective_from order, so where ranges overlap the most
+    recent tariff wins.
+    """
+    rows = (
+        PayerTariff.objects.filter(service__hospital_id=hospital_id, effective_from__lte=day)
+        .filter(Q(effective_to__isnull=True) | Q(effective_to__gte=day))
+        .order_by("effective_from", "id")
+        .values_list("service_id", "third_party_id", "price")
+    )
+    return {(service_id, third_party_id): price for service_id, third_party_id, price in rows}
+
+
+class TariffResolver:
+    """Per-process cache of each hospital's tariff matrix.
+
+    A matrix is keyed by the hospital's catalog_version, which every
+    Service and PayerTariff write bumps, and by the day, since tariffs
+    start and end on dates. Callers pass the version they read alongside
+    the services being priced, so a warm lookup costs no query at all.
+    """
+
+    def __init__(self):
+        self._matrices = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def matrix(self, hospital_id, version, day=None):
+        day = day or timezone.localdate()
+        with self._lock:
+            entry = self._matrices.get(hospital_id)
+            if entry is not None and entry[:2] == (version, day):
+                self.hits += 1
+                return entry[2]
+
+        matrix = load_tariffs(hospital_id, day)
+        with self._lock:
+            self.misses += 1
+            self._matrices[hospital_id] = (version, day, matrix)
+        return matrix
+
+    def clear(self):
+        with self._lock:
+            self._matrices.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hospitals": len(self._matrices),
+                "tariffs": sum(len(entry[2]) for entry in self._matrices.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+tariff_resolver = TariffResolver()
+
+
+def unit_price(service, third_party_id, version, day=None):
+    """The payer's tariff for `service`, or Service.price when it has none."""
+    if third_party_id is None:
+        return service.price
+    matrix = tariff_resolver.matrix(service.hospital_id, version, day)
+    return matrix.get((service.id, third_party_id), service.price)
+
+
+def payer_prices(hospital_id, third_party_id, version, day=None):
+    """{service_id: price} of every service `third_party` has a tariff for today."""
+    if third_party_id is None:
+        return {}
+    matrix = tariff_resolver.matrix(hospital_id, version, day)
+    return {
+        service_id: price
+        for (service_id, payer_id), price in matrix.items()
+        if payer_id == third_party_id
+    }
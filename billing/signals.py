@@ -1,9 +1,24 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save
 from django.dispatch import receiver
 from django.utils.text import slugify
 from django.contrib.auth import get_user_model
 from .models import Hospital
-from billing.models import VitalSign
+from billing.models import (
+    Bill, BillItem, LabTestRequest, OnCallShift, Payment, PatientVisit, PayerTariff, Prescription, RadiologyRequest,
+    Service, VitalAlert, VitalSign, PatientCoverage, Payer, ThirdPartyPayer,
+)
+from billing.services.catalog import bump_catalog_version
+from billing.services.charge_capture import (
+    capture_lab_request,
+    capture_prescription,
+    capture_radiology_request,
+    close_visit_bill,
+)
+from billing.services.coverage import coverage_resolver
+from billing.services.oncall import bump_roster_version
+from billing.services.sla_scheduler import notify_scheduler
 from messaging.models import Message
 from billing.utils.vitals import evaluate_vitals
 
@@ -65,3 +80,96 @@ def notify_doctor_on_critical_vitals(sender, instance, created, **kwargs):
                 f"View EMR: /patients/{instance.patient.id}/emr/"
             ),
         )
+
+
+@receiver([post_save, post_delete], sender=PatientCoverage)
+def invalidate_patient_coverage(sender, instance, **kwargs):
+    coverage_resolver.invalidate(instance.patient_id)
+    # Evict again once committed so a concurrent read can't re-cache the old row
+    transaction.on_commit(lambda: coverage_resolver.invalidate(instance.patient_id))
+
+
+@receiver([post_save, post_delete], sender=Payer)
+@receiver([post_save, post_delete], sender=ThirdPartyPayer)
+def invalidate_payer_coverage(sender, instance, **kwargs):
+    coverage_resolver.clear()
+    transaction.on_commit(coverage_resolver.clear)
+
+
+@receiver([post_save, post_delete], sender=Payment)
+@receiver([post_save, post_delete], sender=BillItem)
+def bump_bill_revision(sender, instance, **kwargs):
+    Bill.objects.filter(pk=instance.bill_id).update(revision=F("revision") + 1)
+
+
+@receiver([post_save, post_delete], sender=Service)
+def bump_service_catalog(sender, instance, **kwargs):
+    # Pharmacy services are not in the catalog
+    if not instance.is_pharmacy:
+        bump_catalog_version(instance.hospital_id)
+
+
+@receiver([post_save, post_delete], sender=PayerTariff)
+def bump_tariff_catalog(sender, instance, **kwargs):
+    hospital_id = Service.objects.filter(pk=instance.service_id).values_list("hospital_id", flat=True).first()
+    if hospital_id is not None:
+        bump_catalog_version(hospital_id)
+
+
+@receiver([post_save, post_delete], sender=OnCallShift)
+def bump_shift_roster(sender, instance, **kwargs):
+    bump_roster_version(instance.hospital_id)
+
+
+# User fields the on-call roster depends on
+ROSTER_USER_FIELDS = {"role", "hospital", "hospital_id", "is_active"}
+
+
+@receiver(post_init, sender=User)
+def remember_roster_hospital(sender, instance, **kwargs):
+    # Read from __dict__ so a deferred hospital_id is not fetched
+    instance._roster_hospital_id = instance.__dict__.get("hospital_id")
+
+
+@receiver(post_save, sender=User)
+def bump_user_roster(sender, instance, update_fields=None, **kwargs):
+    # Logins save last_login alone and leave the roster as it is
+    if update_fields is not None and not ROSTER_USER_FIELDS.intersection(update_fields):
+        return
+    # A user moved to another hospital leaves the old one's roster too
+    bump_roster_version(instance.hospital_id, instance._roster_hospital_id)
+    instance._roster_hospital_id = instance.hospital_id
+
+
+@receiver(post_delete, sender=User)
+def bump_deleted_user_roster(sender, instance, **kwargs):
+    bump_roster_version(instance.hospital_id)
+
+
+@receiver(post_save, sender=LabTestRequest)
+def capture_lab_charge(sender, instance, created, **kwargs):
+    if created:
+        capture_lab_request(instance)
+
+
+@receiver(post_save, sender=RadiologyRequest)
+def capture_radiology_charge(sender, instance, created, **kwargs):
+    if created:
+        capture_radiology_request(instance)
+
+
+@receiver(post_save, sender=Prescription)
+def capture_pharmacy_charges(sender, instance, **kwargs):
+    if instance.status == "dispensed":
+        capture_prescription(instance)
+
+
+@receiver(post_save, sender=PatientVisit)
+def close_draft_bill_on_completion(sender, instance, **kwargs):
+    if instance.status == "completed":
+        transaction.on_commit(lambda: close_visit_bill(instance.id))
+
+
+@receiver(post_save, sender=VitalAlert)
+def track_alert_deadlines(sender, instance, **kwargs):
+    transaction.on_commit(lambda: notify_scheduler(instance))
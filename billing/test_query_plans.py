@@ -0,0 +1,125 @@
+"""EXPLAIN QUERY PLAN checks for the VitalAlert queries of the alert subsystem.
+
+Each test runs the real code path, captures the SQL it sends and asks
+SQLite how it would run every statement that reads billing_vitalalert.
+A plan that scans the table (or walks a whole index) instead of
+searching an index fails the test, naming the statement.
+"""
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from django.db import connection
+from django.http import HttpResponse
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from billing.models import CustomUser, Hospital, Patient, SLAPolicy, VitalAlert, VitalSign
+from billing.services.oncall import oncall_roster
+from billing.services.sla_monitor import run_sla_monitor
+from billing.utils.alert_escalation import escalate_unacknowledged_alerts
+
+TABLE = "billing_vitalalert"
+
+
+def query_plan(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+        return [row[3] for row in cursor.fetchall()]
+
+
+def vitalalert_plans(captured):
+    """(sql, plan) for each captured statement that reads billing_vitalalert."""
+    plans = []
+    for query in captured:
+        sql = query["sql"]
+        if TABLE in sql and sql.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            plans.append((sql, query_plan(sql)))
+    return plans
+
+
+def full_scans(captured):
+    return [
+        (sql, plan) for sql, plan in vitalalert_plans(captured)
+        if any(step.startswith(f"SCAN {TABLE}") for step in plan)
+    ]
+
+
+@skipUnless(connection.vendor == "sqlite", "Plans are captured from SQLite")
+class VitalAlertQueryPlanTest(TestCase):
+    def setUp(self):
+        oncall_roster.clear()
+        self.hospital = Hospital.objects.create(name="General", slug="general")
+        self.doctor = CustomUser.objects.create_user(
+            username="doctor", password="pass", hospital=self.hospital, role="doctor"
+        )
+        self.admin = CustomUser.objects.create_user(
+            username="admin", password="pass", hospital=self.hospital, role="admin"
+        )
+        CustomUser.objects.create_user(username="head", password="x", hospital=self.hospital, role="head_doctor")
+        policy = SLAPolicy.objects.create(
+            hospital=self.hospital, severity="critical", response_time_minutes=5,
+            escalation_time_minutes=10, max_escalation_level=2,
+        )
+
+        now = timezone.now()
+        for i, status in enumerate(["open", "open", "acknowledged", "escalated", "resolved", "resolved"]):
+            patient = Patient.objects.create(
+                hospital=self.hospital, full_name=f"Patient {i}", date_of_birth="1990-01-01", phone_number=f"080{i}"
+            )
+            VitalAlert.objects.create(
+                patient=patient,
+                vital=VitalSign.objects.create(patient=patient, spo2=80),
+                doctor=self.doctor,
+                sla_policy=policy,
+                status=status,
+                message="Critical vital signs detected",
+                acknowledge_deadline=now + timedelta(minutes=5),
+                escalation_deadline=now - timedelta(minutes=i),
+            )
+
+    def assertNoFullScans(self, captured):
+        scans = full_scans(captured)
+        self.assertFalse(
+            scans,
+            "\n\n".join(f"{sql}\n  -> {' / '.join(plan)}" for sql, plan in scans),
+        )
+
+    def test_run_sla_monitor(self):
+        with CaptureQueriesContext(connection) as captured:
+            run_sla_monitor()
+        self.assertNoFullScans(captured)
+        self.assertIn("vitalalert_open_deadline_idx", str(vitalalert_plans(captured)[0][1]))
+
+    def test_escalate_unacknowledged_alerts(self):
+        with CaptureQueriesContext(connection) as captured:
+            stats = escalate_unacknowledged_alerts(now=timezone.now() + timedelta(minutes=30))
+        self.assertGreater(stats["escalated"], 0)
+        self.assertNoFullScans(captured)
+
+    def test_doctor_alert_dashboard(self):
+        self.client.force_login(self.doctor)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse("doctor_alert_dashboard"))
+        self.assertEqual(response.status_code, 200)
+        self.assertNoFullScans(captured)
+
+    def test_admin_alert_dashboard(self):
+        self.client.force_login(self.admin)
+
+        # billing/alerts/admin_dashboard.html does not exist yet; evaluate the
+        # view's queryset the way the template would
+        def render(request, template_name, context):
+            list(context["alerts"])
+            return HttpResponse()
+
+        with mock.patch("billing.views.render", render), CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse("admin_alert_dashboard"))
+        self.assertEqual(response.status_code, 200)
+        self.assertNoFullScans(captured)
+
+    def test_detects_a_full_scan(self):
+        with CaptureQueriesContext(connection) as captured:
+            list(VitalAlert.objects.filter(message__contains="Critical"))
+        self.assertEqual(len(full_scans(captured)), 1)
@@ -1,3 +1,1510 @@
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+import uuid
+import zipfile
+from concurrent.futures import Future
+from datetime import timedelta
+from decimal import Decimal as D
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import transaction
 from django.test import TestCase
+from django.utils import timezone
+
+from billing.models import (
+    AgingSnapshot,
+    Bill,
+    BillItem,
+    ChargeEvent,
+    ClaimBatch,
+    CustomUser,
+    DailyRevenue,
+    Hospital,
+    InvoiceSequence,
+    LabTestRequest,
+    Medicine,
+    OnCallShift,
+    Patient,
+    PatientCoverage,
+    PatientVisit,
+    Payer,
+    PayerTariff,
+    Payment,
+    Prescription,
+    RadiologyRequest,
+    Service,
+    SLAPolicy,
+    ThirdPartyPayer,
+    VitalAlert,
+    VitalSign,
+)
+from billing.services.aging import aging_rows, aging_totals, take_snapshot
+from billing.services.bank_reconciliation import StatementFormatError, import_statement
+from billing.services.benchmark import Volumes, compare, run_benchmark, seed
+from billing.services.bill_builder import build_bill
+from billing.services.catalog import catalog_json, catalog_version
+from billing.services.charge_capture import ChargeFlusher, capture_lab_request, flush_visit
+from billing.services.claim_files import ClaimFileError, ClaimFileWriter, writer_for
+from billing.services.claims import (
+    ClaimTransitionError,
+    claim_totals,
+    create_claim_batches,
+    settle_batch,
+    submit_batch,
+)
+from billing.services.coverage import coverage_resolver
+from billing.services.coverage_backfill import coverage_bills, reprice_chunk, third_party_index
+from billing.services.coverage_simulation import CoverageScenario, load_bills, simulate, simulation_rows, split_kobo
+from billing.services.invoice_export import export_bills, export_slots
+from billing.services.invoice_numbers import invoice_numbers
+from billing.services.invoice_pdf import InvoicePDFCache, invoice_pdf_cache, invoice_version
+from billing.services.oncall import build_timeline, oncall_roster
+from billing.services.pdf_jobs import PDFJobService, PDFQueueFull
+from billing.services.pdf_render import PDFRenderError, PDFRenderTimeout, render_job
+from billing.services.sla_scheduler import SLAScheduler
+from billing.services.tariffs import tariff_resolver
+from billing.services.payments import post_payment
+from billing.services.revenue import rebuild_daily_revenue, total_revenue
+from billing.utils.alert_escalation import escalate_unacknowledged_alerts
+from billing.utils.billing import calculate_bill_split, split_amount
+from billing.utils.sla_metrics import doctor_sla_metrics
+from messaging.models import Message
+
+
+class BillBuilderTest(TestCase):
+    def setUp(self):
+        coverage_resolver.clear()
+        self.hospital = Hospital.objects.create(name="General", slug="general")
+        self.user = CustomUser.objects.create_user(
+            username="cashier", password="pass", hospital=self.hospital, role="accountant"
+        )
+        self.patient = Patient.objects.create(
+            hospital=self.hospital,
+            full_name="Ada Obi",
+            date_of_birth="1990-01-01",
+            phone_number="0800",
+        )
+        self.services = [
+            Service.objects.create(hospital=self.hospital, name=f"Service {i}", price=100 + i)
+            for i in range(60)
+        ]
+        # Steady state: this process already holds a committed block of invoice numbers
+        invoice_numbers.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            invoice_numbers.next(self.hospital.id)
+
+    def test_query_count_does_not_grow_with_lines(self):
+        lines = [(service.id, 2) for service in self.services]
+
+        with self.assertNumQueries(7):
+            bill = build_bill(self.patient, lines, created_by=self.user)
+
+        self.assertEqual(bill.items.count(), 60)
+        self.assertEqual(bill.total_amount, sum((s.price * 2 for s in self.services)))
+
+    def test_unknown_service_rolls_back(self):
+        other = Hospital.objects.create(name="Other", slug="other")
+        foreign = Service.objects.create(hospital=other, name="Foreign", price=10)
+
+        with self.assertRaises(Service.DoesNotExist):
+            build_bill(self.patient, [(self.services[0].id, 1), (foreign.id, 1)])
+
+        self.assertFalse(Bill.objects.exists())
+
+    def test_api_rejects_invalid_lines(self):
+        self.client.force_login(self.user)
+        for item in ({"service": None}, {"service": "abc"}, {"service": self.services[0].id, "quantity": None}):
+            response = self.client.post(
+                "/api/bills/",
+                json.dumps({"patient": self.patient.id, "items": [item]}),
+                content_type="application/json",
+            )
+            self.assertEqual(response.status_code, 400, item)
+
+        self.assertFalse(Bill.objects.exists())
+
+    def test_form_rejects_mismatched_lines(self):
+        self.client.force_login(self.user)
+        response = self.client.post(
+            f"/bills/create/{self.patient.id}/",
+            {"service": [self.services[0].id, self.services[1].id], "quantity": ["1"]},
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Bill.objects.exists())
+
+
+class CoverageResolverTest(TestCase):
+    def setUp(self):
+        coverage_resolver.clear()
+        hospital = Hospital.objects.create(name="General", slug="general")
+        self.patient = Patient.objects.create(
+            hospital=hospital, full_name="Ada Obi", date_of_birth="1990-01-01", phone_number="0800"
+        )
+        self.payer = Payer.objects.create(code="NHIS", name="NHIS", payer_type="government")
+        self.third_party = ThirdPartyPayer.objects.create(name="NHIS", code="NHIS", payer_type="federal")
+        self.coverage = PatientCoverage.objects.create(
+            patient=self.patient, payer=self.payer, patient_percentage=10, government_percentage=90
+        )
+
+    def test_split_is_served_from_cache(self):
+        calculate_bill_split(self.patient, 1000)
+
+        with self.assertNumQueries(0):
+            patient_payable, third_party_payable, third_party = calculate_bill_split(self.patient, 1000)
+
+        self.assertEqual(patient_payable, D("100"))
+        self.assertEqual(third_party_payable, D("900"))
+        self.assertEqual(third_party, self.third_party)
+        self.assertGreater(coverage_resolver.stats()["hits"], 0)
+
+    def test_coverage_change_invalidates_entry(self):
+        calculate_bill_split(self.patient, 1000)
+
+        self.coverage.patient_percentage = 100
+        self.coverage.government_percentage = 0
+        self.coverage.save()
+
+        patient_payable, third_party_payable, _ = calculate_bill_split(self.patient, 1000)
+        self.assertEqual(patient_payable, D("1000"))
+        self.assertEqual(third_party_payable, D("0"))
+
+
+class PostPaymentTest(TestCase):
+    def setUp(self):
+        hospital = Hospital.objects.create(name="General", slug="general")
+        patient = Patient.objects.create(
+            hospital=hospital, full_name="Ada Obi", date_of_birth="1990-01-01", phone_number="0800"
+        )
+        self.bill = Bill.objects.create(
+            hospital=hospital, patient=patient, total_amount=1000, patient_payable=600
+        )
+
+    def test_running_totals_follow_payments(self):
+        self.assertEqual(self.bill.balance_due, D("1000"))
+
+        post_payment(self.bill, "300", "cash")
+        self.assertEqual((self.bill.amount_paid, self.bill.balance_due), (D("300"), D("700")))
+        self.assertFalse(self.bill.is_fully_paid)
+
+        post_payment(self.bill, "300", "transfer")
+        self.assertEqual((self.bill.amount_paid, self.bill.balance_due), (D("600"), D("400")))
+        self.assertTrue(self.bill.is_fully_paid)
+
+    def test_stale_save_keeps_running_totals(self):
+        stale = Bill.objects.get(pk=self.bill.pk)
+        post_payment(self.bill, "250", "cash")
+
+        stale.claim_status = "submitted"
+        stale.save()
+
+        stale.refresh_from_db()
+        self.assertEqual(stale.amount_paid, D("250"))
+        self.assertEqual(stale.claim_status, "submitted")
+
+    def test_daily_revenue_follows_payments(self):
+        post_payment(self.bill, "300", "cash")
+        post_payment(self.bill, "200", "cash")
+        post_payment(self.bill, "50", "card")
+
+        cash = DailyRevenue.objects.get(payment_mode="cash")
+        self.assertEqual((cash.total, cash.payment_count), (D("500"), 2))
+        self.assertEqual(total_revenue(self.bill.hospital), D("550"))
+
+        DailyRevenue.objects.all().delete()
+        self.assertEqual(rebuild_daily_revenue(self.bill.hospital), 2)
+        self.assertEqual(total_revenue(self.bill.hospital), D("550"))
+
+    def test_income_report_without_hospital_is_empty(self):
+        post_payment(self.bill, "300", "cash")
+        user = CustomUser.objects.create_user(username="acct", password="pass", role="accountant")
+        CustomUser.objects.filter(pk=user.pk).update(hospital=None)
+        self.client.force_login(user)
+
+        response = self.client.get("/reports/income/")
+        self.assertEqual(response.context["total_income"], 0)
+        self.assertEqual(list(response.context["payments"]), [])
+
+
+class BillListPaginationTest(TestCase):
+    def setUp(self):
+        coverage_resolver.clear()
+        self.hospital = Hospital.objects.create(name="General", slug="general")
+        self.user = CustomUser.objects.create_user(
+            username="cashier", password="pass", hospital=self.hospital, role="accountant"
+        )
+        patient = Patient.objects.create(
+            hospital=self.hospital, full_name="Ada Obi", date_of_birth="1990-01-01", phone_number="0800"
+        )
+        service = Service.objects.create(hospital=self.hospital, name="Consultation", price=100)
+        self.bills = [build_bill(patient, [(service.id, 1)]) for _ in range(5)]
+        self.client.force_login(self.user)
+
+    def test_cursor_walks_every_bill_once(self):
+        seen, cursor = [], None
+        while True:
+            params = {"format": "json", "limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            data = self.client.get("/bills/", params).json()
+            seen += [row["id"] for row in data["results"]]
+            cursor = data["next_cursor"]
+            if not cursor:
+                break
+
+        self.assertEqual(seen, sorted((bill.id for bill in self.bills), reverse=True))
+
+    def test_filters_and_bad_cursor(self):
+        post_payment(self.bills[0], self.bills[0].patient_payable, "cash")
+
+        data = self.client.get("/bills/", {"format": "json", "is_fully_paid": "1"}).json()
+        self.assertEqual([row["id"] for row in data["results"]], [self.bills[0].id])
+
+        data = self.client.get("/bills/", {"format": "json", "cursor": "garbage"}).json()
+        self.assertEqual(len(data["results"]), 5)
+
+
+class InlineExecutor:
+    """Runs submitted renders at once, in the test process."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as exc:
+            future.set_exception(exc)
+        return future
+
+
+class InvoicePDFTest(TestCase):
+    def setUp(self):
+        self.hospital = Hospital.objects.create(name="General", slug="general")
+        self.user = CustomUser.objects.create_user(
+            username="cashier", password="pass", hospital=self.hospital, role="accountant"
+        )
+        patient = Patient.objects.create(
+            hospital=self.hospital, full_name="Ada Obi", date_of_birth="1990-01-01", phone_number="0800"
+        )
+        self.service = Service.objects.create(hospital=self.hospital, name="Consultation", price=100)
+        self.bill = Bill.objects.create(hospital=self.hospital, patient=patient, total_amount=100, patient_payable=100)
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        patcher = mock.patch.object(invoice_pdf_cache, "directory", Path(directory))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_login(self.user)
+
+    def _version(self):
+        return invoice_version(Bill.objects.select_related("patient").get(pk=self.bill.pk))
+
+    def test_payment_and_item_writes_change_the_version(self):
+        version = self._version()
+        BillItem.objects.create(bill=self.bill, service=self.service, quantity=1)
+        after_item = self._version()
+        Payment.objects.create(hospital=self.hospital, bill=self.bill, amount_paid=50, payment_mode="cash")
+
+        self.assertNotEqual(version, after_item)
+        self.assertNotEqual(after_item, self._version())
+
+    def test_revalidation_does_not_render(self):
+        url = f"/bills/{self.bill.id}/invoice/pdf/"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        with mock.patch("billing.services.invoice_pdf.render_invoice_pdf") as render:
+            for path in invoice_pdf_cache.directory.glob("*.pdf"):
+                path.unlink()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        render.assert_not_called()
+
+        post_payment(self.bill, "50", "cash")
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_file_evicted_before_open_is_rendered_again(self):
+        missing = invoice_pdf_cache.directory / "gone.pdf"
+        with mock.patch.object(invoice_pdf_cache, "get", return_value=missing):
+            response = self.client.get(f"/bills/{self.bill.id}/invoice/pdf/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"%PDF"))
+
+    def test_cache_evicts_least_recently_used(self):
+        cache = InvoicePDFCache(invoice_pdf_cache.directory, max_bytes=10)
+        cache.put(1, "a", b"111111")
+        os.utime(cache.path_for(1, "a"), (0, 0))
+        cache.put(2, "b", b"222222")
+
+        self.assertIsNone(cache.get(1, "a"))
+        self.assertIsNotNone(cache.get(2, "b"))
+        # A new version replaces the bill's previous file
+        cache.put(2, "c", b"3")
+        self.assertEqual(sorted(p.name for p in cache.directory.glob("*.pdf")), ["2-c.pdf"])
+
+
+class InvoiceExportTest(TestCase):
+    def setUp(self):
+        self.hospital = Hospital.objects.create(name="General", slug="general")
+        self.user = CustomUser.objects.create_user(
+            username="cashier", password="pass", hospital=self.hospital, role="accountant"
+        )
+        patient = Patient.objects.create(
+            hospital=self.hospital, full_name="Ada Obi", date_of_birth="1990-01-01", phone_number="0800"
+        )
+        self.bills = [
+            Bill.objects.create(hospital=self.hospital, patient=patient, total_amount=100, patient_payable=100)
+            for _ in range(3)
+        ]
+        post_payment(self.bills[0], "40", "cash")
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        for patcher in (
+            mock.patch.object(invoice_pdf_cache, "directory", Path(directory)),
+            mock.patch("billing.services.invoice_export.ProcessPoolExecutor", InlineExecutor),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client.force_login(self.user)
+        self.today = timezone.localdate().isoformat()
+
+    def test_zip_streams_invoices_and_reports_failures(self):
+        broken = self.bills[1].invoice_no
+
+        def render(engine, html, timeout=None):
+            if broken in html:
+                raise PDFRenderError("template exploded")
+            return b"%PDF-" + html[:10].encode(), 0, 0
+
+        with mock.patch("billing.services.invoice_export.render_job", render):
+            response = self.client.get(
+                "/bills/export/invoices.zip", {"since": self.today, "until": self.today}
+            )
+            content = b"".join(response.streaming_content)
+
+        archive = zipfile.ZipFile(io.BytesIO(content))
+        names = archive.namelist()
+        # Entries follow render completion order; errors.txt always comes last
+        self.assertEqual(
+            set(names[:-1]),
+            {f"invoice_{self.bills[0].invoice_no}.pdf", f"invoice_{self.bills[2].invoice_no}.pdf"},
+        )
+        self.assertEqual(names[-1], "errors.txt")
+        self.assertIn(f"invoice_{broken}.pdf: template exploded", archive.read("errors.txt").decode())
+
+    def test_user_without_hospital_is_refused(self):
+        user = CustomUser.objects.create_user(username="acct", password="pass", role="accountant")
+        CustomUser.objects.filter(pk=user.pk).update(hospital=None)
+        self.client.force_login(user)
+
+        response = self.client.get("/bills/export/invoices.zip", {"since": self.today, "until": self.today})
+        self.assertEqual(response.status_code, 403)
+
+    def test_payments_are_prefetched(self):
+        bills = list(export_bills(self.hospital))
+        with self.assertNumQueries(0):
+            for bill in bills:
+                list(bill.payment_set.all())
+
+    def test_concurrent_exports_are_bounded(self):
+        with mock.patch.object(export_slots, "_semaphore", threading.BoundedSemaphore(1)):
+            export_slots.acquire()
+            response = self.client.get("/bills/export/invoices.zip", {"since": self.today, "until": self.today})
+        self.assertEqual(response.status_code, 503)
+
+
+class PDFJobTest(TestCase):
+    def setUp(self):
+        self.hospital = Hospital.objects.create(name="General", slug="general")
+        self.user = CustomUser.objects.create_user(
+            username="doctor", password="pass", hospital=self.hospital, role="doctor"
+        )
+        self.patient = Patient.objects.create(
+            hospital=self.hospital, full_name="Ada Obi", date_of_birth="1990-01-01", phone_number="0800"
+        )
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def _service(self, executor=None, **kwargs):
+        service = PDFJobService(self.directory, **kwargs)
+        service._get_executor = lambda: executor or InlineExecutor()
+        return service
+
+    def test_weasyprint_render_keeps_the_deadline(self):
+        slow = types.ModuleType("weasyprint")
+
+        class HTML:
+            def __init__(self, string):
+                pass
+
+            def write_pdf(self):
+                time.sleep(3)
+
+        slow.HTML = HTML
+        started = time.monotonic()
+        with mock.patch.dict(sys.modules, {"weasyprint": slow}):
+            with self.assertRaises(PDFRenderTimeout):
+                render_job("weasyprint", "<p>EMR</p>", timeout=1)
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_weasyprint_failure_falls_back_to_xhtml2pdf(self):
+        broken = types.ModuleType("weasyprint")
+
+        class HTML:
+            def __init__(self, string):
+                pass
+
+            def write_pdf(self):
+                raise ValueError("unsupported CSS")
+
+        broken.HTML = HTML
+        with mock.patch.dict(sys.modules, {"weasyprint": broken}):
+            pdf, _, _ = render_job("weasyprint", "<p>EMR</p>")
+        self.assertTrue(pdf.startswith(b"%PDF"))
+
+    def test_queue_depth_limit(self):
+        class StalledExecutor:
+            def submit(self, fn, *args):
+                return Future()
+
+        service = self._service(StalledExecutor(), max_queue=1)
+        service.submit("<p>1</p>", "one.pdf")
+
+        with self.assertRaises(PDFQueueFull):
+            service.submit("<p>2</p>", "two.pdf")
+        self.assertEqual(service.metrics()["rejected"], 1)
+
+    def test_submit_poll_and_download(self):
+        service = self._service()
+        self.client.force_login(self.user)
+
+        with mock.patch("billing.views.pdf_jobs", service):
+            response = self.client.post(f"/patients/{self.patient.id}/emr/pdf-job/")
+            self.assertEqual(response.status_code, 202)
+            job = response.json()
+
+            status = self.client.get(job["status_url"]).json()
+            self.assertEqual(status["status"], "done")
+
+            response = self.client.get(status["download_url"])
+            self.assertEqual(response["Content-Type"], "application/pdf")
+            self.assertTrue(b"".join(response.streaming_content).startswith(b"%PDF"))
+
+            # Jobs are only visible to their owner (and admins)
+            other = CustomUser.objects.create_user(
+                username="other", password="pass", hospital=self.hospital, role="doctor"
+            )
+            self.client.force_login(other)
+            self.assertEqual(self.client.get(job["status_url"]).status_code, 404)
+
+    def test_purged_result_is_gone(self):
+        service = self._service()
+        self.client.force_login(self.user)
+
+        with mock.patch("billing.views.pdf_jobs", service):
+            job = self.client.post(f"/patients/{self.patient.id}/emr/pdf-job/").json()
+            service.result_path(job["job"]).unlink()
+
+            response = self.client.get(f"/api/pdf-jobs/{job['job']}/download/")
+        self.assertEqual(response.status_code, 410)
+
+    def test_emr_page_uses_the_job_flow(self):
+        self.client.force_login(self.user)
+
+        response = self.client.get(f"/patients/{self.patient.id}/emr/")
+        self.assertContains(response, f'data-job-url="/patients/{self.patient.id}/emr/pdf-job/"')
+        self.assertNotContains(response, f"/patients/{self.patient.id}/emr/print/")
+
+    def test_full_queue_returns_503(self):
+        service = self._service(max_queue=0)
+        self.client.force_login(self.user)
+
+        with mock.patch("billing.views.pdf_jobs", service):
+            response = self.client.post(f"/patients/{self.patient.id}/emr/pdf-job/")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "5")
+
+
+class IncomeExportTest(TestCase):
+    def setUp(self):
+        hospital = Hospital.objects.create(name="General", slug="general")
+        other = Hospital.objects.create(name="Other", slug="other")
+        self.user = CustomUser.objects.create_user(
+            username="accountant", password="pass", hospital=hospital, role="accountant"
+        )
+        for h, modes in ((hospital, ["cash", "card", "cash"]), (other, ["cash"])):
+            patient = Patient.objects.create(
+                hospital=h, full_name="Ada Obi", date_of_birth="1990-01-01", phone_number="0800"
+            )
+            bill = Bill.objects.create(hospital=h, patient=patient, total_amount=1000, patient_payable=1000)
+            for mode in modes:
+                post_payment(bill, "100", mode)
+        self.client.force_login(self.user)
+
+    def test_csv_is_scoped_to_hospital_and_mode(self):
+        response = self.client.get("/reports/income/export/", {"format": "csv", "payment_mode": "cash"})
+        lines = b"".join(response.streaming_content).decode().splitlines()
+
+        self.assertEqual(lines[0], "payment_id,paid_on,invoice_no,patient,payment_mode,amount_paid")
+        self.assertEqual(len(lines), 3)
+
+    def test_ndjson_rows(self):
+        response = self.client.get("/reports/income/export/", {"format": "ndjson"})
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]["amount_paid"], "100.00")
+
+    def test_user_without_hospital_is_refused(self):
+        CustomUser.objects.filter(pk=self.user.pk).update(hospital=None)
+
+        response = self.client.get("/reports/income/export/", {"format": "csv"})
+        self.assertEqual(response.status_code, 403)
+
+
+class ClaimBatchTest(TestCase):
+    def setUp(self):
+        self.hospital = Hospital.objects.create(name="General", slug="general")
+        patient = Patient.objects.create(
+            hospital=self.hospital, full_name="Ada Obi", date_of_birth="1990-01-01", phone_number="0800"
+        )
+        self.nhis = ThirdPartyPayer.objects.create(name="NHIS", code="NHIS", payer_type="federal")
+        self.kschma = ThirdPartyPayer.objects.create(name="KSCHMA", code="KSCHMA", payer_type="state")
+        for payer, count in ((self.nhis, 3), (self.kschma, 2)):
+            for _ in range(count):
+                Bill.objects.create(
+                    hospital=self.hospital,
+                    patient=patient,
+                    total_amount=1000,
+                    patient_payable=100,
+                    third_party_payable=900,
+                    third_party=payer,
+                )
+
+    def test_batch_lifecycle(self):
+        batches = create_claim_batches(self.hospital)
+        self.assertEqual(sorted(b.bill_count for b in batches), [2, 3])
+        self.assertEqual(create_claim_batches(self.hospital), [])
+
+        batch = ClaimBatch.objects.get(third_party=self.nhis)
+        self.assertEqual(batch.total_claimed, D("2700"))
+
+        with self.assertRaises(ClaimTransitionError):
+            settle_batch(batch)
+
+        submit_batch(batch)
+        self.assertEqual(set(batch.bills.values_list("claim_status", flat=True)), {"submitted"})
+
+        rejected = batch.bills.first()
+        settle_batch(batch, [rejected.id])
+        self.assertEqual(batch.status, "paid")
+        self.assertEqual(batch.bills.filter(claim_status="paid").count(), 2)
+        self.assertEqual(Bill.objects.get(pk=rejected.pk).claim_status, "rejected")
+
+    def test_stale_batch_cannot_transition_twice(self):
+        batch = create_claim_batches(self.hospital, third_party=self.nhis)[0]
+        stale = ClaimBatch.objects.get(pk=batch.pk)
+        submit_batch(batch)
+        settle_batch(batch)
+
+        # A request that loaded the batch before the others committed
+        with self.assertRaises(ClaimTransitionError):
+            submit_batch(stale)
+        self.assertEqual(set(batch.bills.values_list("claim_status", flat=True)), {"paid"})
+
+    def test_settle_rejects_invalid_bill_ids(self):
+        batch = create_claim_batches(self.hospital, third_party=self.nhis)[0]
+        submit_batch(batch)
+        user = CustomUser.objects.create_user(
+            username="acct", password="pass", hospital=self.hospital, role="accountant"
+        )
+        self.client.force_login(user)
+
+        response = self.client.post(
+            f"/accountant/claims/batches/{batch.id}/", {"action": "settle", "rejected": ["1", "abc"]}
+        )
+        self.assertEqual(response.status_code, 400)
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, "submitted")
+
+    def test_totals_in_one_query(self):
+        batch = create_claim_batches(self.hospital, third_party=self.nhis)[0]
+        submit_batch(batch)
+
+        with self.assertNumQueries(1):
+            totals = {row["third_party__code"]: row for row in claim_totals(self.hospital)}
+
+        self.assertEqual(totals["NHIS"]["submitted"], D("2700"))
+        self.assertEqual(totals["KSCHMA"]["draft"], D("1800"))
+        self.assertEqual(totals["KSCHMA"]["unbatched"], 2)
+
+    def test_claim_files(self):
+        service = Service.objects.create(hospital=self.hospital, name="Consultation", price=450)
+        for bill in Bill.objects.all():
+            BillItem.objects.create(bill=bill, service=service, quantity=2)
+        create_claim_batches(self.hospital)
+        batches = ClaimBatch.objects.select_related("third_party", "hospital")
+        nhis, kschma = batches.get(third_party=self.nhis), batches.get(third_party=self.kschma)
+
+        writer = writer_for(nhis)
+        # One joined read, independent of the number of bills
+        with self.assertNumQueries(1):
+            lines = list(writer.stream())
+        self.assertEqual([line[0] for line in lines], ["H", "D", "D", "D", "T"])
+        self.assertEqual(len({len(line) for line in lines[1:-1]}), 1)
+        self.assertTrue(lines[-1].startswith("T00000003000000000270000"))
+
+        rows = list(writer_for(kschma).stream())
+        self.assertEqual(len(rows), 3)
+        self.assertIn("Consultation,2,450.00,900.00,900.00", rows[1])
+
+    def test_fixed_width_overflow_is_refused(self):
+        service = Service.objects.create(hospital=self.hospital, name="Consultation", price=1)
+        bill = Bill.objects.filter(third_party=self.nhis).first()
+        BillItem.objects.create(bill=bill, service=service, quantity=100000)
+        batch = create_claim_batches(self.hospital, third_party=self.nhis)[0]
+        user = CustomUser.objects.create_user(
+            username="acct", password="pass", hospital=self.hospital, role="accountant"
+        )
+        self.client.force_login(user)
+
+        response = self.client.get(f"/accountant/claims/batches/{batch.id}/file/")
+        self.assertEqual(response.status_code, 400)
+        with self.assertRaises(ClaimFileError):
+            list(writer_for(batch).stream())
+
+    def test_writer_must_implement_line(self):
+        class Incomplete(ClaimFileWriter):
+            pass
+
+        with self.assertRaises(TypeError):
+            Incomplete(None)
+
+
+class BankStatementImportTest(TestCase):
+    def setUp(self):
+        self.hospital = Hospital.objects.create(name="General", slug="general")
+        patient = Patient.objects.create(
+            hospital=self.hospital, full_name="Ada Obi", date_of_birth="1990-01-01", phone_number="0800"
+        )
+        self.bills = [
+            Bill.objects.create(hospital=self.hospital, patient=patient, total_amount=1000, patient_payable=1000)
+            for _ in range(3)
+        ]
+
+    def statement(self):
+        a, b, c = (str(bill.invoice_no) for bill in self.bills)
+        return io.StringIO(
+            "Date,Narration,Credit\n"
+            f"2026-10-01,TRF FOR {a.upper()},\"1,000.00\"\n"
+            f"2026-10-01,part payment {b},400\n"
+            f"2026-10-02,balance {b},700\n"
+            "2026-10-02,no invoice here,50\n"
+            f"2026-10-03,{c},abc\n"
+        )
+
+    def test_import_matches_and_updates_bills(self):
+        result = import_statement(self.hospital, self.statement())
+
+        self.assertEqual((result.lines, result.matched), (5, 2))
+        self.assertEqual(result.matched_total, D("1400"))
+        self.assertEqual(
+            sorted(row["reason"] for row in result.unmatched_rows()),
+            ["exceeds balance due", "invalid amount", "no invoice number"],
+        )
+
+        paid, part, _ = (Bill.objects.get(pk=bill.pk) for bill in self.bills)
+        self.assertEqual((paid.amount_paid, paid.balance_due, paid.is_fully_paid), (D("1000"), D("0"), True))
+        self.assertEqual((part.amount_paid, part.is_fully_paid), (D("400"), False))
+        self.assertEqual(DailyRevenue.objects.get(payment_mode="transfer").total, D("1400"))
+
+    def test_reimport_is_skipped(self):
+        import_statement(self.hospital, self.statement())
+        result = import_statement(self.hospital, self.statement())
+
+        self.assertEqual(result.matched, 0)
+        self.assertEqual(Payment.objects.count(), 2)
+
+    def test_concurrent_reimport_cannot_post_twice(self):
+        import_statement(self.hospital, self.statement())
+
+        # A second import that matched before the first one committed
+        with mock.patch("billing.services.bank_reconciliation._imported_references", return_value=set()):
+            with self.assertRaises(StatementFormatError):
+                import_statement(self.hospital, self.statement())
+        self.assertEqual(Payment.objects.count(), 2)
+
+    def test_unreadable_upload_is_a_form_error(self):
+        user = CustomUser.objects.create_user(
+            username="acct", password="pass", hospital=self.hospital, role="accountant"
+        )
+        self.client.force_login(user)
+
+        for content in (b"", b"date,narration,amount\n\"unterminated,x\n1,2,3,4\n", "Zahlung für".encode("latin-1")):
+            upload = SimpleUploadedFile("statement.csv", content, content_type="text/csv")
+            response = self.client.post("/api/payments/bank-statement/", {"statement": upload})
+            self.assertEqual(response.status_code, 400, content)
+            self.assertIn("error", response.json())
+
+
+class InvoiceNumberTest(TestCase):
+    def setUp(self):
+        invoice_numbers.clear()
+        self.hospital = Hospital.objects.create(name="General", slug="general")
+        self.patient = Patient.objects.create(
+            hospital=self.hospital, full_name="Ada Obi", date_of_birth="1990-01-01", phone_number="0800"
+        )
+
+    def new_bill(self, **kwargs):
+        return Bill.objects.create(hospital=self.hospital, patient=self.patient, total_amount=100, **kwargs)
+
+    def test_numbers_come_from_committed_block(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.new_bill()
+
+        with self.assertNumQueries(1):
+            second = self.new_bill()
+
+        self.assertEqual(first.invoice_no, "INV-GENERAL-0000001")
+        self.assertEqual(second.invoice_no, "INV-GENERAL-0000002")
+        self.assertEqual(InvoiceSequence.objects.get(hospital=self.hospital).next_value, 51)
+        self.assertEqual(invoice_numbers.allocate(self.hospital.id, 2), ["INV-GENERAL-0000051", "INV-GENERAL-0000052"])
+
+    def test_rolled_back_block_is_not_reused(self):
+        with self.assertRaises(ZeroDivisionError), transaction.atomic():
+            self.new_bill()
+            1 / 0
+
+        # The rolled-back block is dropped; the new one serves the rest of this transaction
+        self.assertEqual(self.new_bill().invoice_no, "INV-GENERAL-0000001")
+        self.assertEqual(self.new_bill().invoice_no, "INV-GENERAL-0000002")
+        self.assertEqual(InvoiceSequence.objects.get(hospital=self.hospital).next_value, 51)
+
+    def test_one_block_per_transaction(self):
+        with transaction.atomic():
+            numbers = [invoice_numbers.next(self.hospital.id) for _ in range(60)]
+            with self.assertNumQueries(0):
+                numbers.append(invoice_numbers.next(self.hospital.id))
+
+        self.assertEqual(len(set(numbers)), 61)
+        self.assertEqual(numbers[-1], "INV-GENERAL-0000061")
+        self.assertEqual(InvoiceSequence.objects.get(hospital=self.hospital).next_value, 101)
+
+    def test_benchmark_leaves_nothing_behind(self):
+        out = io.StringIO()
+        call_command("benchmark_invoice_numbers", "--bills", "5", "--block-size", "2", stdout=out)
+
+        self.assertIn("sequential: 5 bills", out.getvalue())
+        self.assertEqual(list(Hospital.objects.all()), [self.hospital])
+        self.assertFalse(Bill.objects.exists())
+        self.assertFalse(InvoiceSequence.objects.exists())
+
+    def test_legacy_invoices_are_renumbered(self):
+        legacy = str(uuid.uuid4())
+        bill = self.new_bill(invoice_no=legacy)
+
+        call_command("renumber_legacy_invoices", stdout=io.StringIO())
+
+        bill.refresh_from_db()
+        self.assertTrue(bill.invoice_no.startswith("INV-GENERAL-"))
+        self.assertEqual(bill.legacy_invoice_no, legacy)
+
+        statement = io.StringIO(f"date,narration,amount\n2026-10-01,TRF {legacy.upper()},40\n")
+        self.assertEqual(import_statement(self.hospital, statement).matched, 1)
+
+
+class ReceivablesAgingTest(TestCase):
+    def setUp(self):
+        self.hospital = Hospital.objects.create(name="General", slug="general")
+        patient = Patient.objects.create(
+            hospital=self.hospital, full_name="Ada Obi", date_of_birth="1990-01-01", phone_number="0800"
+        )
+        nhis = ThirdPartyPayer.objects.create(name="NHIS", code="NHIS", payer_type="federal")
+        now = timezone.now()
+        for days, payer in ((5, nhis), (45, nhis), (120, None), (120, nhis)):
+            bill = Bill.objects.create(
+                hospital=self.hospital,
+                patient=patient,
+                total_amount=1000,
+                patient_payable=1000 if payer is None else 100,
+                third_party_payable=0 if payer is None else 900,
+                third_party=payer,
+            )
+            Bill.objects.filter(pk=bill.pk).update(created_at=now - timedelta(days=days))
+        post_payment(bill, "100", "cash")  # the 120-day NHIS bill's patient share is settled
+
+    def test_buckets_in_one_query(self):
+        with self.assertNumQueries(1):
+            rows = {row["third_party__code"]: row for row in aging_rows(self.hospital)}
+
+        self.assertEqual(rows["NHIS"]["payer_current"], D("900"))
+        self.assertEqual(rows["NHIS"]["payer_31_60"], D("900"))
+        self.assertEqual(rows["NHIS"]["payer_over_90"], D("900"))
+        self.assertEqual(rows["NHIS"]["patient_over_90"], D("0"))
+        self.assertEqual(rows[None]["patient_over_90"], D("1000"))
+        self.assertEqual(aging_totals(rows.values())["all_over_90"], D("1900"))
+
+    def test_snapshot_replaces_same_day(self):
+        self.assertEqual(take_snapshot(self.hospital), 2)
+        self.assertEqual(take_snapshot(self.hospital), 2)
+        self.assertEqual(AgingSnapshot.objects.count(), 2)
+
+    def test_user_without_hospital_gets_an_empty_report(self):
+        user = CustomUser.objects.create_user(username="acct", password="pass", role="accountant")
+        CustomUser.objects.filter(pk=user.pk).update(hospital=None)
+        self.client.force_login(user)
+
+        response = self.client.get("/accountant/aging/?format=json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["rows"], [])
+        self.assertEqual(self.client.get("/accountant/aging/").status_code, 200)
+
+
+class ServiceCatalogTest(TestCase):
+    def setUp(self):
+        # Catalogs are cached per hospital id and version, which repeat across tests
+        cache.clear()
+        self.hospital = Hospital.objects.create(name="General", slug="general")
+        self.user = CustomUser.objects.create_user(
+            username="cashier", password="pass", hospital=self.hospital, role="accountant"
+        )
+        self.service = Service.objects.create(hospital=self.hospital, name="Consultation", price=100)
+        self.client.force_login(self.user)
+
+    def test_etag_revalidation(self):
+        response = self.client.get("/api/services/catalog/")
+        etag = response["ETag"]
+        self.assertEqual(
+            json.loads(response.content)["services"],
+            [{"id": self.service.id, "name": "Consultation", "price": "100.00"}],
+        )
+
+        response = self.client.get("/api/services/catalog/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_service_write_bumps_version(self):
+        etag = self.client.get("/api/services/catalog/")["ETag"]
+        stale = Hospital.objects.get(pk=self.hospital.pk)
+
+        self.service.price = 150
+        self.service.save()
+        stale.save()  # a full save of a stale Hospital must not roll the version back
+
+        response = self.client.get("/api/services/catalog/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)["services"][0]["price"], "150.00")
+
+    def test_catalog_follows_the_patients_hospital(self):
+        other = Hospital.objects.create(name="Annex", slug="annex")
+        xray = Service.objects.create(hospital=other, name="X-ray", price=300)
+        patient = Patient.objects.create(
+            hospital=other, full_name="Ada Obi", date_of_birth="1990-01-01", phone_number="0800"
+        )
+
+        response = self.client.get("/api/services/catalog/", {"patient": patient.id})
+        self.assertEqual(
+            json.loads(response.content)["services"],
+            [{"id": xray.id, "name": "X-ray", "price": "300.00"}],
+        )
+        self.assertNotEqual(response["ETag"], self.client.get("/api/services/catalog/")["ETag"])
+
+        # the catalog's services are the ones billing the patient accepts
+        response = self.client.post(f"/bills/create/{patient.id}/", {"service": [xray.id], "quantity": ["1"]})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Bill.objects.get(patient=patient).total_amount, D("300.00"))
+
+        self.assertEqual(self.client.get("/api/services/catalog/", {"patient": "x"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/services/catalog/", {"patient": 999999}).status_code, 404)
+
+
+class CoverageSimulationTest(TestCase):
+    def setUp(self):
+        self.hospital = Hospital.objects.create(name="General", slug="general")
+        nhis = Payer.objects.create(code="NHIS", name="NHIS", payer_type="government")
+        for i, total in enumerate(("1000", "333.33", "0.05")):
+            patient = Patient.objects.create(
+                hospital=self.hospital, full_name=f"Patient {i}", date_of_birth="1990-01-01", phone_number="0800"
+            )
+            if i < 2:
+                PatientCoverage.objects.create(
+                    patient=patient, payer=nhis, patient_percentage=10, government_percentage=90
+                )
+            Bill.objects.create(hospital=self.hospital, patient=patient, total_amount=total, patient_payable=total)
+
+    def test_split_matches_decimal_rounding(self):
+        totals = [5, 15, 25, 33333, 99999, 100000000]
+        for pct in ("12.50", "33.33", "66.67", "5", "100"):
+            expected = [split_amount(D(t) / 100, pct, 0)[0] * 100 for t in totals]
+            result = split_kobo(np.array(totals, dtype="int64"), int(D(pct) * 100))
+            self.assertEqual([D(int(k)) for k in result], expected, pct)
+
+    def test_per_payer_deltas(self):
+        frame = load_bills(self.hospital)
+        rows = {
+            row["payer_code"]: row
+            for row in simulation_rows(simulate(frame, [CoverageScenario.parse("NHIS", 25)]))
+        }
+
+        self.assertEqual(rows["NHIS"]["bills"], 2)
+        self.assertEqual(rows["NHIS"]["patient_before"], D("133.33"))
+        self.assertEqual(rows["NHIS"]["patient_after"], D("333.33"))
+        self.assertEqual(rows["NHIS"]["payer_delta"], D("-200.00"))
+        self.assertEqual(rows["SELF"]["patient_delta"], D("0"))
+        self.assertEqual(PatientCoverage.objects.filter(patient_percentage=10).count(), 2)
+
+    def test_view_refuses_user_without_hospital(self):
+        user = CustomUser.objects.create_user(username="acct", password="pass", role="accountant")
+        CustomUser.objects.filter(pk=user.pk).update(hospital=None)
+        self.client.force_login(user)
+
+        response = self.client.post(
+            "/api/coverage/simulate/",
+            json.dumps({"scenarios": {"NHIS": {"patient_percentage": 25}}}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class InvalidDateParamTest(TestCase):
+    def setUp(self):
+        self.hospital = Hospital.objects.create(name="General", slug="general")
+        self.user = CustomUser.objects.create_user(
+            username="cashier", password="pass", hospital=self.hospital, role="accountant"
+        )
+        self.client.force_login(self.user)
+
+    def test_invalid_dates_are_bad_requests(self):
+        for since in ("2024-02-30", "yesterday"):
+            for url in ("/bills/", "/bills/export/invoices.zip", "/reports/income/export/"):
+                response = self.client.get(url, {"since": since, "until": "2024-03-01"})
+                self.assertEqual(response.status_code, 400, (url, since))
+                self.assertEqual(response.content, b"since must be a YYYY-MM-DD date")
+
+        response = self.client.get("/bills/", {"until": "2024-02-30", "format": "json"})
+        self.assertEqual(response.json(), {"error": "until must be a YYYY-MM-DD date"})
+
+        for since in ("2024-02-30", 20240201, ["2024-02-01"]):
+            response = self.client.post(
+                "/api/coverage/simulate/",
+                json.dumps({"scenarios": {"NHIS": {"patient_percentage": 20}}, "since": since}),
+                content_type="application/json",
+            )
+            self.assertEqual(response.status_code, 400, since)
+            self.assertEqual(response.json(), {"error": "since must be a YYYY-MM-DD date"})
+
+        response = self.client.post("/accountant/claims/batches/create/", {"since": "2024-02-30"}, follow=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("since must be a YYYY-MM-DD date", [str(m) for m in response.context["messages"]])
+        self.assertFalse(ClaimBatch.objects.exists())
+
+    def test_blank_dates_are_ignored(self):
+        self.assertEqual(self.client.get("/bills/", {"since": "", "format": "json"}).status_code, 200)
+        response = self.client.post(
+            "/api/coverage/simulate/",
+            json.dumps({"scenarios": {"NHIS": {"patient_percentage": 20}}, "since": None}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class CoverageBackfillTest(TestCase):
+    def setUp(self):
+        self.hospital = Hospital.objects.create(name="General", slug="general")
+        self.nhis = ThirdPartyPayer.objects.create(name="NHIS", code="NHIS", payer_type="federal")
+        payer = Payer.objects.create(code="NHIS", name="NHIS", payer_type="government")
+
+        self.bills = {}
+        for name in ("open", "paid", "claimed", "self_pay"):
+            patient = Patient.objects.create(
+                hospital=self.hospital, full_name=name, date_of_birth="1990-01-01", phone_number="0800"
+            )
+            if name != "self_pay":
+                PatientCoverage.objects.create(
+                    patient=patient, payer=payer, patient_percentage=10, government_percentage=90
+                )
+            self.bills[name] = Bill.objects.create(
+                hospital=self.hospital, patient=patient, total_amount=1000, patient_payable=1000
+            )
+
+        post_payment(self.bills["paid"], "1000", "cash")
+        batch = ClaimBatch.objects.create(hospital=self.hospital, third_party=self.nhis, reference="NHIS-1")
+        Bill.objects.filter(pk=self.bills["claimed"].pk).update(claim_batch=batch)
+
+    def _reapply(self, *args):
+        call_command("reapply_coverage", *args, stdout=io.StringIO())
+
+    def test_resplits_open_bills_and_skips_paid_and_claimed(self):
+        self._reapply("--payer", "NHIS", "--dry-run")
+        self.assertEqual(Bill.objects.get(pk=self.bills["open"].pk).patient_payable, D("1000.00"))
+
+        self._reapply("--payer", "NHIS", "--chunk-size", "1")
+
+        bill = Bill.objects.get(pk=self.bills["open"].pk)
+        self.assertEqual((bill.patient_payable, bill.third_party_payable), (D("100.00"), D("900.00")))
+        self.assertEqual(bill.third_party, self.nhis)
+        for name in ("paid", "claimed", "self_pay"):
+            bill = Bill.objects.get(pk=self.bills[name].pk)
+            self.assertEqual((bill.patient_payable, bill.third_party_id), (D("1000.00"), None), name)
+
+    def test_resume_from_checkpoint(self):
+        checkpoint = Path(tempfile.mkdtemp()) / "checkpoint.json"
+        self.addCleanup(shutil.rmtree, checkpoint.parent, ignore_errors=True)
+        checkpoint.write_text(json.dumps({"last_id": self.bills["open"].pk, "scanned": 1, "updated": 0}))
+
+        self._reapply("--checkpoint", str(checkpoint), "--resume")
+
+        self.assertEqual(Bill.objects.get(pk=self.bills["open"].pk).patient_payable, D("1000.00"))
+        self.assertEqual(json.loads(checkpoint.read_text())["last_id"], self.bills["self_pay"].pk)
+
+    def test_chunk_reads_payments_from_the_bills(self):
+        chunk = list(coverage_bills("NHIS"))
+        third_parties = third_party_index()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(reprice_chunk(chunk, third_parties, dry_run=True), 1)
+
+    def test_impossible_dates_are_command_errors(self):
+        with self.assertRaisesMessage(CommandError, "Invalid date '2024-02-30'"):
+            self._reapply("--since", "2024-02-30")
+        with self.assertRaisesMessage(CommandError, "Invalid date '2024-13-01'"):
+            call_command("simulate_coverage", "--set", "NHIS=20", "--until", "2024-13-01", stdout=io.StringIO())
+        with self.assertRaisesMessage(CommandError, "Invalid date '2024-02-30'"):
+            call_command(
+                "export_invoices", "out.zip", "--hospital", "general",
+                "--since", "2024-02-30", "--until", "2024-03-01", stdout=io.StringIO(),
+            )
+
+
+class BenchmarkTest(TestCase):
+    def setUp(self):
+        invoice_numbers.clear()
+        coverage_resolver.clear()
+
+    def test_seed_and_run(self):
+        data = seed(Volumes(hospitals=2, patients=10, services=6, bills=20, items_per_bill=2))
+
+        self.assertEqual(len(data.bill_ids), 10)
+        self.assertEqual(BillItem.objects.count(), 40)
+        self.assertEqual(Bill.objects.filter(invoice_no="").count(), 0)
+
+        results = run_benchmark(data, ["view_invoice", "record_payment"], iterations=3, warmup=0)
+        self.assertEqual(results["view_invoice"]["statuses"], {"200": 3})
+        self.assertEqual(results["record_payment"]["statuses"], {"302": 3})
+        self.assertGreater(results["view_invoice"]["queries_max"], 0)
+
+    def test_compare_flags_query_growth(self):
+        row = {"p50_ms": 10.0, "p95_ms": 20.0, "queries_max": 6}
+        report = {"views": {"view_invoice": {**row, "queries_max": 7, "p95_ms": 22.0}}}
+
+        self.assertEqual(
+            compare(report, {"views": {"view_invoice": row}}, tolerance=0.2),
+            ["view_invoice: queries_max 6 -> 7"],
+        )
+
+
+class PayerTariffTest(TestCase):
+    def setUp(self):
+        coverage_resolver.clear()
+        tariff_resolver.clear()
+        self.hospital = Hospital.objects.create(name="General", slug="general")
+        self.patient = Patient.objects.create(
+            hospital=self.hospital, full_name="Ada Obi", date_of_birth="1990-01-01", phone_number="0800"
+        )
+        self.nhis = ThirdPartyPayer.objects.create(name="NHIS", code="NHIS", payer_type="federal")
+        PatientCoverage.objects.create(
+            patient=self.patient,
+            payer=Payer.objects.create(code="NHIS", name="NHIS", payer_type="government"),
+            patient_percentage=10,
+            government_percentage=90,
+        )
+        self.services = [
+            Service.objects.create(hospital=self.hospital, name=f"Service {i}", price=100) for i in range(3)
+        ]
+        today = timezone.localdate()
+        PayerTariff.objects.create(
+            service=self.services[0], third_party=self.nhis, price=80, effective_from=today - timedelta(days=30)
+        )
+        PayerTariff.objects.create(
+            service=self.services[1], third_party=self.nhis, price=60, effective_from=today + timedelta(days=1)
+        )
+        invoice_numbers.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            invoice_numbers.next(self.hospital.id)
+
+    def test_lines_priced_at_tariff_in_effect(self):
+        bill = build_bill(self.patient, [(service.id, 2) for service in self.services])
+
+        prices = dict(bill.items.values_list("service_id", "unit_price"))
+        self.assertEqual(prices[self.services[0].id], D("80"))
+        self.assertEqual(prices[self.services[1].id], D("100"))  # tariff not yet in effect
+        self.assertEqual(bill.total_amount, D("560"))
+        self.assertEqual(bill.third_party_payable, D("504"))
+
+    def test_matrix_cached_until_tariff_write(self):
+        lines = [(service.id, 1) for service in self.services]
+        build_bill(self.patient, lines)
+
+        # Services (with the catalog version), bill, items, audit log: no tariff query
+        with self.assertNumQueries(6):
+            build_bill(self.patient, lines)
+
+        PayerTariff.objects.filter(service=self.services[0]).get().delete()
+        self.assertEqual(build_bill(self.patient, lines).total_amount, D("300"))
+
+    def test_bill_form_shows_tariff_prices(self):
+        user = CustomUser.objects.create_user(
+            username="cashier", password="pass", hospital=self.hospital, role="accountant"
+        )
+        self.client.force_login(user)
+
+        response = self.client.get(f"/bills/create/{self.patient.id}/")
+        self.assertEqual(response.context["tariff_prices"], {str(self.services[0].id): "80.00"})
+        self.assertContains(response, 'id="tariff-prices"')
+
+
+class ChargeCaptureTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        coverage_resolver.clear()
+        tariff_resolver.clear()
+        self.hospital = Hospital.objects.create(name="General", slug="general")
+        patient = Patient.objects.create(
+            hospital=self.hospital, full_name="Ada Obi", date_of_birth="1990-01-01", phone_number="0800"
+        )
+        self.visit = PatientVisit.objects.create(hospital=self.hospital, patient=patient)
+        Service.objects.create(hospital=self.hospital, name="Full Blood Count", price=50)
+        Medicine.objects.create(hospital=self.hospital, name="Paracetamol", price=10, quantity=100)
+        invoice_numbers.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            invoice_numbers.next(self.hospital.id)
+
+    def lab_request(self, test_type="full blood count"):
+        return LabTestRequest.objects.create(hospital=self.hospital, visit=self.visit, test_type=test_type)
+
+    def test_events_accumulate_on_one_draft_bill(self):
+        self.lab_request()
+        RadiologyRequest.objects.create(hospital=self.hospital, visit=self.visit, imaging_type="No such scan")
+        prescription = Prescription.objects.create(
+            hospital=self.hospital, visit=self.visit, medicines="Paracetamol x 3\nUnknown x 1"
+        )
+        prescription.status = "dispensed"
+        prescription.save()
+        prescription.save()  # re-saving never charges twice
+
+        self.assertEqual(ChargeEvent.objects.count(), 2)
+        self.assertFalse(Bill.objects.exists())
+
+        bill = flush_visit(self.visit.id)
+        self.assertTrue(bill.is_draft)
+        self.assertEqual((bill.total_amount, bill.balance_due, bill.revision), (D("80"), D("80"), 1))
+        self.assertEqual(bill.items.count(), 2)
+
+        self.lab_request()
+        self.assertEqual(flush_visit(self.visit.id).pk, bill.pk)
+        bill.refresh_from_db()
+        self.assertEqual((bill.total_amount, bill.items.count(), bill.revision), (D("130"), 3, 2))
+        self.assertIsNone(flush_visit(self.visit.id))
+
+        self.visit.status = "completed"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.visit.save()
+        bill.refresh_from_db()
+        self.assertFalse(bill.is_draft)
+
+    def test_pharmacy_services_stay_out_of_the_catalog(self):
+        version = catalog_version(self.hospital.id)
+        prescription = Prescription.objects.create(hospital=self.hospital, visit=self.visit, medicines="Paracetamol x 2")
+        prescription.status = "dispensed"
+        prescription.save()
+
+        self.assertTrue(Service.objects.get(name="Pharmacy: Paracetamol").is_pharmacy)
+        self.assertEqual(catalog_version(self.hospital.id), version)
+        names = [s["name"] for s in json.loads(catalog_json(self.hospital.id, version))["services"]]
+        self.assertEqual(names, ["Full Blood Count"])
+
+    def test_record_charges_counts_inserted_rows(self):
+        request = self.lab_request()
+        self.assertEqual(ChargeEvent.objects.count(), 1)
+
+        self.assertEqual(capture_lab_request(request), 0)
+        self.assertEqual(ChargeEvent.objects.count(), 1)
+
+    def test_charges_after_completion_go_on_a_final_bill(self):
+        self.lab_request()
+        bill = flush_visit(self.visit.id)
+        self.visit.status = "completed"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.visit.save()
+
+        prescription = Prescription.objects.create(hospital=self.hospital, visit=self.visit, medicines="Paracetamol x 2")
+        prescription.status = "dispensed"
+        prescription.save()
+
+        late = flush_visit(self.visit.id)
+        self.assertNotEqual(late.pk, bill.pk)
+        self.assertFalse(late.is_draft)
+        self.assertEqual(late.total_amount, D("20"))
+        self.assertFalse(Bill.objects.filter(visit=self.visit, is_draft=True).exists())
+
+    def test_failed_flush_is_logged(self):
+        def flush(visit_id):
+            raise RuntimeError("database is locked")
+
+        flusher = ChargeFlusher(delay=0, flush=flush)
+        with self.assertLogs("billing.services.charge_capture", "ERROR") as logs:
+            flusher.schedule(self.visit.id)
+
+        self.assertIn(f"Charge flush failed for visit {self.visit.id}", logs.output[0])
+        self.assertIn("database is locked", logs.output[0])
+        self.assertEqual(flusher.counters["failed"], 1)
+
+    def test_flusher_coalesces_events_per_visit(self):
+        flushed = []
+        done = threading.Event()
+        flusher = ChargeFlusher(delay=0.05, flush=lambda visit_id: (flushed.append(visit_id), done.set()))
+        self.addCleanup(flusher.cancel_all)
+
+        for _ in range(3):
+            flusher.schedule(self.visit.id)
+
+        self.assertTrue(done.wait(2))
+        self.assertEqual(flushed, [self.visit.id])
+        self.assertEqual(flusher.counters["coalesced"], 2)
+
+
+class SLASchedulerTest(TestCase):
+    def setUp(self):
+        hospital = Hospital.objects.create(name="General", slug="general")
+        patient = Patient.objects.create(
+            hospital=hospital, full_name="Ada Obi", date_of_birth="1990-01-01", phone_number="0800"
+        )
+        policy = SLAPolicy.objects.create(
+            hospital=hospital, severity="critical", response_time_minutes=5,
+            escalation_time_minutes=10, max_escalation_level=2,
+        )
+        now = timezone.now()
+        self.alert = VitalAlert.objects.create(
+            patient=patient,
+            vital=VitalSign.objects.create(patient=patient, spo2=80),
+            message="Critical vital signs detected",
+            sla_policy=policy,
+            acknowledge_deadline=now - timedelta(minutes=5),
+            escalation_deadline=now - timedelta(seconds=1),
+        )
+        self.scheduler = SLAScheduler()
+        oncall_roster.clear()
+
+    def test_recovery_scan_fires_past_deadlines(self):
+        self.scheduler.load()
+
+        self.assertEqual(self.scheduler.run_due(), 2)
+        self.alert.refresh_from_db()
+        self.assertEqual(self.alert.escalation_level, 1)
+        self.assertTrue(self.alert.logs.filter(action="sla_breached").exists())
+
+        # The next escalation is queued for the policy's escalation time
+        self.assertEqual(self.scheduler.next_deadline(), self.alert.escalation_deadline)
+        self.assertGreater(self.alert.escalation_deadline, timezone.now() + timedelta(minutes=9))
+        self.assertEqual(self.scheduler.run_due(), 0)
+
+    def test_acknowledged_alert_leaves_the_heap(self):
+        self.scheduler.load()
+        self.assertEqual(len(self.scheduler), 2)
+
+        self.alert.status = "acknowledged"
+        self.alert.acknowledged_at = timezone.now()
+        self.alert.escalation_deadline = None
+        self.alert.save()
+        self.scheduler.poll_changes()
+
+        self.assertEqual(len(self.scheduler), 0)
+        self.assertEqual(self.scheduler.run_due(timezone.now() + timedelta(hours=1)), 0)
+
+
+class AlertEscalationTest(TestCase):
+    def setUp(self):
+        oncall_roster.clear()
+        self.hospitals = [
+            Hospital.objects.create(name="General", slug="general"),
+            Hospital.objects.create(name="Annex", slug="annex"),
+        ]
+        self.head_doctors = [
+            CustomUser.objects.create_user(username=f"head{i}", password="x", hospital=hospital, role="head_doctor")
+            for i, hospital in enumerate(self.hospitals)
+        ]
+        # Only the first hospital has an admin, so the second stops at level 1
+        self.admin = CustomUser.objects.create_user(
+            username="admin0", password="x", hospital=self.hospitals[0], role="admin"
+        )
+
+    def _alerts(self, count):
+        alerts = []
+        for i in range(count):
+            hospital = self.hospitals[i % 2]
+            patient = Patient.objects.create(
+                hospital=hospital, full_name=f"Patient {i}", date_of_birth="1990-01-01", phone_number=f"080{i}"
+            )
+            alerts.append(VitalAlert.objects.create(
+                patient=patient,
+                vital=VitalSign.objects.create(patient=patient, spo2=80),
+                message="Critical vital signs detected",
+            ))
+        return alerts
+
+    def test_query_count_does_not_grow_with_alerts(self):
+        alerts = self._alerts(30)
+        later = timezone.now() + timedelta(minutes=30)
+
+        # Per level: alerts, savepoint pair, INSERT, UPDATE, unread counts; the
+        # roster is loaded once, in two queries, for both hospitals
+        with self.assertNumQueries(14), self.captureOnCommitCallbacks(execute=True):
+            stats = escalate_unacknowledged_alerts(now=later)
+
+        self.assertEqual(stats["processed"], 60)
+        self.assertEqual(stats["escalated"], 45)
+        levels = dict(VitalAlert.objects.filter(pk__in=[a.pk for a in alerts]).values_list("id", "escalation_level"))
+        self.assertEqual([levels[a.pk] for a in alerts[:4]], [2, 1, 2, 1])
+
+        self.assertEqual(Message.objects.filter(recipient=self.head_doctors[0]).count(), 15)
+        self.assertEqual(Message.objects.filter(recipient=self.admin).count(), 15)
+        message = Message.objects.filter(recipient=self.admin).first()
+        self.assertIsNone(message.sender)
+        self.assertIn("Escalation Level: 2", message.body)
+
+    def test_alerts_without_a_target_are_skipped(self):
+        self._alerts(2)
+        CustomUser.objects.filter(role="head_doctor").update(is_active=False)
+
+        stats = escalate_unacknowledged_alerts(now=timezone.now() + timedelta(minutes=15))
+
+        self.assertEqual(stats["skipped"], 2)
+        self.assertFalse(VitalAlert.objects.filter(status="escalated").exists())
+        self.assertFalse(Message.objects.exists())
+
+
+class OnCallRosterTest(TestCase):
+    def setUp(self):
+        oncall_roster.clear()
+        self.hospital = Hospital.objects.create(name="General", slug="general")
+        other = Hospital.objects.create(name="Annex", slug="annex")
+        CustomUser.objects.create_user(username="elsewhere", password="x", hospital=other, role="head_doctor")
+        self.standing = CustomUser.objects.create_user(
+            username="standing", password="x", hospital=self.hospital, role="head_doctor"
+        )
+        self.night = CustomUser.objects.create_user(username="night", password="x", hospital=self.hospital, role="doctor")
+        self.cover = CustomUser.objects.create_user(username="cover", password="x", hospital=self.hospital, role="doctor")
+        self.midnight = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+    def _shift(self, user, starts, ends):
+        return OnCallShift.objects.create(
+            hospital=self.hospital, user=user, role="head_doctor",
+            starts_at=self.midnight + timedelta(hours=starts), ends_at=self.midnight + timedelta(hours=ends),
+        )
+
+    def _on_call(self, hour):
+        version = Hospital.objects.get(pk=self.hospital.pk).roster_version
+        return oncall_roster.on_call(self.hospital.id, "head_doctor", version, self.midnight + timedelta(hours=hour))
+
+    def test_latest_overlapping_shift_is_on_call(self):
+        self._shift(self.night, -4, 8)
+        self._shift(self.cover, 0, 2)
+
+        self.assertEqual(self._on_call(-1), self.night)
+        self.assertEqual(self._on_call(1), self.cover)
+        self.assertEqual(self._on_call(3), self.night)
+        # Outside every shift: the hospital's own head doctor, never another hospital's
+        self.assertEqual(self._on_call(9), self.standing)
+
+    def test_warm_lookups_skip_the_database_until_the_roster_changes(self):
+        self._shift(self.night, 0, 8)
+        version = Hospital.objects.get(pk=self.hospital.pk).roster_version
+        oncall_roster.on_call(self.hospital.id, "head_doctor", version, self.midnight)
+
+        with self.assertNumQueries(0):
+            user = oncall_roster.on_call(self.hospital.id, "head_doctor", version, self.midnight + timedelta(hours=1))
+        self.assertEqual(user, self.night)
+
+        # Logins leave the version alone; shift and staff changes bump it
+        self.night.save(update_fields=["last_login"])
+        self.assertEqual(Hospital.objects.get(pk=self.hospital.pk).roster_version, version)
+        self.night.is_active = False
+        self.night.save()
+        self.assertEqual(self._on_call(1), self.standing)
+
+    def test_build_timeline_merges_and_closes_gaps(self):
+        t = [self.midnight + timedelta(hours=h) for h in range(6)]
+        boundaries, users = build_timeline([(t[0], t[2], 1, "a"), (t[1], t[2], 2, "a"), (t[3], t[4], 3, "b")])
+
+        self.assertEqual(boundaries, [t[0], t[2], t[3], t[4]])
+        self.assertEqual(users, ["a", None, "b", None])
+
+
+class DoctorSLAMetricsTest(TestCase):
+    def setUp(self):
+        self.hospital = Hospital.objects.create(name="General", slug="general", sla_doctor_ack_minutes=5)
+        self.admin = CustomUser.objects.create_user(
+            username="admin", password="pass", hospital=self.hospital, role="admin"
+        )
+        self.fast = CustomUser.objects.create_user(username="fast", password="x", hospital=self.hospital, role="doctor")
+        self.slow = CustomUser.objects.create_user(username="slow", password="x", hospital=self.hospital, role="doctor")
+        self.idle = CustomUser.objects.create_user(username="idle", password="x", hospital=self.hospital, role="doctor")
+        patient = Patient.objects.create(
+            hospital=self.hospital, full_name="Ada Obi", date_of_birth="1990-01-01", phone_number="0800"
+        )
+        vital = VitalSign.objects.create(patient=patient, spo2=80)
+
+        # (doctor, minutes to acknowledge or None, escalation level)
+        for doctor, minutes, level in [
+            (self.fast, 2, 0), (self.fast, 4, 0), (self.fast, None, 0),
+            (self.slow, 3, 0), (self.slow, 20, 1), (self.slow, 40, 2),
+        ]:
+            alert = VitalAlert.objects.create(
+                patient=patient, vital=vital, doctor=doctor, message="Critical", escalation_level=level
+            )
+            if minutes is not None:
+                VitalAlert.objects.filter(pk=alert.pk).update(
+                    acknowledged_at=alert.created_at + timedelta(minutes=minutes)
+                )
+
+    def test_hospital_metrics_take_one_query(self):
+        with self.assertNumQueries(1):
+            rows = {row.doctor.username: row for row in doctor_sla_metrics(self.hospital)}
+
+        fast, slow, idle = rows["fast"], rows["slow"], rows["idle"]
+        self.assertEqual((fast.total_alerts, fast.acknowledged, fast.within_sla, fast.escalations), (3, 2, 2, 0))
+        self.assertEqual((fast.sla_compliance, fast.avg_ack_time, fast.risk), (100, "3m", "green"))
+        self.assertEqual((slow.total_alerts, slow.within_sla, slow.escalations), (3, 1, 2))
+        self.assertEqual((slow.sla_compliance, slow.avg_ack_time, slow.risk), (33, "21m", "red"))
+        self.assertEqual((idle.total_alerts, idle.sla_compliance, idle.avg_ack_time), (0, 0, "0m"))
+
+        self.assertEqual(doctor_sla_metrics(self.slow), rows["slow"])
+
+    def test_dashboard_and_scorecard_render(self):
+        self.client.force_login(self.admin)
+
+        response = self.client.get("/app/sla/doctors/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["doctors"]), 3)
 
-# Create your tests here.
+        response = self.client.get(f"/app/doctors/{self.slow.id}/sla/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["grade"], "D")
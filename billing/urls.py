@@ -17,6 +17,7 @@ urlpatterns = [
     path('patients/<int:patient_id>/emr/', views.patient_emr, name='patient_emr'),
     path('patients/<int:patient_id>/lab/add/', views.add_lab_report, name='add_lab_report'),
     path("patients/<int:patient_id>/emr/print/", views.export_emr_pdf, name="export_emr_pdf"),    
+    path("patients/<int:patient_id>/emr/pdf-job/", views.submit_emr_pdf_job, name="submit_emr_pdf_job"),
     path("emr/template/<str:key>/", views.load_note_template, name="load_note_template"),
     path("emr/<int:patient_id>/add-note/", views.add_emr_note, name="add_emr_note"),
 
@@ -106,6 +107,22 @@ urlpatterns = [
         views.nhis_claims_dashboard,
         name="nhis_claims_dashboard",
     ),
+    path("accountant/aging/", views.receivables_aging, name="receivables_aging"),
+    path(
+        "accountant/claims/batches/create/",
+        views.create_claim_batches_view,
+        name="create_claim_batches",
+    ),
+    path(
+        "accountant/claims/batches/<int:batch_id>/",
+        views.claim_batch_detail,
+        name="claim_batch_detail",
+    ),
+    path(
+        "accountant/claims/batches/<int:batch_id>/file/",
+        views.claim_batch_file,
+        name="claim_batch_file",
+    ),
 
 
     # Appointments
@@ -119,9 +136,22 @@ urlpatterns = [
     path('bills/<int:bill_id>/invoice/', views.view_invoice, name='view_invoice'),
     path('bills/<int:bill_id>/invoice/pdf/', views.download_invoice_pdf, name='download_invoice_pdf'),
     path('bills/<int:bill_id>/payment/', views.record_payment, name='record_payment'),
+    path('api/bills/', views.create_bill_api, name='create_bill_api'),
+    path('api/services/catalog/', views.service_catalog, name='service_catalog'),
+    path('api/payments/bank-statement/', views.import_bank_statement, name='import_bank_statement'),
+    path('api/coverage-cache/stats/', views.coverage_cache_stats, name='coverage_cache_stats'),
+    path('api/coverage/simulate/', views.simulate_coverage_view, name='simulate_coverage'),
+    path('bills/<int:bill_id>/invoice/pdf-job/', views.submit_invoice_pdf_job, name='submit_invoice_pdf_job'),
+    path('bills/export/invoices.zip', views.export_invoices_zip, name='export_invoices_zip'),
+
+    # Background PDF jobs
+    path('api/pdf-jobs/metrics/', views.pdf_job_metrics, name='pdf_job_metrics'),
+    path('api/pdf-jobs/<str:job_id>/', views.pdf_job_status, name='pdf_job_status'),
+    path('api/pdf-jobs/<str:job_id>/download/', views.pdf_job_download, name='pdf_job_download'),
 
     # Reports
     path('reports/income/', views.income_report, name='income_report'),
+    path('reports/income/export/', views.export_income, name='export_income'),
     path('audit-logs/', views.audit_logs, name='audit_logs'),
 
     # Messaging
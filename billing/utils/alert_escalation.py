@@ -1,55 +1,112 @@
-from django.utils import timezone
-from django.conf import settings
+import time
 from datetime import timedelta
 
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
 from billing.models import VitalAlert
+from billing.services.oncall import oncall_roster
 from messaging.models import Message
-from django.contrib.auth import get_user_model
+from messaging.signals import notify_unread_counts
 
-User = get_user_model()
+MESSAGE_BATCH_SIZE = 500
+UPDATE_CHUNK_SIZE = 1000
 
 
-def get_escalation_target(alert, role):
-    return (
-        User.objects.filter(
-            role=role,
-            hospital=alert.patient.hospital,
-            is_active=True,
-        ).first()
-    )
+def get_escalation_target(alert, role, at=None):
+    """The user on call for `role` at the alert's hospital (see billing.services.oncall)."""
+    hospital = alert.patient.hospital
+    return oncall_roster.on_call(hospital.id, role, hospital.roster_version, at)
+
 
+def escalation_message(target, full_name, message, level):
+    return Message(
+        sender=None,
+        recipient=target,
+        subject="🚨 ESCALATED CRITICAL VITAL ALERT",
+        body=(
+            f"Patient: {full_name}\n"
+            f"Severity: CRITICAL\n"
+            f"Escalation Level: {level}\n\n"
+            f"{message}"
+        ),
+    )
 
-def escalate_unacknowledged_alerts():
-    now = timezone.now()
 
-    for level, rule in settings.VITAL_ALERT_ESCALATION_RULES.items():
-        threshold = now - timedelta(minutes=rule["minutes"])
+def escalate_level(level, rule, now):
+    """Escalate every alert due for `level`; returns (processed, escalated).
 
-        alerts = VitalAlert.objects.filter(
+    Alerts are read as plain rows, targets resolved from the on-call roster
+    once per hospital (no query once it is warm), the messages written with
+    one bulk INSERT and the alerts moved with one UPDATE per chunk of ids,
+    so the query count does not grow with the number of alerts. Unread
+    counts are pushed once per recipient after commit.
+    """
+    rows = list(
+        VitalAlert.objects.filter(
             status__in=["open", "escalated"],
             escalation_level__lt=level,
-            created_at__lte=threshold,
-        ).select_related("patient")
-
-        for alert in alerts:
-            target = get_escalation_target(alert, rule["role"])
-            if not target:
-                continue
-
-            Message.objects.create(
-                sender=None,
-                recipient=target,
-                subject="🚨 ESCALATED CRITICAL VITAL ALERT",
-                body=(
-                    f"Patient: {alert.patient.full_name}\n"
-                    f"Severity: CRITICAL\n"
-                    f"Escalation Level: {level}\n\n"
-                    f"{alert.message}"
-                ),
+            created_at__lte=now - timedelta(minutes=rule["minutes"]),
+        ).values_list(
+            "id", "patient__hospital_id", "patient__hospital__roster_version", "patient__full_name", "message"
+        )
+    )
+    if not rows:
+        return 0, 0
+
+    versions = {hospital_id: version for _, hospital_id, version, _, _ in rows}
+    targets = oncall_roster.on_call_many(versions, rule["role"], now)
+
+    alert_ids, messages = [], []
+    for alert_id, hospital_id, _, full_name, message in rows:
+        target = targets.get(hospital_id)
+        if target is None:
+            continue
+        alert_ids.append(alert_id)
+        messages.append(escalation_message(target, full_name, message, level))
+
+    if not alert_ids:
+        return len(rows), 0
+
+    with transaction.atomic():
+        Message.objects.bulk_create(messages, batch_size=MESSAGE_BATCH_SIZE)
+        # update() skips auto_now, and the SLA scheduler follows updated_at
+        for start in range(0, len(alert_ids), UPDATE_CHUNK_SIZE):
+            VitalAlert.objects.filter(id__in=alert_ids[start:start + UPDATE_CHUNK_SIZE]).update(
+                escalation_level=level,
+                escalated_to=rule["role"],
+                escalated_at=now,
+                escalated=True,
+                status="escalated",
+                updated_at=now,
             )
+        recipient_ids = {message.recipient_id for message in messages}
+        transaction.on_commit(lambda: notify_unread_counts(recipient_ids))
+
+    return len(rows), len(alert_ids)
+
+
+def escalate_unacknowledged_alerts(now=None):
+    """Run every escalation rule in level order; returns run statistics.
+
+    Levels run one after the other, so an alert old enough for several
+    levels climbs through all of them in one run, as before.
+    """
+    now = now or timezone.now()
+    started = time.perf_counter()
+
+    processed = escalated = 0
+    for level, rule in sorted(settings.VITAL_ALERT_ESCALATION_RULES.items()):
+        level_processed, level_escalated = escalate_level(level, rule, now)
+        processed += level_processed
+        escalated += level_escalated
 
-            alert.escalation_level = level
-            alert.escalated_to = rule["role"]
-            alert.escalated_at = now
-            alert.status = "escalated"
-            alert.save()
+    seconds = time.perf_counter() - started
+    return {
+        "processed": processed,
+        "escalated": escalated,
+        "skipped": processed - escalated,
+        "seconds": round(seconds, 3),
+        "per_second": round(processed / seconds, 1) if seconds else 0.0,
+    }
@@ -1,26 +1,37 @@
-from decimal import Decimal
-from billing.models import PatientCoverage
-from billing.models import ThirdPartyPayer
 from decimal import Decimal as D
 
+from billing.services.coverage import resolve_coverage
+
+CENT = D("0.01")
+
+
+def split_amount(total_amount, patient_percentage, government_percentage):
+    """Return (patient_payable, third_party_payable) for a total, rounded to the cent."""
+    total_amount = D(total_amount)
+    patient_payable = (total_amount * D(patient_percentage)) / D("100")
+    third_party_payable = (total_amount * D(government_percentage)) / D("100")
+    return patient_payable.quantize(CENT), third_party_payable.quantize(CENT)
+
 
 def calculate_bill_split(patient, total_amount):
-    """Return (patient_payable, third_party_payable, payer_instance) using coverage percentages."""
+    """Return (patient_payable, third_party_payable, third_party) using coverage percentages.
+
+    `third_party` is the ThirdPartyPayer mapped from the coverage payer code
+    (or None), ready to assign to `Bill.third_party`. Coverage comes from the
+    resolver cache, so repeated pricing for a patient does not hit the DB.
+    """
     total_amount = D(total_amount)
 
-    coverage = (
-        PatientCoverage.objects.filter(patient=patient, active=True)
-        .select_related("payer")
-        .first()
-    )
+    coverage = resolve_coverage(patient)
 
     if not coverage:
         return total_amount, D("0.00"), None
 
-    patient_payable = (total_amount * D(coverage.patient_percentage)) / D("100")
-    third_party_payable = (total_amount * D(coverage.government_percentage)) / D("100")
+    patient_payable, third_party_payable = split_amount(
+        total_amount, coverage.patient_percentage, coverage.government_percentage
+    )
 
-    return patient_payable, third_party_payable, coverage.payer
+    return patient_payable, third_party_payable, coverage.third_party
 
 
 def apply_coverage_to_bill(bill):
@@ -30,11 +41,7 @@ def apply_coverage_to_bill(bill):
     coverage.payer.code to a `ThirdPartyPayer` and assigns it to
     `bill.third_party`. Also sets `is_fully_paid` when patient_payable is zero.
     """
-    coverage = (
-        PatientCoverage.objects.filter(patient=bill.patient, active=True)
-        .select_related("payer")
-        .first()
-    )
+    coverage = resolve_coverage(bill.patient_id)
 
     if not coverage:
         bill.patient_payable = bill.total_amount
@@ -44,16 +51,11 @@ def apply_coverage_to_bill(bill):
         bill.save()
         return
 
-    bill.patient_payable = (D(bill.total_amount) * D(coverage.patient_percentage)) / D("100")
-    bill.third_party_payable = (D(bill.total_amount) * D(coverage.government_percentage)) / D("100")
-
-    # Map Payer -> ThirdPartyPayer by code if possible
-    mapped = None
-    payer_code = getattr(coverage.payer, "code", None)
-    if payer_code:
-        mapped = ThirdPartyPayer.objects.filter(code=payer_code).first()
+    bill.patient_payable, bill.third_party_payable = split_amount(
+        bill.total_amount, coverage.patient_percentage, coverage.government_percentage
+    )
 
-    bill.third_party = mapped
+    bill.third_party = coverage.third_party
 
     # mark fully paid for bills where patient owes nothing
     bill.is_fully_paid = (bill.patient_payable == D("0.00"))
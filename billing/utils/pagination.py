@@ -0,0 +1,43 @@
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(obj, field="created_at"):
+    raw = json.dumps([getattr(obj, field).isoformat(), obj.pk])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return (timestamp, pk) from a cursor string, or None if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        stamp, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        stamp = parse_datetime(stamp)
+        if stamp is None:
+            return None
+        return stamp, int(pk)
+    except (ValueError, TypeError):
+        return None
+
+
+def keyset_page(queryset, cursor=None, page_size=50, field="created_at"):
+    """Return (items, next_cursor) for a newest-first page ordered by (field, pk).
+
+    Pages seek past the previous page's last row instead of using OFFSET, so
+    page N costs the same as page 1 when (field, pk) is indexed.
+    """
+    queryset = queryset.order_by(f"-{field}", "-pk")
+
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        stamp, pk = position
+        queryset = queryset.filter(
+            Q(**{f"{field}__lt": stamp}) | Q(**{field: stamp, "pk__lt": pk})
+        )
+
+    items = list(queryset[:page_size + 1])
+    next_cursor = encode_cursor(items[page_size - 1], field) if len(items) > page_size else None
+    return items[:page_size], next_cursor
@@ -1,75 +1,104 @@
-from django.db.models import Avg, F, DurationField, ExpressionWrapper
+from dataclasses import dataclass
 from datetime import timedelta
-from billing.models import VitalAlert, CustomUser, Hospital
+
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Q
+
+from billing.models import CustomUser, Hospital
+
+# Used for doctors without a hospital
+DEFAULT_SLA_MINUTES = 15
+
+
+@dataclass(frozen=True, slots=True)
+class DoctorSLAMetrics:
+    """One doctor's alert SLA figures, as read by the dashboards and scorecard."""
+
+    doctor: CustomUser
+    total_alerts: int
+    acknowledged: int
+    within_sla: int
+    avg_ack: timedelta | None
+    escalations: int
+
+    @property
+    def avg_ack_time(self):
+        if not self.avg_ack:
+            return "0m"
+        return f"{int(self.avg_ack.total_seconds()) // 60}m"
+
+    @property
+    def sla_compliance(self):
+        if not self.acknowledged:
+            return 0
+        return int((self.within_sla / self.acknowledged) * 100)
+
+    @property
+    def risk(self):
+        compliance = self.sla_compliance
+        if compliance < 60:
+            return "red"
+        if compliance < 85:
+            return "amber"
+        return "green"
+
+
+def metric_rows(doctors, sla_minutes):
+    """DoctorSLAMetrics for every doctor in `doctors`, in one GROUP BY query.
+
+    An alert is within SLA when it was acknowledged no more than
+    `sla_minutes` after it was raised.
+    """
+    acknowledged = Q(vital_alerts__acknowledged_at__isnull=False)
+    rows = doctors.annotate(
+        total_alerts=Count("vital_alerts"),
+        acknowledged=Count("vital_alerts", filter=acknowledged),
+        within_sla=Count(
+            "vital_alerts",
+            filter=Q(
+                vital_alerts__acknowledged_at__lte=F("vital_alerts__created_at") + timedelta(minutes=sla_minutes)
+            ),
+        ),
+        avg_ack=Avg(
+            ExpressionWrapper(
+                F("vital_alerts__acknowledged_at") - F("vital_alerts__created_at"),
+                output_field=DurationField(),
+            ),
+            filter=acknowledged,
+        ),
+        escalations=Count("vital_alerts", filter=Q(vital_alerts__escalation_level__gt=0)),
+    ).order_by("id")
+
+    return [
+        DoctorSLAMetrics(
+            doctor=doctor,
+            total_alerts=doctor.total_alerts,
+            acknowledged=doctor.acknowledged,
+            within_sla=doctor.within_sla,
+            avg_ack=doctor.avg_ack,
+            escalations=doctor.escalations,
+        )
+        for doctor in rows
+    ]
+
 
 def doctor_sla_metrics(target, hospital=None):
     """
     Calculates SLA metrics.
-    If target is a Hospital, returns a list of metrics for all doctors in that hospital.
-    If target is a Doctor (User), returns a dict of metrics for that specific doctor.
+    If target is a Hospital, returns DoctorSLAMetrics rows for all doctors in that hospital.
+    If target is a Doctor (User), returns the DoctorSLAMetrics of that specific doctor.
     """
-    # Case 1: Target is Hospital -> Return list for all doctors
+    # Case 1: Target is Hospital -> one query for every doctor
     if isinstance(target, Hospital):
         doctors = CustomUser.objects.filter(hospital=target, role="doctor")
-        results = []
-        for doc in doctors:
-            metrics = calculate_metrics(doc)
-            metrics['doctor'] = doc
-            results.append(metrics)
-        return results
-    
-    # Case 2: Target is Doctor -> Return single dict
+        return metric_rows(doctors, target.sla_doctor_ack_minutes)
+
+    # Case 2: Target is Doctor -> the same query, for one doctor
     elif isinstance(target, CustomUser):
         return calculate_metrics(target)
-    
-    return {}
+
+    return None
+
 
 def calculate_metrics(doctor):
-    alerts = VitalAlert.objects.filter(assigned_doctor=doctor)
-    total = alerts.count()
-    
-    # Acknowledged alerts
-    acked = alerts.filter(acknowledged_at__isnull=False)
-    
-    # Avg Ack Time
-    avg_ack = acked.annotate(
-        duration=ExpressionWrapper(F('acknowledged_at') - F('created_at'), output_field=DurationField())
-    ).aggregate(avg=Avg('duration'))['avg']
-    
-    # Format avg_ack
-    avg_ack_str = "0m"
-    if avg_ack:
-        total_seconds = int(avg_ack.total_seconds())
-        minutes = total_seconds // 60
-        avg_ack_str = f"{minutes}m"
-
-    # SLA Compliance Calculation
-    sla_minutes = 15 # Default fallback
-    if doctor.hospital and hasattr(doctor.hospital, 'sla_doctor_ack_minutes'):
-        sla_minutes = doctor.hospital.sla_doctor_ack_minutes
-        
-    within_sla = 0
-    for a in acked:
-        limit = a.created_at + timedelta(minutes=sla_minutes)
-        if a.acknowledged_at <= limit:
-            within_sla += 1
-            
-    compliance = 0
-    if acked.exists():
-        compliance = int((within_sla / acked.count()) * 100)
-        
-    # Escalations (assuming escalation_level > 0 means escalated)
-    escalations = alerts.filter(escalation_level__gt=0).count()
-    
-    # Risk Assessment
-    risk = "green"
-    if compliance < 85: risk = "amber"
-    if compliance < 60: risk = "red"
-        
-    return {
-        "total_alerts": total,
-        "avg_ack_time": avg_ack_str,
-        "sla_compliance": compliance,
-        "escalations": escalations,
-        "risk": risk
-    }
\ No newline at end of file
+    sla_minutes = doctor.hospital.sla_doctor_ack_minutes if doctor.hospital else DEFAULT_SLA_MINUTES
+    return metric_rows(CustomUser.objects.filter(pk=doctor.pk), sla_minutes)[0]
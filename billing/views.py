@@ -1,18 +1,27 @@
-from io import BytesIO
+from decimal import InvalidOperation
 from django.contrib import messages
 from django.contrib.auth import get_user_model, login
 from django.contrib.auth.decorators import login_required
 from django.db.models import Sum, Q, Max
 from django.db.models.functions import TruncMonth
-from django.http import HttpResponse, HttpResponseForbidden
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseForbidden,
+    HttpResponseNotModified,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.utils import timezone
 from django.shortcuts import render, redirect, get_object_or_404
-from django.template.loader import get_template
+from django.urls import reverse
+from django.utils.dateparse import parse_date
 from .models import MedicineCategory
 from billing.utils.vitals import evaluate_vitals
 import json
-from xhtml2pdf import pisa
-from datetime import timedelta
+from datetime import datetime, time, timedelta
+from functools import wraps
 
 from .forms import (
     BillItemForm,
@@ -45,10 +54,41 @@ from .models import (
     PatientCoverage,
     ThirdPartyPayer,
     Payer,
+    ClaimBatch,
 )
 from billing.utils.sla import sla_remaining_time, sla_timer_state
 from billing.utils.audit import log_action
 from billing.utils.billing import calculate_bill_split
+from billing.utils.pagination import keyset_page
+from billing.services.aging import aging_chart, aging_totals, bucket_fields, cached_aging
+from billing.services.bank_reconciliation import StatementFormatError, import_statement
+from billing.services.bill_builder import build_bill
+from billing.services.catalog import catalog_etag, catalog_json, catalog_version
+from billing.services.tariffs import payer_prices
+from billing.services.claim_files import writer_for
+from billing.services.claims import (
+    ClaimTransitionError,
+    claim_totals,
+    create_claim_batches,
+    reject_batch,
+    release_batch,
+    settle_batch,
+    submit_batch,
+)
+from billing.services.coverage import coverage_resolver, resolve_coverage
+from billing.services.coverage_simulation import CoverageScenario, ScenarioError, simulate_coverage
+from billing.services.payments import post_payment
+from billing.services.revenue import monthly_revenue, total_revenue
+from billing.services.invoice_pdf import (
+    invoice_html,
+    invoice_pdf_cache,
+    invoice_version,
+    open_invoice_pdf,
+)
+from billing.services.income_export import export_payments, iter_payments_csv, iter_payments_ndjson
+from billing.services.invoice_export import ExportBusy, export_bills, limited_invoice_zip
+from billing.services.pdf_jobs import PDFQueueFull, pdf_jobs
+from billing.services.pdf_render import PDFRenderError, html_to_pdf_weasyprint
 
 from messaging.forms import MessageForm
 from messaging.models import Message
@@ -72,16 +112,11 @@ def dashboard(request):
     if hasattr(user, 'hospital') and user.hospital:
         hospital_filter = {"hospital": user.hospital}
 
-    # Income trend (monthly totals)
-    income_by_month = (
-        Payment.objects.annotate(month=TruncMonth("paid_on"))
-        .values("month")
-        .annotate(total=Sum("amount_paid"))
-        .order_by("month")
-    )
+    # Income trend (monthly totals from the daily revenue rollup)
+    income_by_month = monthly_revenue(hospital_filter.get("hospital"))
 
-    labels = [entry["month"].strftime("%b %Y") for entry in income_by_month]
-    data = [entry["total"] for entry in income_by_month]
+    labels = [month.strftime("%b %Y") for month, _ in income_by_month]
+    data = [total for _, total in income_by_month]
 
     # Unread messages
     unread_count = Message.objects.filter(recipient=user, is_read=False).count()
@@ -93,7 +128,7 @@ def dashboard(request):
         "patient_count": Patient.objects.filter(**hospital_filter).count(),
         "appointment_count": Appointment.objects.filter(**hospital_filter).count(),
         "bill_count": Bill.objects.filter(**hospital_filter).count(),
-        "total_income": Payment.objects.aggregate(total=Sum("amount_paid"))["total"] or 0,
+        "total_income": total_revenue(hospital_filter.get("hospital")),
         "unread_count": unread_count,
     }
 
@@ -288,11 +323,131 @@ def create_appointment(request):
 # BILLING & PAYMENTS
 # =======================================================
 
+BILL_LIST_PAGE_SIZE = 50
+
+
+class InvalidDateParam(ValueError):
+    pass
+
+
+def date_param(params, name):
+    """``params[name]`` as a date, or None when it is missing or blank.
+
+    Raises InvalidDateParam for anything else: a malformed string, an
+    impossible date such as 2024-02-30, or a non-string JSON value.
+    """
+    value = params.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        parsed = parse_date(value)
+    except (TypeError, ValueError):
+        parsed = None
+    if parsed is None:
+        raise InvalidDateParam(f"{name} must be a YYYY-MM-DD date")
+    return parsed
+
+
+def invalid_dates_are_400(view):
+    """Answer InvalidDateParam raised by `view` with a 400 instead of a 500."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except InvalidDateParam as exc:
+            if request.content_type == "application/json" or request.GET.get("format") == "json":
+                return JsonResponse({"error": str(exc)}, status=400)
+            return HttpResponse(str(exc), status=400)
+    return wrapper
+
+
+def filter_bills(bills, params):
+    """Apply the bill list's query-string filters (claim status, paid, payer, date range)."""
+    claim_status = params.get("claim_status")
+    if claim_status in dict(Bill.CLAIM_STATUS):
+        bills = bills.filter(claim_status=claim_status)
+
+    paid = params.get("is_fully_paid", "").lower()
+    if paid in ("1", "true", "yes"):
+        bills = bills.filter(is_fully_paid=True)
+    elif paid in ("0", "false", "no"):
+        bills = bills.filter(is_fully_paid=False)
+
+    third_party = params.get("third_party")
+    if third_party == "none":
+        bills = bills.filter(third_party__isnull=True)
+    elif third_party and third_party.isdigit():
+        bills = bills.filter(third_party_id=third_party)
+
+    # Bound created_at by datetimes rather than __date so the range can use the index
+    since = date_param(params, "since")
+    if since:
+        bills = bills.filter(created_at__gte=timezone.make_aware(datetime.combine(since, time.min)))
+    until = date_param(params, "until")
+    if until:
+        bills = bills.filter(
+            created_at__lt=timezone.make_aware(datetime.combine(until + timedelta(days=1), time.min))
+        )
+
+    return bills
+
+
 @login_required
+@invalid_dates_are_400
 def bill_list(request):
     hospital = request.user.hospital
-    bills = Bill.objects.filter(hospital=hospital).select_related('patient').order_by('-created_at')
-    return render(request, "billing/bill_list.html", {"bills": bills})
+    bills = filter_bills(
+        Bill.objects.filter(hospital=hospital).select_related("patient", "third_party"),
+        request.GET,
+    )
+
+    try:
+        page_size = min(int(request.GET.get("limit", BILL_LIST_PAGE_SIZE)), 200)
+    except ValueError:
+        page_size = BILL_LIST_PAGE_SIZE
+
+    page, next_cursor = keyset_page(bills, request.GET.get("cursor"), max(page_size, 1))
+
+    if request.GET.get("format") == "json":
+        return JsonResponse({
+            "results": [
+                {
+                    "id": bill.id,
+                    "invoice_no": str(bill.invoice_no),
+                    "patient": bill.patient.full_name,
+                    "created_at": bill.created_at.isoformat(),
+                    "total_amount": str(bill.total_amount),
+                    "amount_paid": str(bill.amount_paid),
+                    "balance_due": str(bill.balance_due),
+                    "patient_payable": str(bill.patient_payable),
+                    "third_party_payable": str(bill.third_party_payable),
+                    "third_party": bill.third_party.code if bill.third_party else None,
+                    "claim_status": bill.claim_status,
+                    "is_fully_paid": bill.is_fully_paid,
+                }
+                for bill in page
+            ],
+            "next_cursor": next_cursor,
+        })
+
+    next_query = None
+    if next_cursor:
+        params = request.GET.copy()
+        params["cursor"] = next_cursor
+        next_query = params.urlencode()
+
+    filters = request.GET.copy()
+    filters.pop("cursor", None)
+
+    return render(request, "billing/bill_list.html", {
+        "bills": page,
+        "next_query": next_query,
+        "is_paged": "cursor" in request.GET,
+        "first_query": filters.urlencode(),
+        "filters": request.GET,
+        "claim_statuses": Bill.CLAIM_STATUS,
+        "third_parties": ThirdPartyPayer.objects.filter(active=True).order_by("name"),
+    })
 
 @login_required
 def create_bill_index(request):
@@ -302,106 +457,268 @@ def create_bill_index(request):
 @login_required
 def create_bill(request, patient_id):
     patient = get_object_or_404(Patient, id=patient_id)
-    services = Service.objects.filter(hospital=patient.hospital)
     # include patient coverage info in template context
-    coverage = getattr(patient, "patientcoverage", None)
+    coverage = resolve_coverage(patient)
 
     if request.method == "POST":
-        items_data, total = [], 0
         service_ids = request.POST.getlist("service")
         quantities = request.POST.getlist("quantity")
-
-        for i in range(len(service_ids)):
-            service = get_object_or_404(Service, id=service_ids[i])
-            qty = int(quantities[i])
-            subtotal = service.price * qty
-            total += subtotal
-            items_data.append({"service": service, "quantity": qty, "subtotal": subtotal})
-
-        patient_payable, third_party_payable, third_party = calculate_bill_split(patient, total)
-
-        bill = Bill.objects.create(
-            patient=patient,
-            total_amount=total,
-            created_by=request.user,
-            hospital=patient.hospital,
-            patient_payable=patient_payable,
-            third_party_payable=third_party_payable,
-            third_party=third_party,
-        )
-        log_action(request.user, "create", "Bill", bill.id, f"Created bill of ${total} for {patient}")
-
-        for item in items_data:
-            BillItem.objects.create(bill=bill, service=item["service"], quantity=item["quantity"], subtotal=item["subtotal"])
+        # zip() would silently drop the unmatched lines
+        if len(service_ids) != len(quantities):
+            return HttpResponse("Each service needs exactly one quantity", status=400)
+        lines = zip(service_ids, quantities)
+        try:
+            bill = build_bill(patient, lines, created_by=request.user)
+        except Service.DoesNotExist:
+            raise Http404("Service not found")
+        except ValueError:
+            messages.error(request, "Each line needs a valid service and a whole-number quantity of at least 1.")
+            return redirect("create_bill", patient_id=patient.id)
 
         return redirect("view_invoice", bill_id=bill.id)
 
+    # build_bill prices covered patients at their payer's tariff; the form
+    # shows the same prices in place of the catalog's Service.price
+    tariff_prices = {}
+    if coverage and coverage.third_party:
+        tariff_prices = {
+            str(service_id): str(price)
+            for service_id, price in payer_prices(
+                patient.hospital_id, coverage.third_party.id, catalog_version(patient.hospital_id)
+            ).items()
+        }
+
     return render(
         request,
         "billing/create_bill.html",
         {
             "patient": patient,
-            "services": services,
             "coverage": coverage,
+            "tariff_prices": tariff_prices,
         },
     )
 
 
+@login_required
+def service_catalog(request):
+    """Services as compact JSON for the bill form.
+
+    With ``?patient=<id>`` the catalog is the patient's hospital's, the
+    one build_bill resolves the lines against; otherwise the user's.
+    Versioned by Hospital.catalog_version: clients revalidate with
+    If-None-Match and get a 304 until a Service is written.
+    """
+    patient_id = request.GET.get("patient")
+    if patient_id:
+        if not patient_id.isdigit():
+            return JsonResponse({"error": "Invalid patient"}, status=400)
+        hospital_id = get_object_or_404(Patient, id=patient_id).hospital_id
+    else:
+        hospital_id = request.user.hospital_id
+    if hospital_id is None:
+        return JsonResponse({"error": "No hospital assigned"}, status=404)
+
+    version = catalog_version(hospital_id)
+    etag = catalog_etag(hospital_id, version)
+
+    if request.headers.get("If-None-Match") == etag:
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        return response
+
+    response = HttpResponse(catalog_json(hospital_id, version), content_type="application/json")
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+@login_required
+def create_bill_api(request):
+    """JSON batch endpoint for building a bill with any number of lines.
+
+    Expects ``{"patient": <id>, "items": [{"service": <id>, "quantity": <n>}, ...]}``.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "POST required"}, status=405)
+
+    try:
+        payload = json.loads(request.body)
+        patient_id = payload["patient"]
+        lines = [(item["service"], item.get("quantity", 1)) for item in payload["items"]]
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({"error": "Invalid payload"}, status=400)
+
+    if not lines:
+        return JsonResponse({"error": "At least one item is required"}, status=400)
+
+    patient = get_object_or_404(Patient, id=patient_id, hospital=request.user.hospital)
+
+    try:
+        bill = build_bill(patient, lines, created_by=request.user)
+    except Service.DoesNotExist as exc:
+        return JsonResponse({"error": str(exc)}, status=404)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+
+    return JsonResponse(
+        {
+            "id": bill.id,
+            "invoice_no": str(bill.invoice_no),
+            "total_amount": str(bill.total_amount),
+            "patient_payable": str(bill.patient_payable),
+            "third_party_payable": str(bill.third_party_payable),
+            "item_count": len(lines),
+        },
+        status=201,
+    )
+
+
+@login_required
+def coverage_cache_stats(request):
+    if not request.user.is_admin():
+        return HttpResponseForbidden("You are not authorized to view this page.")
+    return JsonResponse(coverage_resolver.stats())
+
+
+@login_required
+@invalid_dates_are_400
+def simulate_coverage_view(request):
+    """What-if coverage percentages over the hospital's bills; nothing is saved.
+
+    Expects ``{"scenarios": {"<payer code>": {"patient_percentage": <n>,
+    "government_percentage": <n>}}, "since": "YYYY-MM-DD", "until": "YYYY-MM-DD"}``.
+    """
+    if request.user.role not in ["admin", "accountant"]:
+        return HttpResponseForbidden("You are not authorized to view this page.")
+    # Never simulate over other hospitals' bills
+    if request.user.hospital is None:
+        return HttpResponseForbidden("No hospital assigned.")
+    if request.method != "POST":
+        return JsonResponse({"error": "POST required"}, status=405)
+
+    try:
+        payload = json.loads(request.body)
+        scenarios = [
+            CoverageScenario.parse(code, values["patient_percentage"], values.get("government_percentage"))
+            for code, values in payload["scenarios"].items()
+        ]
+    except ScenarioError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return JsonResponse({"error": "Invalid payload"}, status=400)
+
+    rows = simulate_coverage(
+        scenarios,
+        hospital=request.user.hospital,
+        since=date_param(payload, "since"),
+        until=date_param(payload, "until"),
+    )
+    return JsonResponse({"results": rows})
+
+
 @login_required
 def view_invoice(request, bill_id):
     bill = get_object_or_404(Bill, id=bill_id)
-    items = bill.items.all()
+    items = bill.items.select_related("service")
     payments = bill.payment_set.all()
-    paid = sum(p.amount_paid for p in payments)
-    due = bill.total_amount - paid
     return render(
         request,
         "billing/invoice.html",
-        {"bill": bill, "items": items, "payments": payments, "paid": paid, "due": due},
+        {"bill": bill, "items": items, "payments": payments, "paid": bill.amount_paid, "due": bill.balance_due},
     )
 
 
 @login_required
 def download_invoice_pdf(request, bill_id):
-    bill = get_object_or_404(Bill, id=bill_id)
-    items = bill.items.all()
-    payments = bill.payment_set.all()
-    paid = sum(p.amount_paid for p in payments)
-    due = bill.total_amount - paid
+    bill = get_object_or_404(Bill.objects.select_related("patient"), id=bill_id)
 
-    html = get_template("billing/invoice.html").render(
-        {"bill": bill, "items": items, "payments": payments, "paid": paid, "due": due}
-    )
-    buffer = BytesIO()
-    pisa_status = pisa.CreatePDF(html, dest=buffer, encoding="UTF-8")
-    buffer.seek(0)
+    # Revalidation needs only the version, never a render
+    version = invoice_version(bill)
+    etag = f'"{version}"'
+
+    if request.headers.get("If-None-Match") == etag:
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        return response
 
-    if pisa_status.err:
+    pdf_file = open_invoice_pdf(bill, version)
+    if pdf_file is None:
         return HttpResponse("PDF generation error", status=500)
 
-    response = HttpResponse(buffer, content_type="application/pdf")
-    response["Content-Disposition"] = f'attachment; filename="invoice_{bill.invoice_no}.pdf"'
+    response = FileResponse(
+        pdf_file,
+        as_attachment=True,
+        filename=f"invoice_{bill.invoice_no}.pdf",
+        content_type="application/pdf",
+    )
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+@login_required
+@invalid_dates_are_400
+def export_invoices_zip(request):
+    if request.user.role not in ["admin", "accountant"]:
+        return HttpResponseForbidden("You are not authorized to view this page.")
+    # Exports are always scoped to the user's hospital
+    if request.user.hospital is None:
+        return HttpResponseForbidden("No hospital assigned.")
+
+    since = date_param(request.GET, "since")
+    until = date_param(request.GET, "until")
+    if not since or not until:
+        return HttpResponse("since and until (YYYY-MM-DD) are required", status=400)
+
+    bills = export_bills(request.user.hospital, since, until, request.GET.get("payer") or None)
+
+    try:
+        stream = limited_invoice_zip(bills)
+    except ExportBusy as exc:
+        response = HttpResponse(str(exc), status=503)
+        response["Retry-After"] = "30"
+        return response
+
+    response = StreamingHttpResponse(stream, content_type="application/zip")
+    response["Content-Disposition"] = f'attachment; filename="invoices_{since}_{until}.zip"'
     return response
 
 
+@login_required
+def import_bank_statement(request):
+    if request.user.role not in ["admin", "accountant"]:
+        return HttpResponseForbidden("You are not authorized to view this page.")
+    if request.method != "POST" or "statement" not in request.FILES:
+        return JsonResponse({"error": "POST a bank statement CSV as 'statement'"}, status=400)
+
+    dry_run = request.POST.get("dry_run") in ("1", "true")
+    try:
+        result = import_statement(request.user.hospital, request.FILES["statement"], dry_run=dry_run)
+    except StatementFormatError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+
+    return JsonResponse({
+        "lines": result.lines,
+        "matched": result.matched,
+        "matched_total": str(result.matched_total),
+        "dry_run": result.dry_run,
+        "unmatched": result.unmatched_rows(),
+    })
+
+
 @login_required
 def record_payment(request, bill_id):
     bill = get_object_or_404(Bill, id=bill_id)
     if request.method == "POST":
         amount = request.POST.get("amount")
         payment_method = request.POST.get("payment_method")
-        Payment.objects.create(
-            bill=bill,
-            amount_paid=amount,
-            payment_mode=payment_method,
-            hospital=bill.hospital,
-        )
 
-        # Update bill status — only consider the patient's portion
-        total_paid = bill.payment_set.aggregate(total=Sum('amount_paid'))['total'] or 0
-        if total_paid >= bill.patient_payable:
-            bill.is_fully_paid = True
-            bill.save()
+        try:
+            # is_fully_paid only considers the patient's portion
+            post_payment(bill, amount, payment_method)
+        except (InvalidOperation, TypeError):
+            messages.error(request, "Enter a valid payment amount.")
+            return redirect("record_payment", bill_id=bill.id)
 
         messages.success(request, "Payment recorded successfully.")
         return redirect("view_invoice", bill_id=bill.id)
@@ -412,19 +729,30 @@ def record_payment(request, bill_id):
 # REPORTS & AUDIT LOGS
 # =======================================================
 
+RECENT_PAYMENTS_LIMIT = 100
+
+
 @login_required
 def income_report(request):
-    payments = Payment.objects.all().order_by("-paid_on")
-    total_income = payments.aggregate(total=Sum("amount_paid"))["total"] or 0
+    hospital = request.user.hospital
+    if hospital is None:
+        # total_revenue(None) would sum every hospital's revenue
+        return render(
+            request,
+            "billing/income_report.html",
+            {"payments": [], "total_income": 0, "labels": [], "data": []},
+        )
 
-    monthly_data = (
-        payments.annotate(month=TruncMonth("paid_on"))
-        .values("month")
-        .annotate(total=Sum("amount_paid"))
-        .order_by("month")
+    payments = (
+        Payment.objects.filter(hospital=hospital)
+        .select_related("bill__patient")
+        .order_by("-paid_on")[:RECENT_PAYMENTS_LIMIT]
     )
-    labels = [item["month"].strftime("%B %Y") for item in monthly_data]
-    data = [float(item["total"]) for item in monthly_data]
+    total_income = total_revenue(hospital)
+
+    monthly_data = monthly_revenue(hospital)
+    labels = [month.strftime("%B %Y") for month, _ in monthly_data]
+    data = [float(total) for _, total in monthly_data]
 
     return render(
         request,
@@ -433,6 +761,71 @@ def income_report(request):
     )
 
 
+INCOME_EXPORT_FORMATS = {
+    "csv": (iter_payments_csv, "text/csv"),
+    "ndjson": (iter_payments_ndjson, "application/x-ndjson"),
+}
+
+
+@login_required
+@invalid_dates_are_400
+def export_income(request):
+    if request.user.role not in ["admin", "accountant"]:
+        return HttpResponseForbidden("You are not authorized to view this page.")
+    # Exports are always scoped to the user's hospital
+    if request.user.hospital is None:
+        return HttpResponseForbidden("No hospital assigned.")
+
+    fmt = request.GET.get("format", "csv")
+    if fmt not in INCOME_EXPORT_FORMATS:
+        return HttpResponse("format must be csv or ndjson", status=400)
+
+    since = date_param(request.GET, "since")
+    until = date_param(request.GET, "until")
+    payment_mode = request.GET.get("payment_mode") or None
+    if payment_mode and payment_mode not in dict(Payment.PAYMENT_METHODS):
+        return HttpResponse("Unknown payment_mode", status=400)
+
+    rows = export_payments(request.user.hospital, since, until, payment_mode)
+    generate, content_type = INCOME_EXPORT_FORMATS[fmt]
+
+    response = StreamingHttpResponse(generate(rows), content_type=content_type)
+    response["Content-Disposition"] = (
+        f'attachment; filename="payments_{since or "start"}_{until or "today"}.{fmt}"'
+    )
+    return response
+
+
+@login_required
+def receivables_aging(request):
+    if request.user.role not in ["admin", "accountant"]:
+        return HttpResponseForbidden("You are not authorized to view this page.")
+
+    # A user without a hospital sees an empty report
+    hospital = request.user.hospital
+    rows = cached_aging(hospital) if hospital else []
+    totals = aging_totals(rows)
+
+    if request.GET.get("format") == "json":
+        return JsonResponse({
+            "as_of": timezone.localdate().isoformat(),
+            "rows": [
+                {
+                    "payer": row["third_party__code"],
+                    **{field: str(row[field]) for field in bucket_fields()},
+                }
+                for row in rows
+            ],
+            "totals": {field: str(value) for field, value in totals.items()},
+        })
+
+    return render(request, "billing/accountant/receivables_aging.html", {
+        "rows": rows,
+        "totals": totals,
+        "chart": aging_chart(hospital) if hospital else {"labels": [], "patient": [], "payer": [], "over_90": []},
+    })
+
+
 @login_required
 def audit_logs(request):
     if request.user.role not in ["admin", "accountant"]:
@@ -810,8 +1203,8 @@ def doctor_scorecard(request, doctor_id):
 
     metrics = doctor_sla_metrics(doctor, hospital)
     grade = performance_grade(
-        metrics["sla_compliance"],
-        metrics["escalations"]
+        metrics.sla_compliance,
+        metrics.escalations
     )
 
     return render(request, "billing/admin/doctor_scorecard.html", {
@@ -1189,54 +1582,135 @@ def dispense_prescription(request, prescription_id):
 
 from django.template.loader import render_to_string
 from django.http import HttpResponse
-import tempfile
+
+def render_emr_html(patient):
+    return render_to_string("billing/print_emr.html", {
+        "patient": patient,
+        "medical_records": MedicalRecord.objects.filter(patient=patient),
+        "lab_reports": LabReport.objects.filter(patient=patient),
+        "radiology_reports": RadiologyReport.objects.filter(patient=patient),
+        "prescriptions": Prescription.objects.filter(visit__patient=patient),
+        "vital_signs": VitalSign.objects.filter(patient=patient),
+    })
+
 
 @login_required
 def export_emr_pdf(request, patient_id):
     patient = get_object_or_404(Patient, id=patient_id)
 
-    medical_records = MedicalRecord.objects.filter(patient=patient)
-    lab_reports = LabReport.objects.filter(patient=patient)
-    radiology_reports = RadiologyReport.objects.filter(patient=patient)
-    prescriptions = Prescription.objects.filter(visit__patient=patient)
-    vital_signs = VitalSign.objects.filter(patient=patient)
+    # WeasyPrint first (may fail on systems without GTK/Pango libs), then xhtml2pdf
+    try:
+        pdf_data = html_to_pdf_weasyprint(render_emr_html(patient))
+    except PDFRenderError:
+        return HttpResponse("PDF generation error", status=500)
 
-    html_string = render_to_string("billing/print_emr.html", {
-        "patient": patient,
-        "medical_records": medical_records,
-        "lab_reports": lab_reports,
-        "radiology_reports": radiology_reports,
-        "prescriptions": prescriptions,
-        "vital_signs": vital_signs,
-    })
+    response = HttpResponse(pdf_data, content_type='application/pdf')
+    response['Content-Disposition'] = f'inline; filename="EMR_{patient.full_name}.pdf"'
+    return response
+
+
+# =======================================================
+# Background PDF jobs
+# =======================================================
 
-    pdf_data = None
-    # Try WeasyPrint first (may fail on systems without GTK/Pango libs)
+def _pdf_job_response(job_id, state, status=200):
+    payload = {
+        "job": job_id,
+        "status": state["status"],
+        "status_url": reverse("pdf_job_status", args=[job_id]),
+    }
+    if state["status"] == "done":
+        payload["download_url"] = reverse("pdf_job_download", args=[job_id])
+        payload["queue_wait"] = state.get("queue_wait")
+        payload["render_time"] = state.get("render_time")
+    elif state["status"] == "failed":
+        payload["error"] = state.get("error")
+    return JsonResponse(payload, status=status)
+
+
+def _submit_pdf_job(request, html, filename, **kwargs):
     try:
-        from weasyprint import HTML
+        job_id = pdf_jobs.submit(html, filename, owner_id=request.user.id, **kwargs)
+    except PDFQueueFull as exc:
+        response = JsonResponse({"error": str(exc)}, status=503)
+        response["Retry-After"] = "5"
+        return response
+    return _pdf_job_response(job_id, pdf_jobs.status(job_id), status=202)
 
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile(delete=True) as temp_pdf:
-            HTML(string=html_string).write_pdf(temp_pdf.name)
 
-            temp_pdf.seek(0)
-            pdf_data = temp_pdf.read()
-    except Exception:
-        # Fallback to xhtml2pdf (pisa) which is pure-Python
-        try:
-            from xhtml2pdf import pisa
-            buffer = BytesIO()
-            pisa_status = pisa.CreatePDF(html_string, dest=buffer, encoding="UTF-8")
-            if pisa_status.err:
-                return HttpResponse("PDF generation error", status=500)
-            buffer.seek(0)
-            pdf_data = buffer.getvalue()
-        except Exception:
-            return HttpResponse("PDF generation error: no PDF backend available", status=500)
+@login_required
+def submit_invoice_pdf_job(request, bill_id):
+    if request.method != "POST":
+        return JsonResponse({"error": "POST required"}, status=405)
 
-    response = HttpResponse(pdf_data, content_type='application/pdf')
-    response['Content-Disposition'] = f'inline; filename="EMR_{patient.full_name}.pdf"'
-    return response
+    bill = get_object_or_404(Bill.objects.select_related("patient"), id=bill_id)
+    version = invoice_version(bill)
+
+    if invoice_pdf_cache.get(bill.id, version):
+        return JsonResponse({
+            "status": "done",
+            "download_url": reverse("download_invoice_pdf", args=[bill.id]),
+        })
+
+    return _submit_pdf_job(
+        request,
+        invoice_html(bill),
+        f"invoice_{bill.invoice_no}.pdf",
+        on_done=lambda pdf: invoice_pdf_cache.put(bill.id, version, pdf),
+    )
+
+
+@login_required
+def submit_emr_pdf_job(request, patient_id):
+    if request.method != "POST":
+        return JsonResponse({"error": "POST required"}, status=405)
+
+    patient = get_object_or_404(Patient, id=patient_id)
+    return _submit_pdf_job(
+        request,
+        render_emr_html(patient),
+        f"EMR_{patient.full_name}.pdf",
+        engine="weasyprint",
+    )
+
+
+def _owned_pdf_job(request, job_id):
+    state = pdf_jobs.status(job_id)
+    if state is None or (state["owner_id"] != request.user.id and not request.user.is_admin()):
+        raise Http404("Unknown PDF job")
+    return state
+
+
+@login_required
+def pdf_job_status(request, job_id):
+    return _pdf_job_response(job_id, _owned_pdf_job(request, job_id))
+
+
+@login_required
+def pdf_job_download(request, job_id):
+    state = _owned_pdf_job(request, job_id)
+    if state["status"] != "done":
+        return _pdf_job_response(job_id, state, status=409)
+
+    try:
+        pdf_file = open(pdf_jobs.result_path(job_id), "rb")
+    except FileNotFoundError:
+        # Purged after the job finished
+        return JsonResponse({"job": job_id, "error": "The PDF is no longer available"}, status=410)
+
+    return FileResponse(
+        pdf_file,
+        as_attachment=True,
+        filename=state["filename"],
+        content_type="application/pdf",
+    )
+
+
+@login_required
+def pdf_job_metrics(request):
+    if not request.user.is_admin():
+        return HttpResponseForbidden("You are not authorized to view this page.")
+    return JsonResponse(pdf_jobs.metrics())
 
 
 # =======================================================
@@ -1294,7 +1768,10 @@ def receptionist_dashboard(request):
 
 @login_required
 def accountant_dashboard(request):
-    return render(request, "billing/dashboard_accountant.html")
+    context = {}
+    if request.user.hospital:
+        context["aging"] = aging_totals(cached_aging(request.user.hospital))
+    return render(request, "billing/dashboard_accountant.html", context)
 
 @login_required
 def radiologist_dashboard(request):
@@ -2107,29 +2584,115 @@ def patient_vitals_graphs(request, patient_id):
 # NHIS CLAIMS DASHBOARD
 # ------------------------------------------------------------------
 
-@login_required
-def nhis_claims_dashboard(request):
-    nhis = Payer.objects.filter(code="NHIS").first()
-    kschma = Payer.objects.filter(code="KSCHMA").first()
+CLAIM_ROLES = ["admin", "accountant"]
+CLAIM_BATCHES_SHOWN = 25
 
-    # Bills where the linked ThirdPartyPayer is a government scheme
-    government_bills = Bill.objects.filter(third_party__payer_type__in=["federal", "state"]) 
 
-    nhis_bills = government_bills.filter(patient__patientcoverage__payer=nhis)
-    kschma_bills = government_bills.filter(patient__patientcoverage__payer=kschma)
+@login_required
+def nhis_claims_dashboard(request):
+    if request.user.role not in CLAIM_ROLES:
+        return HttpResponseForbidden("You are not authorized to view this page.")
 
-    def bill_totals(qs):
-        return {
-            "total": qs.aggregate(t=Sum("third_party_payable"))["t"] or 0,
-            "paid": qs.filter(is_fully_paid=True).aggregate(p=Sum("third_party_payable"))["p"] or 0,
-            "unpaid": qs.filter(is_fully_paid=False).aggregate(u=Sum("third_party_payable"))["u"] or 0,
-        }
+    hospital = request.user.hospital
 
     context = {
-        "nhis": bill_totals(nhis_bills),
-        "kschma": bill_totals(kschma_bills),
-        "nhis_bills": nhis_bills.order_by("-created_at"),
-        "kschma_bills": kschma_bills.order_by("-created_at"),
+        # One conditional-aggregation query covers every government payer
+        "payer_totals": claim_totals(hospital),
+        "batches": ClaimBatch.objects.filter(hospital=hospital)
+        .select_related("third_party")[:CLAIM_BATCHES_SHOWN],
+        "third_parties": ThirdPartyPayer.objects.filter(active=True).order_by("name"),
     }
 
     return render(request, "billing/accountant/nhis_claims_dashboard.html", context)
+
+
+@login_required
+def create_claim_batches_view(request):
+    if request.user.role not in CLAIM_ROLES:
+        return HttpResponseForbidden("You are not authorized to view this page.")
+    if request.method != "POST":
+        return redirect("nhis_claims_dashboard")
+
+    third_party = None
+    if request.POST.get("third_party"):
+        third_party = get_object_or_404(ThirdPartyPayer, id=request.POST["third_party"])
+
+    try:
+        since = date_param(request.POST, "since")
+        until = date_param(request.POST, "until")
+    except InvalidDateParam as exc:
+        messages.error(request, str(exc))
+        return redirect("nhis_claims_dashboard")
+
+    batches = create_claim_batches(
+        request.user.hospital,
+        third_party=third_party,
+        since=since,
+        until=until,
+        created_by=request.user,
+    )
+
+    if batches:
+        bill_count = sum(batch.bill_count for batch in batches)
+        messages.success(request, f"Created {len(batches)} claim batch(es) covering {bill_count} bills.")
+    else:
+        messages.info(request, "No draft claims to batch.")
+    return redirect("nhis_claims_dashboard")
+
+
+@login_required
+def claim_batch_detail(request, batch_id):
+    if request.user.role not in CLAIM_ROLES:
+        return HttpResponseForbidden("You are not authorized to view this page.")
+
+    batch = get_object_or_404(
+        ClaimBatch.objects.select_related("third_party"), id=batch_id, hospital=request.user.hospital
+    )
+
+    if request.method == "POST":
+        action = request.POST.get("action")
+        try:
+            if action == "submit":
+                submit_batch(batch)
+            elif action == "settle":
+                rejected = request.POST.getlist("rejected")
+                if not all(bill_id.isdigit() for bill_id in rejected):
+                    return HttpResponse("Rejected bills must be bill ids", status=400)
+                settle_batch(batch, [int(bill_id) for bill_id in rejected])
+            elif action == "reject":
+                reject_batch(batch)
+            elif action == "release":
+                release_batch(batch)
+                messages.success(request, f"Batch {batch.reference} released.")
+                return redirect("nhis_claims_dashboard")
+            else:
+                return HttpResponse("Unknown action", status=400)
+        except ClaimTransitionError as exc:
+            messages.error(request, str(exc))
+        else:
+            messages.success(request, f"Batch {batch.reference} is now {batch.get_status_display().lower()}.")
+        return redirect("claim_batch_detail", batch_id=batch.id)
+
+    bills = batch.bills.select_related("patient").order_by("id")
+    return render(request, "billing/accountant/claim_batch_detail.html", {"batch": batch, "bills": bills})
+
+
+@login_required
+def claim_batch_file(request, batch_id):
+    if request.user.role not in CLAIM_ROLES:
+        return HttpResponseForbidden("You are not authorized to view this page.")
+
+    batch = get_object_or_404(
+        ClaimBatch.objects.select_related("third_party", "hospital"),
+        id=batch_id,
+        hospital=request.user.hospital,
+    )
+    try:
+        writer = writer_for(batch, request.GET.get("format") or None)
+        writer.validate()
+    except ValueError as exc:
+        return HttpResponse(str(exc), status=400)
+
+    response = StreamingHttpResponse(writer.stream(), content_type=writer.content_type)
+    response["Content-Disposition"] = f'attachment; filename="{writer.filename}"'
+    return response
@@ -1,22 +1,33 @@
 # messaging/signals.py
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
+from django.db.models import Count
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from .models import Message
 
+
+def notify_unread_counts(recipient_ids):
+    """Push the unread count to each recipient's group; one COUNT query for all."""
+    counts = dict(
+        Message.objects.filter(recipient_id__in=recipient_ids, is_read=False)
+        .values_list("recipient_id")
+        .annotate(unread=Count("id"))
+        .order_by()
+    )
+    layer = get_channel_layer()
+    for recipient_id in recipient_ids:
+        async_to_sync(layer.group_send)(
+            f"user_{recipient_id}",
+            {
+                "type": "new_message",   # <— matches JS check
+                "count": counts.get(recipient_id, 0),
+            },
+        )
+
+
 @receiver(post_save, sender=Message)
 def notify_new_message(sender, instance, created, **kwargs):
     if not created:
         return
-    layer = get_channel_layer()
-    group = f"user_{instance.recipient_id}"
-    async_to_sync(layer.group_send)(
-        group,
-        {
-            "type": "new_message",   # <— matches JS check
-            "count": Message.objects.filter(
-                recipient=instance.recipient, is_read=False
-            ).count(),
-        },
-    )
+    notify_unread_counts([instance.recipient_id])
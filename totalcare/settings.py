@@ -145,4 +145,80 @@ LOGGING = {
 VITAL_ALERT_ESCALATION_RULES = {
     1: {"minutes": 10, "role": "head_doctor"},
     2: {"minutes": 20, "role": "admin"},
-}
\ No newline at end of file
+}
+
+# Patient coverage resolver: in-process LRU, optionally backed by a shared
+# cache alias from CACHES (e.g. "default") so workers share lookups.
+BILLING_COVERAGE_CACHE = {
+    "MAX_ENTRIES": 10000,
+    "TTL": 60,
+    "BACKEND": None,
+}
+
+# Rendered invoice PDFs, keyed by bill id + content version, LRU-evicted
+# once the directory exceeds MAX_BYTES.
+INVOICE_PDF_CACHE = {
+    "DIR": BASE_DIR / "cache" / "invoice_pdfs",
+    "MAX_BYTES": 256 * 1024 * 1024,
+}
+
+# Background PDF rendering (invoice / EMR exports) in a bounded process pool.
+# TIMEOUT is per render in seconds; job state and results live in DIR for
+# RESULT_TTL seconds so any web worker can serve polls and downloads.
+# MAX_EXPORTS bounds concurrent invoice ZIP exports per web process, each
+# running its own WORKERS render processes.
+PDF_RENDERING = {
+    "DIR": BASE_DIR / "cache" / "pdf_jobs",
+    "WORKERS": 2,
+    "MAX_QUEUE": 20,
+    "TIMEOUT": 60,
+    "RESULT_TTL": 15 * 60,
+    "MAX_EXPORTS": 2,
+}
+
+# Claim file layout per ThirdPartyPayer.code ("csv" or "fixed"); payers not
+# listed get CSV, NHIS defaults to fixed-width.
+CLAIM_FILES = {
+    "FORMATS": {
+        "NHIS": "fixed",
+    },
+}
+
+# Sequential per-hospital invoice numbers (INV-<prefix>-0000001). Each worker
+# reserves BLOCK_SIZE numbers at a time from the hospital's counter row.
+INVOICE_NUMBERS = {
+    "BLOCK_SIZE": 50,
+}
+
+# Live receivables aging is cached per hospital for CACHE_TTL seconds in
+# the given CACHES alias; trend charts read AgingSnapshot rows written by
+# `snapshot_receivables_aging` (schedule nightly).
+RECEIVABLES_AGING = {
+    "CACHE": "default",
+    "CACHE_TTL": 300,
+}
+
+# Service catalog served to the bill form; cached per hospital and catalog
+# version, so entries never go stale and the TTL only bounds their lifetime.
+SERVICE_CATALOG = {
+    "CACHE": "default",
+    "CACHE_TTL": 24 * 60 * 60,
+}
+
+# Charge capture: lab, radiology and pharmacy events are flushed onto the
+# visit's draft bill DEBOUNCE_SECONDS after the first pending event (0 =
+# immediately). Run `flush_charges` every few minutes to pick up charges
+# left pending by a worker that exited before its timer fired.
+CHARGE_CAPTURE = {
+    "DEBOUNCE_SECONDS": 5,
+}
+
+# Long-running SLA scheduler (`run_sla_scheduler`): VitalAlert deadlines
+# fire from an in-memory heap. Changes made by other processes are picked
+# up every POLL_INTERVAL seconds, and open alerts are fully rescanned every
+# RESCAN_INTERVAL seconds. `run_sla_monitor` remains as a cron fallback.
+SLA_SCHEDULER = {
+    "POLL_INTERVAL": 1.0,
+    "RESCAN_INTERVAL": 300,
+    "POLL_OVERLAP": 5,
+}